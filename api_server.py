@@ -0,0 +1,363 @@
+# api_server.py
+
+import hashlib
+import io
+import json
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from inventory_manager import load_inventory_from_txt, merge_collections
+from card_classifier import (analyze_commanders_in_inventory, analyze_commander_pairs_in_inventory, rank_commanders,
+                             start_inventory_prefetch, get_inventory_prefetch)
+from card_search import search_inventory
+from deck_builder import build_commander_deck_state, build_best_of_n_deck_state
+from deck_report import compute_deck_hash, build_deck_report, format_deck_list
+from deck_validator import validate_decklists, make_deck_state_decklist, parse_decklist_text
+from metrics import increment, timed, start_metrics_server
+from config import (API_HOST, API_PORT, API_WORKER_COUNT, API_MAX_QUEUED_REQUESTS, API_MAX_REQUEST_BYTES,
+                    API_MAX_STORED_INVENTORIES, API_MAX_STORED_DECKS, API_MAX_DECK_CANDIDATES, API_MAX_VALIDATED_DECKLISTS, MTG_COLOR_ORDER, METRICS_HOST, METRICS_PORT)
+
+# API HTTP/JSON locale au-dessus des fonctions du builder, pour d'autres outils (bot, tableur...) :
+#   GET  /health                                  état du serveur et de la file de travail
+#   POST /inventories                             téléverse un inventaire (texte ManaBox, ou JSON {"content"} / {"collections"})
+#   GET  /inventories/<id>                        résumé et état du préchargement
+#   GET  /inventories/<id>/commanders             commandants classés (?strategy=tribal&tribe=Elf&colors=WU&pairs=1&limit=50)
+#   GET  /inventories/<id>/search?q=...           recherche dans l'inventaire (voir card_search)
+#   POST /inventories/<id>/decks                  construit un deck (JSON {"commander", "partner", "strategy", "tribe", "colors", "candidates"})
+#   GET  /decks/<id>                              liste du deck
+#   GET  /decks/<id>/stats                        statistiques du deck (voir deck_report)
+#   POST /decklists/validate                      légalité Commander d'un lot de decklists (voir deck_validator), JSON
+#                                                 {"decklists": [{"commanders", "cards"} ou {"text", "commanders"}]}
+# Les requêtes sont traitées par un pool borné de API_WORKER_COUNT workers, qui partagent le stockage des cartes
+# et les analyses des inventaires. Au-delà de API_MAX_QUEUED_REQUESTS requêtes en attente, le serveur répond 503.
+# L'identifiant d'un inventaire est l'empreinte de son contenu : le téléverser à nouveau ne refait aucun travail.
+# Chaque réponse porte un identifiant de requête (en-tête X-Request-ID, repris de la requête s'il est fourni).
+
+
+class ApiError(Exception):
+    """Erreur renvoyée au client avec un code HTTP et un message."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+_api_lock = threading.Lock()
+_inventories = OrderedDict() # id -> {'inventory', 'inventory_key', 'lock', 'analyses'}
+_decks = OrderedDict() # id -> deck (dictionnaire sérialisable)
+
+def _remember(store, key, value, max_entries):
+    """Ajoute une entrée à un stockage borné (les plus anciennes sont oubliées)."""
+    with _api_lock:
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > max_entries:
+            store.popitem(last=False)
+
+def _get_stored(store, key, label):
+    with _api_lock:
+        value = store.get(key)
+    if value is None:
+        raise ApiError(404, f"{label} inconnu : '{key}'.")
+    return value
+
+def _parse_colors(colors):
+    """Couleurs préférées depuis 'WU', ['W', 'U'] ou 'C' (incolore)."""
+    colors = [c.upper() for c in (colors or [])]
+    unknown_colors = set(colors) - set(MTG_COLOR_ORDER) - {'C'}
+    if unknown_colors:
+        raise ApiError(400, f"Couleurs inconnues : {', '.join(sorted(unknown_colors))}.")
+    return ['C'] if 'C' in colors else colors
+
+def _get_inventory_analyses(inventory_record):
+    """Analyses des commandants et des paires d'un inventaire, calculées une seule fois (voir card_classifier)."""
+    with inventory_record['lock']:
+        if inventory_record['analyses'] is None:
+            inventory = inventory_record['inventory']
+            inventory_record['analyses'] = {
+                'commanders': analyze_commanders_in_inventory(inventory),
+                'pairs': analyze_commander_pairs_in_inventory(inventory),
+            }
+        return inventory_record['analyses']
+
+# --- Routes ---
+
+def handle_health(server, match, query, body):
+    return 200, {'status': 'ok', 'workers': server.worker_count, 'in_flight': server.in_flight,
+                 'max_in_flight': server.worker_count + server.max_queued_requests}
+
+def handle_upload_inventory(server, match, query, body):
+    if body.lstrip().startswith(b'{'):
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise ApiError(400, "Corps JSON invalide.")
+        if not isinstance(payload, dict):
+            raise ApiError(400, "Le corps JSON doit être un objet.")
+        collections_text = payload.get('collections') or {payload.get('name', 'inventaire'): payload.get('content', '')}
+        if (not isinstance(collections_text, dict)
+                or not all(isinstance(owner, str) and isinstance(text, str) for owner, text in collections_text.items())):
+            raise ApiError(400, "Champ 'collections' (objet {nom: contenu}) ou 'name' et 'content' (texte) invalides.")
+    else:
+        collections_text = {'inventaire': body.decode('utf-8', errors='replace')}
+    if not any(text.strip() for text in collections_text.values()):
+        raise ApiError(400, "Inventaire vide.")
+
+    inventory_id = hashlib.sha1(json.dumps(collections_text, sort_keys=True).encode('utf-8')).hexdigest()
+    with _api_lock:
+        inventory_record = _inventories.get(inventory_id)
+    created = inventory_record is None
+    if created:
+        inventory = merge_collections({owner: load_inventory_from_txt(io.BytesIO(text.encode('utf-8')))
+                                       for owner, text in collections_text.items()})
+        if not inventory:
+            raise ApiError(400, "Aucune ligne d'inventaire reconnue (format : \"quantité nom (SET) numéro\").")
+        inventory_record = {'inventory': inventory, 'inventory_key': start_inventory_prefetch(inventory),
+                            'lock': threading.Lock(), 'analyses': None}
+    _remember(_inventories, inventory_id, inventory_record, API_MAX_STORED_INVENTORIES)
+    return (201 if created else 200), dict(_describe_inventory(inventory_id, inventory_record), created=created)
+
+def _describe_inventory(inventory_id, inventory_record):
+    inventory = inventory_record['inventory']
+    job = get_inventory_prefetch(inventory_record['inventory_key'])
+    return {
+        'inventory_id': inventory_id,
+        'unique_cards': len(inventory),
+        'total_cards': sum(card_info['quantity_owned'] for card_info in inventory.values()),
+        'prefetch': {'status': job['status'], 'progress': job['progress']} if job else None,
+    }
+
+def handle_get_inventory(server, match, query, body):
+    inventory_id = match.group('inventory_id')
+    return 200, _describe_inventory(inventory_id, _get_stored(_inventories, inventory_id, "Inventaire"))
+
+def handle_list_commanders(server, match, query, body):
+    inventory_record = _get_stored(_inventories, match.group('inventory_id'), "Inventaire")
+    preferences = {'strategy': query.get('strategy') or None, 'colors': _parse_colors(query.get('colors', '')),
+                   'tribe': query.get('tribe') or None}
+    try:
+        limit = int(query.get('limit', 50))
+    except ValueError:
+        raise ApiError(400, "Paramètre 'limit' invalide.")
+    analyses = _get_inventory_analyses(inventory_record)
+    ranked = rank_commanders(analyses['pairs' if query.get('pairs') in ('1', 'true') else 'commanders'], preferences)
+    return 200, {
+        'count': len(ranked),
+        'commanders': [
+            {'name': name, 'members': [d.get('name') for d in (details if isinstance(details, list) else [details])],
+             'score_total': score_total, 'score_commander': score_cmd_bonus, 'score_support': score_support_cards,
+             'score_synergy': score_synergy}
+            for name, details, _, score_total, score_cmd_bonus, score_support_cards, score_synergy in ranked[:limit]
+        ],
+    }
+
+def handle_search_inventory(server, match, query, body):
+    inventory_record = _get_stored(_inventories, match.group('inventory_id'), "Inventaire")
+    try:
+        found_rows = search_inventory(inventory_record['inventory'], query.get('q', ''))
+    except ValueError as e:
+        raise ApiError(400, str(e))
+    return 200, {
+        'count': len(found_rows),
+        'cards': [{'key': row['cache_key'], 'name': row['details'].get('name'), 'type_line': row['details'].get('type_line', ''),
+                   'cmc': row['details'].get('cmc', 0), 'color_identity': sorted(row['colors'], key=MTG_COLOR_ORDER.index),
+                   'categories': sorted(row['categories'])}
+                  for row in found_rows],
+    }
+
+def handle_build_deck(server, match, query, body):
+    inventory_id = match.group('inventory_id')
+    inventory_record = _get_stored(_inventories, inventory_id, "Inventaire")
+    try:
+        payload = json.loads(body or b'{}')
+    except ValueError:
+        raise ApiError(400, "Corps JSON invalide.")
+    if not payload.get('commander'):
+        raise ApiError(400, "Champ 'commander' requis.")
+    preferences = {'strategy': payload.get('strategy') or None, 'colors': _parse_colors(payload.get('colors')),
+                   'tribe': payload.get('tribe') or None}
+    candidate_count = payload.get('candidates', 1)
+    if not isinstance(candidate_count, int) or not 1 <= candidate_count <= API_MAX_DECK_CANDIDATES:
+        raise ApiError(400, f"Champ 'candidates' invalide (entier entre 1 et {API_MAX_DECK_CANDIDATES}).")
+
+    if candidate_count > 1:
+        deck_state = build_best_of_n_deck_state(payload['commander'], inventory_record['inventory'], preferences,
+                                                 partner_name=payload.get('partner'), candidate_count=candidate_count)
+    else:
+        deck_state = build_commander_deck_state(payload['commander'], inventory_record['inventory'], preferences,
+                                                partner_name=payload.get('partner'))
+    if deck_state is None:
+        raise ApiError(422, f"Impossible de construire un deck pour '{payload['commander']}' (commandant introuvable ou invalide).")
+
+    deck_full_details = deck_state['deck_full_details']
+    deck_id = compute_deck_hash(deck_full_details, preferences['strategy'])
+    deck = {
+        'deck_id': deck_id,
+        'inventory_id': inventory_id,
+        'commander': deck_state['pool']['commander_name'],
+        'strategy': preferences['strategy'],
+        'cards': [{key: card_info[key] for key in ('name', 'set', 'collector_number', 'foil', 'owner')} for card_info in deck_full_details],
+        'deck_list': format_deck_list(deck_full_details),
+        'stats': build_deck_report(deck_id, deck_full_details, deck_state['mana_curve_spells_cmc'],
+                                   deck_state['deck_category_counts'], deck_state['synergy_cards_info'], preferences['strategy']),
+    }
+    if deck_state['pool']['tribes']:
+        deck['tribes'] = deck_state['pool']['tribes']
+    if 'quality' in deck_state:
+        deck['quality'] = deck_state['quality']
+    deck['legality'] = validate_decklists([make_deck_state_decklist(deck_state)])[0]
+    _remember(_decks, deck_id, deck, API_MAX_STORED_DECKS)
+    return 201, deck
+
+def handle_get_deck(server, match, query, body):
+    deck = _get_stored(_decks, match.group('deck_id'), "Deck")
+    return 200, {key: value for key, value in deck.items() if key != 'stats'}
+
+def handle_get_deck_stats(server, match, query, body):
+    deck = _get_stored(_decks, match.group('deck_id'), "Deck")
+    return 200, {'deck_id': deck['deck_id'], 'commander': deck['commander'], 'stats': deck['stats']}
+
+def _read_decklist(entry):
+    if not isinstance(entry, dict):
+        raise ApiError(400, "Chaque decklist doit être un objet JSON.")
+    commanders = entry.get('commanders', [])
+    if not isinstance(commanders, list) or not all(isinstance(name, str) for name in commanders):
+        raise ApiError(400, "Champ 'commanders' invalide (liste de noms).")
+    if isinstance(entry.get('text'), str):
+        decklist, unparsed_lines = parse_decklist_text(entry['text'], commanders)
+        if unparsed_lines:
+            raise ApiError(400, f"Ligne de decklist non reconnue : '{unparsed_lines[0]}'.")
+        return decklist
+    cards = entry.get('cards')
+    if not isinstance(cards, list) or not all(isinstance(name, str) for name in cards):
+        raise ApiError(400, "Champ 'cards' (liste de noms) ou 'text' requis.")
+    return {'commanders': commanders, 'cards': cards}
+
+def handle_validate_decklists(server, match, query, body):
+    try:
+        payload = json.loads(body or b'{}')
+    except ValueError:
+        raise ApiError(400, "Corps JSON invalide.")
+    entries = payload.get('decklists') if isinstance(payload, dict) else None
+    if not isinstance(entries, list) or not 1 <= len(entries) <= API_MAX_VALIDATED_DECKLISTS:
+        raise ApiError(400, f"Champ 'decklists' invalide (liste de 1 à {API_MAX_VALIDATED_DECKLISTS} decklists).")
+    results = validate_decklists([_read_decklist(entry) for entry in entries])
+    return 200, {'count': len(results), 'legal_count': sum(1 for result in results if result['legal']), 'results': results}
+
+# (méthode, motif du chemin, nom de la route, fonction, passe par le pool)
+API_ROUTES = [
+    ('GET', re.compile(r"^/health$"), 'health', handle_health, False),
+    ('POST', re.compile(r"^/inventories$"), 'upload_inventory', handle_upload_inventory, True),
+    ('GET', re.compile(r"^/inventories/(?P<inventory_id>[0-9a-f]+)$"), 'get_inventory', handle_get_inventory, False),
+    ('GET', re.compile(r"^/inventories/(?P<inventory_id>[0-9a-f]+)/commanders$"), 'list_commanders', handle_list_commanders, True),
+    ('GET', re.compile(r"^/inventories/(?P<inventory_id>[0-9a-f]+)/search$"), 'search_inventory', handle_search_inventory, True),
+    ('POST', re.compile(r"^/inventories/(?P<inventory_id>[0-9a-f]+)/decks$"), 'build_deck', handle_build_deck, True),
+    ('GET', re.compile(r"^/decks/(?P<deck_id>[0-9a-f]+)$"), 'get_deck', handle_get_deck, False),
+    ('GET', re.compile(r"^/decks/(?P<deck_id>[0-9a-f]+)/stats$"), 'get_deck_stats', handle_get_deck_stats, False),
+    ('POST', re.compile(r"^/decklists/validate$"), 'validate_decklists', handle_validate_decklists, True),
+]
+
+# --- Serveur ---
+
+class _ApiRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method):
+        request_id = self.headers.get('X-Request-ID') or uuid.uuid4().hex
+        url = urlparse(self.path)
+        route = next(((name, handler, pooled, match) for route_method, pattern, name, handler, pooled in API_ROUTES
+                      for match in [pattern.match(url.path)] if match and route_method == method), None)
+        if route is None:
+            self._send_json(404, {'error': f"Route inconnue : {method} {url.path}"}, request_id)
+            return
+        route_name, handler, pooled, match = route
+
+        content_length = int(self.headers.get('Content-Length') or 0)
+        if content_length > API_MAX_REQUEST_BYTES:
+            self._send_json(413, {'error': "Corps de requête trop volumineux."}, request_id, route_name)
+            return
+        body = self.rfile.read(content_length) if content_length else b''
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if not pooled:
+            status, payload = self._run(route_name, handler, match, query, body)
+        elif not self._admit():
+            # Pool et file pleins : le client doit réessayer plus tard plutôt que d'attendre indéfiniment
+            self._send_json(503, {'error': "Serveur saturé, réessayez plus tard."}, request_id, route_name,
+                            extra_headers={'Retry-After': '1'})
+            return
+        else:
+            try:
+                status, payload = self.server.worker_pool.submit(self._run, route_name, handler, match, query, body).result()
+            finally:
+                with self.server.in_flight_lock:
+                    self.server.in_flight -= 1
+        self._send_json(status, payload, request_id, route_name)
+
+    def _admit(self):
+        """Réserve une place dans le pool ou sa file d'attente ; False si tout est occupé."""
+        server = self.server
+        with server.in_flight_lock:
+            if server.in_flight >= server.worker_count + server.max_queued_requests:
+                return False
+            server.in_flight += 1
+            return True
+
+    def _run(self, route_name, handler, match, query, body):
+        with timed('api_request_seconds', route=route_name):
+            try:
+                return handler(self.server, match, query, body)
+            except ApiError as e:
+                return e.status, {'error': e.message}
+            except Exception as e:
+                return 500, {'error': f"Erreur interne : {e}"}
+
+    def _send_json(self, status, payload, request_id, route_name='unknown', extra_headers=None):
+        increment('api_requests_total', route=route_name, status=str(status))
+        body = json.dumps(dict(payload, request_id=request_id), default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Request-ID', request_id)
+        for header, value in (extra_headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Les requêtes sont comptées dans les mesures (api_requests_total)
+
+def create_api_server(host=API_HOST, port=API_PORT, worker_count=API_WORKER_COUNT, max_queued_requests=API_MAX_QUEUED_REQUESTS):
+    """
+    Crée le serveur de l'API (sans le démarrer : appeler serve_forever()).
+    Au plus `worker_count` requêtes sont traitées à la fois et `max_queued_requests` attendent ; au-delà, réponse 503.
+    """
+    server = ThreadingHTTPServer((host, port), _ApiRequestHandler)
+    server.daemon_threads = True
+    server.worker_count = worker_count
+    server.max_queued_requests = max_queued_requests
+    server.worker_pool = ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix="api-worker")
+    server.in_flight = 0 # Requêtes admises dans le pool (en cours ou en attente)
+    server.in_flight_lock = threading.Lock()
+    return server
+
+if __name__ == "__main__":
+    # python api_server.py   -> API sur http://API_HOST:API_PORT (et mesures sur METRICS_PORT)
+    start_metrics_server(METRICS_HOST, METRICS_PORT)
+    api_server = create_api_server()
+    print(f"API AutoDeck sur http://{API_HOST}:{api_server.server_address[1]} ({API_WORKER_COUNT} workers)")
+    try:
+        api_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api_server.worker_pool.shutdown(wait=False)
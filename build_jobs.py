@@ -0,0 +1,180 @@
+# build_jobs.py
+
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import streamlit as st
+
+from card_classifier import analyze_commanders_in_inventory, analyze_commander_pairs_in_inventory
+from deck_builder import build_commander_deck_state, build_best_of_n_deck_state
+from scryfall_api import cancel_scryfall_requests_on, ScryfallRequestCancelledError
+from metrics import increment, timed
+from config import BUILD_JOB_WORKER_COUNT, BUILD_JOBS_MAX_KEPT, CARD_CATEGORIES_RATIOS
+
+# Travaux en arrière-plan : la recherche de commandants et la construction d'un deck ne bloquent plus
+# l'interface. Chaque travail a un identifiant et un état partagé (dictionnaire) que l'interface relit
+# périodiquement : progression, phases terminées (avec un résumé de leur résultat) et résultat final.
+# L'annulation est coopérative : le travail s'arrête au prochain point de contrôle (mise à jour de progression,
+# fin de phase) ou avant sa prochaine requête Scryfall. Les travaux de toutes les sessions partagent un pool
+# borné de BUILD_JOB_WORKER_COUNT threads (voir _get_job_registry).
+
+JOB_FINISHED_STATUSES = ('done', 'cancelled', 'error')
+
+
+class JobCancelledError(Exception):
+    """Levée dans le thread d'un travail annulé, à son prochain point de contrôle."""
+
+
+@st.cache_resource
+def _get_job_registry():
+    return {
+        'lock': threading.Lock(),
+        'jobs': OrderedDict(),
+        'executor': ThreadPoolExecutor(max_workers=BUILD_JOB_WORKER_COUNT, thread_name_prefix="build-job"),
+    }
+
+def _check_cancelled(job):
+    if job['cancel_event'].is_set():
+        raise JobCancelledError()
+
+def _make_job_progress(job):
+    """Barre de progression (au sens des fonctions du builder) qui met à jour le travail et sert de point de contrôle."""
+    def report_progress(value, text=""):
+        _check_cancelled(job)
+        job.update(progress=min(1.0, value / 100), phase_text=text)
+    return SimpleNamespace(progress=report_progress)
+
+def _report_phase(job, phase, summary):
+    """Publie une phase terminée ; l'interface l'affiche à son prochain rafraîchissement."""
+    _check_cancelled(job)
+    job['phases'].append({'phase': phase, 'summary': summary, 'seconds': time.perf_counter() - job['started_at']})
+
+def _run_job(job, run, args):
+    if job['cancel_event'].is_set(): # Annulé avant d'avoir obtenu un thread
+        job.update(status='cancelled', phase_text="Annulé.")
+    else:
+        job.update(status='running', started_at=time.perf_counter())
+        try:
+            with cancel_scryfall_requests_on(job['cancel_event']):
+                result = run(job, *args)
+            job.update(result=result, status='done', progress=1.0, phase_text="Terminé.")
+        except (JobCancelledError, ScryfallRequestCancelledError):
+            job.update(status='cancelled', phase_text="Annulé.")
+        except Exception as e:
+            job.update(status='error', error=str(e), phase_text="Échec.")
+        job['elapsed'] = time.perf_counter() - job['started_at']
+    increment('build_jobs_total', kind=job['kind'], status=job['status'])
+    job['done_event'].set()
+
+def submit_job(kind, run, *args):
+    """
+    Lance `run(job, *args)` en arrière-plan et retourne l'identifiant du travail.
+    `run` publie ses phases avec _report_phase ; sa valeur de retour devient job['result'].
+    """
+    job_id = uuid.uuid4().hex
+    job = {
+        'job_id': job_id,
+        'kind': kind,
+        'status': 'queued',
+        'progress': 0.0,
+        'phase_text': "En attente d'un thread libre...",
+        'phases': [],
+        'result': None,
+        'error': None,
+        'started_at': time.perf_counter(),
+        'elapsed': None,
+        'cancel_event': threading.Event(),
+        'done_event': threading.Event(),
+    }
+    registry = _get_job_registry()
+    with registry['lock']:
+        jobs = registry['jobs']
+        jobs[job_id] = job
+        # Seuls les travaux terminés sont oubliés, les plus anciens d'abord
+        finished_job_ids = [other_id for other_id, other in jobs.items() if other['status'] in JOB_FINISHED_STATUSES]
+        for finished_job_id in finished_job_ids[:max(0, len(jobs) - BUILD_JOBS_MAX_KEPT)]:
+            del jobs[finished_job_id]
+    registry['executor'].submit(_run_job, job, run, args)
+    return job_id
+
+def get_job(job_id):
+    """Retourne l'état d'un travail (dictionnaire), ou None s'il est inconnu ou oublié."""
+    registry = _get_job_registry()
+    with registry['lock']:
+        return registry['jobs'].get(job_id)
+
+def cancel_job(job_id):
+    """Demande l'annulation d'un travail (sans effet s'il est déjà terminé ou inconnu)."""
+    job = get_job(job_id)
+    if job is not None and job['status'] not in JOB_FINISHED_STATUSES:
+        job['cancel_event'].set()
+
+# --- Recherche de commandants ---
+
+def _run_commander_search(job, inventory):
+    progress = _make_job_progress(job)
+    progress.progress(10, "Analyse des commandants de l'inventaire...")
+    with timed('build_phase_seconds', phase='commander_search'):
+        commander_analysis = analyze_commanders_in_inventory(inventory)
+    _report_phase(job, 'commanders', f"{len(commander_analysis['names'])} commandants analysés")
+
+    progress.progress(60, "Analyse des paires de commandants...")
+    with timed('build_phase_seconds', phase='pair_search'):
+        commander_pairs_analysis = analyze_commander_pairs_in_inventory(inventory)
+    _report_phase(job, 'pairs', f"{len(commander_pairs_analysis['names'])} paires de commandants analysées")
+    return {'commanders': commander_analysis, 'pairs': commander_pairs_analysis}
+
+def submit_commander_search(inventory):
+    """Lance l'analyse des commandants et des paires de l'inventaire ; le résultat est {'commanders', 'pairs'}."""
+    return submit_job('commander_search', _run_commander_search, inventory)
+
+# --- Construction d'un deck ---
+
+def _summarize_category_targets(pool, spell_keys):
+    category_counts = Counter(category for key in spell_keys for category in pool['cards'][key]['categories'])
+    return ", ".join(f"{category.replace('_', ' ')} {category_counts[category]}/{target}"
+                     for category, target in CARD_CATEGORIES_RATIOS.items())
+
+def _run_deck_build(job, commander_name, inventory, preferences, partner_name, candidate_count):
+    phase_values = {}
+
+    def on_phase(phase, value):
+        phase_values[phase] = value
+        pool = phase_values.get('pool')
+        if phase == 'pool':
+            summary = (f"Pool prêt pour {pool['commander_name']} : {len(pool['cards'])} cartes candidates "
+                       f"({len(pool['spell_keys'])} sorts, {len(pool['land_keys'])} terrains)")
+        elif phase == 'spells':
+            summary = f"{len(value)} sorts choisis — {_summarize_category_targets(pool, value)}"
+        elif phase == 'lands':
+            summary = f"{len(value)} terrains non-base choisis"
+        elif phase == 'candidates':
+            summary = (f"{value['candidate_count']} decks candidats notés : meilleur {value['score']:.3f}, "
+                       f"médiane {value['spread']['median']:.3f}")
+        else: # 'deck'
+            curve = value['mana_curve_spells_cmc']
+            summary = (f"Deck assemblé : {len(value['deck_full_details'])} cartes dont {len(value['basic_lands'])} terrains de base"
+                       f"{f', CMC moyen des sorts {sum(curve) / len(curve):.2f}' if curve else ''}")
+        _report_phase(job, phase, summary)
+
+    progress = _make_job_progress(job)
+    if candidate_count > 1:
+        deck_state = build_best_of_n_deck_state(commander_name, inventory, preferences, progress, partner_name,
+                                                candidate_count=candidate_count, on_phase=on_phase)
+    else:
+        deck_state = build_commander_deck_state(commander_name, inventory, preferences, progress, partner_name,
+                                                on_phase=on_phase)
+    if deck_state is None or not deck_state['deck_full_details']:
+        raise ValueError(f"Impossible de construire un deck pour '{commander_name}' (commandant introuvable ou invalide).")
+    return deck_state
+
+def submit_deck_build(commander_name, inventory, preferences, partner_name=None, candidate_count=1):
+    """
+    Lance la construction d'un deck (voir build_commander_deck_state, ou build_best_of_n_deck_state si
+    `candidate_count` > 1). Les préférences sont copiées. Le résultat est l'état du deck.
+    """
+    return submit_job('deck_build', _run_deck_build, commander_name, inventory, dict(preferences), partner_name, candidate_count)
@@ -1,7 +1,17 @@
 # card_classifier.py
 
-from scryfall_api import get_card_details_scryfall, get_card_details_batch_scryfall, get_color_identity
-from config import CATEGORY_KEYWORDS, COLOR_MAP
+import hashlib
+import json
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from itertools import combinations
+
+import numpy as np
+from scryfall_api import get_card_details_scryfall, get_card_details_batch_scryfall, fetch_card_collection, get_color_identity, get_color_mask, colors_to_mask, get_creature_subtypes
+from card_features import extract_card_features, extract_commander_features, compute_synergy_matrix, aggregate_by_color_mask, subset_sums, get_feature_vector_mass, extract_commander_profile, build_profile_matrix
+from metrics import timed
+from config import CATEGORY_KEYWORDS, COLOR_MAP, INVENTORY_PREFETCH_MAX_JOBS, TRIBAL_BONUS_PER_REFERENCE, DOMINANT_TRIBES_LIMIT, IRREGULAR_SUBTYPE_PLURALS, SIMILAR_COMMANDERS_LIMIT
 import streamlit as st # Importé pour les indicateurs de progression
 
 def classify_card(card_details, preferred_strategy=None):
@@ -37,19 +47,95 @@ def classify_card(card_details, preferred_strategy=None):
     return list(categories)
 
 
-@st.cache_data(ttl=3600*24) # Cache le résultat de l'identification des commandants
-def identify_commanders_in_inventory(inventory, preferences=None):
+def is_potential_commander(card_details):
+    """Vérifie si une carte peut être commandant (créature ou planeswalker légendaire)."""
+    type_line = card_details.get('type_line', '').lower()
+    return 'legendary' in type_line and ('creature' in type_line or 'planeswalker' in type_line)
+
+# --- Paires de commandants (Partner, Friends forever, Choose a Background, Doctor's companion) ---
+
+PARTNER_WITH_PATTERN = re.compile(r"^Partner with ([^(\n]+)", re.MULTILINE)
+GENERIC_PARTNER_PATTERN = re.compile(r"^Partner(?: \(|$)", re.MULTILINE)
+
+# Capacités qui s'associent entre elles : (capacité du premier commandant, capacité du second)
+PAIRING_RULES = [
+    ('partner', 'partner'),
+    ('friends_forever', 'friends_forever'),
+    ('choose_a_background', 'background'),
+    ('doctors_companion', 'doctor'),
+]
+
+def get_pairing_abilities(card_details):
     """
-    Identifie les commandants potentiels dans l'inventaire en fonction des préférences.
-    Calcule un score de pertinence stratégique détaillé pour chaque commandant.
-    Retourne une liste de tuples (nom_commandant, détails_scryfall, pertinence_strategique_str, score_total, score_cmd_bonus, score_support_cards).
-    Les commandants sont filtrés par couleur et par stratégie, puis triés par score de pertinence.
+    Retourne (capacités, partner_with) : les capacités d'association de la carte parmi
+    'partner', 'friends_forever', 'choose_a_background', 'background', 'doctors_companion', 'doctor',
+    et le nom imposé par "Partner with <nom>" (None sinon).
     """
-    potential_commanders = []
-    
-    preferred_colors = set(preferences.get('colors', [])) if preferences else set()
-    chosen_strategy = preferences.get('strategy', None) if preferences else None
+    keywords = {keyword.lower() for keyword in card_details.get('keywords', [])}
+    oracle_text = card_details.get('oracle_text', '')
+    oracle_text_lower = oracle_text.lower()
+    type_line = card_details.get('type_line', '')
+
+    abilities = set()
+    partner_with_match = PARTNER_WITH_PATTERN.search(oracle_text)
+    partner_with = partner_with_match.group(1).strip() if partner_with_match else None
+    if not partner_with and ('partner' in keywords or GENERIC_PARTNER_PATTERN.search(oracle_text)):
+        abilities.add('partner')
+    if 'friends forever' in keywords or 'friends forever' in oracle_text_lower:
+        abilities.add('friends_forever')
+    if 'choose a background' in keywords or 'choose a background' in oracle_text_lower:
+        abilities.add('choose_a_background')
+    if 'Legendary' in type_line and 'Background' in type_line.split('—')[-1]:
+        abilities.add('background')
+    if "doctor's companion" in keywords or "doctor's companion" in oracle_text_lower:
+        abilities.add('doctors_companion')
+    if 'Creature' in type_line and 'Time Lord Doctor' in type_line:
+        abilities.add('doctor')
+    return abilities, partner_with
+
+def can_form_commander_pair(first_details, second_details):
+    """Vérifie si deux cartes peuvent être commandants ensemble (dans cet ordre : le Background en second)."""
+    first_name, second_name = first_details.get('name'), second_details.get('name')
+    if first_name == second_name:
+        return False
+    first_abilities, first_partner_with = get_pairing_abilities(first_details)
+    second_abilities, second_partner_with = get_pairing_abilities(second_details)
+    if not is_potential_commander(first_details):
+        return False
+    if first_partner_with == second_name and second_partner_with == first_name:
+        return True
+    for first_ability, second_ability in PAIRING_RULES:
+        if first_ability in first_abilities and second_ability in second_abilities:
+            return second_ability == 'background' or is_potential_commander(second_details)
+    return False
+
+def classify_inventory(inventory, inventory_card_details_map, progress_callback=None):
+    """
+    Classifie toutes les cartes résolues de l'inventaire en une seule passe.
+    Retourne la table des cartes classifiées : une ligne (dictionnaire) par carte trouvée sur Scryfall.
+    `progress_callback(fraction)` est appelé régulièrement si fourni.
+    """
+    classified_rows = []
+    total_items = max(1, len(inventory))
+    for index, (cache_key, card_info) in enumerate(inventory.items()):
+        if progress_callback and index % 250 == 0:
+            progress_callback(index / total_items)
+        details = inventory_card_details_map.get(cache_key)
+        if not details:
+            continue
+        classified_rows.append({
+            'cache_key': cache_key,
+            'details': details,
+            'categories': classify_card(details),
+            'colors': get_color_identity(details),
+            'color_mask': get_color_mask(details),
+            'features': extract_card_features(details),
+            'inventory_info': card_info
+        })
+    return classified_rows
+
 
+def _get_inventory_identifiers(inventory):
     inventory_identifiers = []
     for cache_key, card_info in inventory.items():
         inventory_identifiers.append({
@@ -57,6 +143,120 @@ def identify_commanders_in_inventory(inventory, preferences=None):
             "set": card_info['set'],
             "collector_number": card_info['collector_number']
         })
+    return inventory_identifiers
+
+def _warn_missing_cards(missing_cards_from_scryfall):
+    if missing_cards_from_scryfall:
+        st.warning(f"⚠️ Avertissement : {len(missing_cards_from_scryfall)} cartes de l'inventaire n'ont pas été trouvées sur Scryfall : {', '.join(missing_cards_from_scryfall[:5])}{'...' if len(missing_cards_from_scryfall) > 5 else ''}")
+
+# --- Préchargement de l'inventaire en arrière-plan ---
+# Dès le téléversement, un thread résout (Scryfall) et classifie l'inventaire pendant que l'utilisateur
+# choisit ses préférences. Les travaux sont partagés entre les réexécutions via st.cache_resource ;
+# la recherche de commandants reprend le résultat terminé ou attend la fin du travail en cours.
+
+def compute_inventory_key(inventory):
+    """Empreinte stable d'un inventaire (identifie son travail de préchargement)."""
+    serialized_inventory = json.dumps(inventory, sort_keys=True, default=str)
+    return hashlib.sha1(serialized_inventory.encode('utf-8')).hexdigest()
+
+@st.cache_resource
+def _get_prefetch_registry():
+    return {'lock': threading.Lock(), 'jobs': OrderedDict()}
+
+def _run_inventory_prefetch(job, inventory):
+    def on_fetch_progress(resolved_count, total_count):
+        job['progress'] = 0.8 * resolved_count / max(1, total_count)
+        job['phase_text'] = f"Récupération des cartes sur Scryfall ({resolved_count}/{total_count})..."
+
+    try:
+        found_cards_details, missing_cards, failed_cards = fetch_card_collection(
+            _get_inventory_identifiers(inventory), on_fetch_progress
+        )
+        job['phase_text'] = "Analyse locale de l'inventaire et classification des cartes..."
+        with timed('build_phase_seconds', phase='classify_inventory'):
+            classified_rows = classify_inventory(
+                inventory, found_cards_details,
+                lambda fraction: job.update(progress=0.8 + 0.2 * fraction)
+            )
+        job.update(classified_rows=classified_rows, missing_cards=missing_cards, failed_cards=failed_cards,
+                   status='done', progress=1.0, phase_text="Inventaire analysé.")
+    except Exception as e:
+        job.update(status='error', error=str(e), phase_text="Préchargement interrompu.")
+    finally:
+        job['done_event'].set()
+
+def start_inventory_prefetch(inventory, inventory_key=None):
+    """
+    Lance le préchargement de l'inventaire dans un thread, s'il n'est pas déjà en cours ou terminé.
+    `inventory_key` évite de recalculer la clé quand l'appelant l'a déjà (voir compute_inventory_key).
+    Retourne la clé de l'inventaire (voir get_inventory_prefetch).
+    """
+    if inventory_key is None:
+        inventory_key = compute_inventory_key(inventory)
+    registry = _get_prefetch_registry()
+    with registry['lock']:
+        jobs = registry['jobs']
+        if inventory_key in jobs:
+            jobs.move_to_end(inventory_key)
+            return inventory_key
+        job = {
+            'status': 'running',
+            'progress': 0.0,
+            'phase_text': "Préchargement de l'inventaire...",
+            'done_event': threading.Event(),
+            'classified_rows': None,
+            'missing_cards': [],
+            'failed_cards': [],
+            'error': None,
+        }
+        jobs[inventory_key] = job
+        # Un travail évincé en cours se termine normalement, son résultat n'est simplement plus partagé
+        while len(jobs) > INVENTORY_PREFETCH_MAX_JOBS:
+            jobs.popitem(last=False)
+        threading.Thread(target=_run_inventory_prefetch, args=(job, inventory), daemon=True,
+                         name=f"inventory-prefetch-{inventory_key[:8]}").start()
+    return inventory_key
+
+def get_inventory_prefetch(inventory_key):
+    """Retourne le travail de préchargement d'un inventaire (dictionnaire), ou None s'il n'a pas été lancé."""
+    registry = _get_prefetch_registry()
+    with registry['lock']:
+        return registry['jobs'].get(inventory_key)
+
+def clear_inventory_prefetch():
+    """Oublie tous les préchargements (les threads en cours se terminent sans être réutilisés)."""
+    registry = _get_prefetch_registry()
+    with registry['lock']:
+        registry['jobs'].clear()
+
+def _wait_for_inventory_prefetch(inventory):
+    """
+    Attend le préchargement de l'inventaire s'il a été lancé, en affichant sa progression.
+    Retourne la table classifiée, ou None s'il n'existe pas ou est incomplet (échecs transitoires, erreur).
+    """
+    job = get_inventory_prefetch(compute_inventory_key(inventory))
+    if job is None:
+        return None
+    progress_bar_container = st.empty()
+    while not job['done_event'].wait(0.2):
+        progress_bar_container.progress(job['progress'], text=job['phase_text'])
+    progress_bar_container.empty()
+    if job['status'] != 'done' or job['failed_cards']:
+        return None
+    _warn_missing_cards(job['missing_cards'])
+    return job['classified_rows']
+
+def load_classified_inventory(inventory):
+    """
+    Récupère les détails Scryfall de l'inventaire (en lot) et le classifie, avec barre de progression.
+    Reprend le préchargement en arrière-plan s'il a été lancé (voir start_inventory_prefetch).
+    Retourne la table des cartes classifiées (voir classify_inventory).
+    """
+    classified_rows = _wait_for_inventory_prefetch(inventory)
+    if classified_rows is not None:
+        return classified_rows
+
+    inventory_identifiers = _get_inventory_identifiers(inventory)
 
     # Le spinner pour get_card_details_batch_scryfall est déjà inclus via le décorateur st.cache_data
     # et le texte du spinner est géré à un niveau supérieur si nécessaire (dans main.py).
@@ -64,104 +264,496 @@ def identify_commanders_in_inventory(inventory, preferences=None):
         inventory_identifiers
     )
 
-    if missing_cards_from_scryfall:
-        st.warning(f"⚠️ Avertissement : {len(missing_cards_from_scryfall)} cartes de l'inventaire n'ont pas été trouvées sur Scryfall : {', '.join(missing_cards_from_scryfall[:5])}{'...' if len(missing_cards_from_scryfall) > 5 else ''}")
+    _warn_missing_cards(missing_cards_from_scryfall)
     
-    inventory_processed_cache = {}
-    
-    total_items_to_process = len(inventory.items())
     # Utilisation d'un conteneur vide pour la barre de progression pour la vider plus facilement
     progress_bar_container = st.empty()
     progress_bar = progress_bar_container.progress(0, text="Analyse locale de l'inventaire et classification des cartes...")
-    
-    processed_count = 0
+    with timed('build_phase_seconds', phase='classify_inventory'):
+        classified_rows = classify_inventory(
+            inventory, inventory_card_details_map,
+            lambda fraction: progress_bar.progress(fraction, text="Analyse locale de l'inventaire et classification des cartes...")
+        )
+    progress_bar_container.empty()
+    return classified_rows
 
-    for commander_cache_key, commander_processed_info in inventory.items():
-        
-        processed_info = inventory_processed_cache.get(commander_cache_key)
-        if not processed_info:
-            details = inventory_card_details_map.get(commander_cache_key)
-            if details:
-                processed_info = {
-                    'details': details,
-                    'categories': classify_card(details, chosen_strategy),
-                    'colors': get_color_identity(details),
-                    'inventory_info': inventory.get(commander_cache_key)
-                }
-                inventory_processed_cache[commander_cache_key] = processed_info
-            else:
-                processed_count += 1
-                progress_bar.progress(processed_count / total_items_to_process, text="Analyse et évaluation des commandants...")
-                continue
-
-        commander_details = processed_info['details']
-        commander_categories = processed_info['categories']
-        commander_colors = processed_info['colors']
-        commander_name_from_scryfall = commander_details.get('name')
-
-        is_commander_type = ('legendary' in commander_details.get('type_line', '').lower() and 
-                             ('creature' in commander_details.get('type_line', '').lower() or 
-                              'planeswalker' in commander_details.get('type_line', '').lower()))
-
-        if not is_commander_type:
-            processed_count += 1
-            progress_bar.progress(processed_count / total_items_to_process, text="Analyse et évaluation des commandants...")
+def get_strategy_bonus(card_details, chosen_strategy):
+    """Bonus stratégique d'un commandant : +10 par occurrence d'un mot-clé de la stratégie dans son texte."""
+    commander_oracle_text_lower = card_details.get('oracle_text', '').lower()
+    strategy_keywords = CATEGORY_KEYWORDS.get(chosen_strategy, [])
+    return sum(commander_oracle_text_lower.count(k) for k in strategy_keywords) * 10
+
+# --- Index des sous-types de créature (stratégie tribale) ---
+# Les tribus sont lues dans la ligne de type des cartes (voir get_creature_subtypes) et non cherchées comme
+# mots dans le texte : le vocabulaire est celui des sous-types présents dans l'inventaire. L'index donne, pour
+# chaque sous-type, le nombre de créatures jouables dans chaque identité couleur (somme sur les sous-ensembles
+# des 32 masques) et les cartes de ce sous-type, ainsi que les tribus que chaque légende cite dans son texte
+# (mots capitalisés, au singulier ou au pluriel). Noter un commandant tribal ou choisir les cartes d'un deck
+# tribal devient une lecture dans l'index. Les changelings (tous les types) sont comptés à part.
+
+CAPITALIZED_WORD_PATTERN = re.compile(r"\b[A-Z][A-Za-z'\-]*")
+
+def _is_changeling(card_details):
+    return any(keyword.lower() == 'changeling' for keyword in card_details.get('keywords', []))
+
+def _get_subtype_words(subtypes):
+    """Mot (singulier ou pluriel) -> sous-type, pour reconnaître les tribus citées dans un texte."""
+    subtype_words = {}
+    for subtype in subtypes:
+        for word in (subtype, f"{subtype}s", f"{subtype}es", IRREGULAR_SUBTYPE_PLURALS.get(subtype)):
+            if word:
+                subtype_words.setdefault(word, subtype)
+    return subtype_words
+
+def get_referenced_subtypes(card_details, subtype_words):
+    """Tribus citées dans le texte d'une carte : {sous-type: nombre de mentions}. Le nom de la carte est ignoré."""
+    oracle_text = card_details.get('oracle_text', '')
+    name = card_details.get('name', '')
+    for name_part in (name, name.split(',')[0]): # "Lathril, Blade of the Elves" est aussi cité "Lathril"
+        if name_part:
+            oracle_text = oracle_text.replace(name_part, '')
+    references = Counter()
+    for word in CAPITALIZED_WORD_PATTERN.findall(oracle_text):
+        subtype = subtype_words.get(word)
+        if subtype:
+            references[subtype] += 1
+    return dict(references)
+
+def build_subtype_index(classified_rows):
+    """
+    Construit l'index des sous-types de créature d'une table classifiée (voir classify_inventory) :
+    'subtypes' (triés), 'playable_counts' (sous-types x 32 : créatures jouables dans chaque identité couleur),
+    'changeling_counts' (32), 'keys_by_subtype' et 'changeling_keys' (clés d'inventaire), et 'legends'
+    ({nom: {'references': tribes citées, 'subtypes', 'changeling', 'color_mask'}}) pour les cartes légendaires.
+    """
+    row_indices_by_subtype = defaultdict(list)
+    changeling_row_indices = []
+    for row_index, row in enumerate(classified_rows):
+        if _is_changeling(row['details']):
+            changeling_row_indices.append(row_index) # Déjà de toutes les tribus : pas compté deux fois
             continue
+        for subtype in get_creature_subtypes(row['details']):
+            row_indices_by_subtype[subtype].append(row_index)
 
-        if preferred_colors:
-            if not commander_colors.issubset(preferred_colors):
-                processed_count += 1
-                progress_bar.progress(processed_count / total_items_to_process, text="Analyse et évaluation des commandants...")
-                continue
-
-        score_total = 0
-        score_cmd_bonus = 0
-        score_support_cards = 0
-        relevance_str = "" 
-
-        if chosen_strategy:
-            commander_oracle_text_lower = commander_details.get('oracle_text', '').lower()
-            strategy_keywords = CATEGORY_KEYWORDS.get(chosen_strategy, [])
-            
-            keyword_occurrences_in_cmd = sum(commander_oracle_text_lower.count(k) for k in strategy_keywords)
-            
-            if keyword_occurrences_in_cmd > 0:
-                score_cmd_bonus = keyword_occurrences_in_cmd * 10
-                score_total += score_cmd_bonus
-                relevance_str = f" (pertinent pour {chosen_strategy.capitalize()})"
-            else:
-                processed_count += 1
-                progress_bar.progress(processed_count / total_items_to_process, text="Analyse et évaluation des commandants...")
-                continue 
-            
-            for inv_cache_key, inv_processed_info in inventory_processed_cache.items():
-                if inv_cache_key == commander_cache_key:
-                    continue
-
-                inv_categories = inv_processed_info['categories']
-                inv_colors = inv_processed_info['colors']
-
-                if inv_colors.issubset(commander_colors):
-                    if chosen_strategy in inv_categories:
-                        score_support_cards += 1 
-                        score_total += 1 
-        
-        if not chosen_strategy:
-            for inv_cache_key, inv_processed_info in inventory_processed_cache.items():
-                if inv_cache_key == commander_cache_key:
-                    continue
-                inv_colors = inv_processed_info['colors']
-                if inv_colors.issubset(commander_colors):
-                    score_support_cards += 1
-            score_total = score_support_cards
-
-
-        potential_commanders.append((commander_name_from_scryfall, commander_details, relevance_str, score_total, score_cmd_bonus, score_support_cards))
-        processed_count += 1
-        progress_bar.progress(processed_count / total_items_to_process, text="Analyse et évaluation des commandants...")
-    
-    progress_bar.empty()
+    subtypes = sorted(row_indices_by_subtype)
+    # Appartenance (sous-types + changelings) x cartes, agrégée par masque exact puis sur les sous-ensembles
+    membership = np.zeros((len(subtypes) + 1, len(classified_rows)), dtype=np.float32)
+    for subtype_index, subtype in enumerate(subtypes):
+        membership[subtype_index, row_indices_by_subtype[subtype]] = 1.0
+    membership[-1, changeling_row_indices] = 1.0
+    card_masks = np.array([row['color_mask'] for row in classified_rows], dtype=np.int64)
+    playable_counts = np.rint(subset_sums(aggregate_by_color_mask(membership, card_masks))).astype(np.int64)
 
-    potential_commanders.sort(key=lambda x: (-x[3], x[0]))
+    subtype_words = _get_subtype_words(subtypes)
+    legends = {}
+    for row in classified_rows:
+        details = row['details']
+        if 'legendary' in details.get('type_line', '').lower() and details.get('name') not in legends:
+            legends[details.get('name')] = {
+                'references': get_referenced_subtypes(details, subtype_words),
+                'subtypes': get_creature_subtypes(details),
+                'changeling': _is_changeling(details),
+                'color_mask': row['color_mask'],
+            }
 
+    return {
+        'subtypes': subtypes,
+        'subtype_rows': {subtype: subtype_index for subtype_index, subtype in enumerate(subtypes)},
+        'playable_counts': playable_counts[:-1],
+        'changeling_counts': playable_counts[-1],
+        'keys_by_subtype': {subtype: frozenset(classified_rows[row_index]['cache_key'] for row_index in row_indices)
+                            for subtype, row_indices in row_indices_by_subtype.items()},
+        'changeling_keys': frozenset(classified_rows[row_index]['cache_key'] for row_index in changeling_row_indices),
+        'legends': legends,
+    }
+
+@st.cache_resource(max_entries=INVENTORY_PREFETCH_MAX_JOBS)
+def get_inventory_subtype_index(inventory_key, _inventory, _classified_rows=None):
+    """
+    Index des sous-types d'un inventaire, partagé entre les sessions et mémoïsé sur sa clé (voir compute_inventory_key).
+    `_classified_rows` évite de relire la table classifiée quand l'appelant l'a déjà.
+    """
+    if _classified_rows is None:
+        _classified_rows = load_classified_inventory(_inventory)
+    return build_subtype_index(_classified_rows)
+
+def _sort_tribes(references):
+    """Tribus citées, de la plus citée à la moins citée (puis par ordre alphabétique)."""
+    return [subtype for subtype, _ in sorted(references.items(), key=lambda item: (-item[1], item[0]))]
+
+def get_commander_tribes(subtype_index, commanders_details):
+    """
+    Tribus d'un commandant (ou d'une paire) : celles que citent leurs textes, de la plus citée à la moins citée ;
+    à défaut, leurs propres sous-types de créature.
+    """
+    references = Counter()
+    own_subtypes = []
+    for details in commanders_details:
+        legend = subtype_index['legends'].get(details.get('name'))
+        if legend:
+            references.update(legend['references'])
+        own_subtypes.extend(subtype for subtype in get_creature_subtypes(details) if subtype not in own_subtypes)
+    return _sort_tribes(references) if references else own_subtypes
+
+def get_tribe_member_keys(subtype_index, tribes):
+    """Clés d'inventaire des cartes des tribus `tribes`, changelings compris (aucune si `tribes` est vide)."""
+    if not tribes:
+        return frozenset()
+    return subtype_index['changeling_keys'].union(*(subtype_index['keys_by_subtype'].get(tribe, ()) for tribe in tribes))
+
+def get_dominant_tribes(subtype_index, colors=None, limit=DOMINANT_TRIBES_LIMIT):
+    """
+    Tribus les mieux fournies de l'inventaire, jouables dans les couleurs `colors` (toutes si vide).
+    Retourne une liste de (sous-type, créatures jouables, légendes qui citent la tribu), triée par nombre de créatures.
+    """
+    color_mask = colors_to_mask(colors) if colors else 31
+    creature_counts = subtype_index['playable_counts'][:, color_mask]
+    legend_counts = Counter(subtype for legend in subtype_index['legends'].values()
+                            if (legend['color_mask'] & ~color_mask) == 0 for subtype in legend['references'])
+    dominant_tribes = [(subtype, int(creature_counts[subtype_index['subtype_rows'][subtype]]), legend_counts[subtype])
+                       for subtype in subtype_index['subtypes']]
+    dominant_tribes.sort(key=lambda tribe: (-tribe[1], -tribe[2], tribe[0]))
+    return [tribe for tribe in dominant_tribes if tribe[1] > 0][:limit]
+
+def _get_tribal_scores(subtype_index, commanders_details, color_masks):
+    """
+    Bonus, support et tribus de la stratégie tribale pour chaque commandant (ou paire, détails en liste).
+    Bonus : TRIBAL_BONUS_PER_REFERENCE par mention d'une tribu ; support : créatures des tribus citées jouables
+    dans l'identité (changelings compris, les commandants eux-mêmes exclus). Une carte de deux tribus citées compte deux fois.
+    """
+    cmd_bonus = np.zeros(len(commanders_details), dtype=np.int64)
+    support = np.zeros(len(commanders_details), dtype=np.int64)
+    tribes = []
+    for commander_index, details in enumerate(commanders_details):
+        members = details if isinstance(details, list) else [details]
+        references = Counter()
+        for member in members:
+            references.update(subtype_index['legends'].get(member.get('name'), {}).get('references', {}))
+        color_mask = color_masks[commander_index]
+        if references:
+            tribe_rows = [subtype_index['subtype_rows'][subtype] for subtype in references]
+            own_count = sum(1 if _is_changeling(member) else len(references.keys() & set(get_creature_subtypes(member)))
+                            for member in members)
+            cmd_bonus[commander_index] = TRIBAL_BONUS_PER_REFERENCE * sum(references.values())
+            support[commander_index] = (subtype_index['playable_counts'][tribe_rows, color_mask].sum()
+                                        + subtype_index['changeling_counts'][color_mask] - own_count)
+        tribes.append(tuple(_sort_tribes(references)))
+    return cmd_bonus, support, tribes
+
+# --- Matrice des scores commandants x stratégies ---
+# L'analyse de l'inventaire calcule en une passe, pour chaque commandant (ou paire), le bonus et le nombre
+# de cartes de support de toutes les stratégies de CATEGORY_KEYWORDS. Elle ne dépend que de l'inventaire ;
+# changer de stratégie ou de couleurs ne fait que re-filtrer et re-trier ses lignes (voir rank_commanders).
+
+STRATEGY_COLUMNS = list(CATEGORY_KEYWORDS.keys())
+
+def _get_strategy_support_matrix(classified_rows):
+    """Matrice (cartes x (stratégies + 1)) : 1 si la carte soutient la stratégie ; la dernière colonne (aucune stratégie) vaut 1."""
+    support_matrix = np.zeros((len(classified_rows), len(STRATEGY_COLUMNS) + 1), dtype=np.float32)
+    strategy_columns = {strategy: column for column, strategy in enumerate(STRATEGY_COLUMNS)}
+    for row_index, row in enumerate(classified_rows):
+        for category in row['categories']:
+            column = strategy_columns.get(category)
+            if column is not None:
+                support_matrix[row_index, column] = 1.0
+    support_matrix[:, -1] = 1.0
+    return support_matrix
+
+def _get_strategy_bonus_matrix(commanders_details):
+    """Matrice (commandants x stratégies) des bonus stratégiques (voir get_strategy_bonus)."""
+    return np.array([[get_strategy_bonus(details, strategy) for strategy in STRATEGY_COLUMNS] for details in commanders_details],
+                    dtype=np.int64).reshape(len(commanders_details), len(STRATEGY_COLUMNS))
+
+def _make_commander_analysis(names, details, color_masks, cmd_bonus, support, synergy, tribes=None):
+    """Regroupe les colonnes d'une analyse ; `support` a une colonne de plus (aucune stratégie)."""
+    return {
+        'names': names,
+        'details': details,
+        'color_masks': np.asarray(color_masks, dtype=np.int64),
+        'cmd_bonus': cmd_bonus,
+        'support': np.rint(support).astype(np.int64),
+        'synergy': np.asarray(synergy, dtype=np.int64),
+        'tribes': tribes if tribes is not None else [() for _ in names],
+    }
+
+def _apply_tribal_scores(inventory, classified_rows, commanders_details, color_masks, cmd_bonus, support):
+    """
+    Remplace la colonne 'tribal' des bonus et du support (sans mots-clés) par les lectures de l'index des sous-types.
+    Retourne les tribus citées par chaque commandant (ou paire).
+    """
+    subtype_index = get_inventory_subtype_index(compute_inventory_key(inventory), inventory, classified_rows)
+    tribal_bonus, tribal_support, tribes = _get_tribal_scores(subtype_index, commanders_details, color_masks)
+    tribal_column = STRATEGY_COLUMNS.index('tribal')
+    cmd_bonus[:, tribal_column] = tribal_bonus
+    support[:, tribal_column] = tribal_support
+    return tribes
+
+@st.cache_data(ttl=3600*24) # Une analyse par inventaire, valable pour toutes les préférences
+def analyze_commanders_in_inventory(inventory):
+    """
+    Analyse tous les commandants potentiels de l'inventaire pour toutes les stratégies à la fois.
+    Retourne un dictionnaire de colonnes : 'names', 'details', 'color_masks', 'cmd_bonus' (commandants x stratégies),
+    'support' (commandants x (stratégies + aucune)), 'synergy' (indépendante de la stratégie) et 'tribes' (tribus citées).
+    La colonne 'tribal' vient de l'index des sous-types (voir build_subtype_index).
+    Le support et la synergie de tous les commandants sont calculés en produits matriciels (voir card_features).
+    """
+    classified_rows = load_classified_inventory(inventory)
+
+    commander_row_indices = [row_index for row_index, row in enumerate(classified_rows) if is_potential_commander(row['details'])]
+    commander_rows = [classified_rows[row_index] for row_index in commander_row_indices]
+    commanders_details = [row['details'] for row in commander_rows]
+    if not commander_rows:
+        return _make_commander_analysis([], [], [], _get_strategy_bonus_matrix([]),
+                                        np.zeros((0, len(STRATEGY_COLUMNS) + 1)), [])
+
+    commander_vectors = [extract_commander_features(row['details'], row['features']) for row in commander_rows]
+    synergy, compatible = compute_synergy_matrix(
+        commander_vectors, [row['color_mask'] for row in commander_rows],
+        [row['features'] for row in classified_rows], [row['color_mask'] for row in classified_rows]
+    )
+    # Un commandant ne se soutient pas lui-même
+    own_columns = np.arange(len(commander_rows)), np.asarray(commander_row_indices)
+    compatible[own_columns] = False
+    synergy[own_columns] = 0
+
+    # Cartes de support de chaque stratégie dans l'identité de chaque commandant, en un produit matriciel
+    support = compatible.astype(np.float32) @ _get_strategy_support_matrix(classified_rows)
+
+    # Synergie normalisée par la masse du vecteur du commandant : exprimée en "cartes équivalentes",
+    # elle reste comparable au nombre de cartes de support.
+    commander_norms = np.array([get_feature_vector_mass(vector) for vector in commander_vectors], dtype=np.float32)
+    synergy_scores = np.rint(synergy.sum(axis=1) / commander_norms)
+
+    color_masks = [row['color_mask'] for row in commander_rows]
+    cmd_bonus = _get_strategy_bonus_matrix(commanders_details)
+    tribes = _apply_tribal_scores(inventory, classified_rows, commanders_details, color_masks, cmd_bonus, support)
+    return _make_commander_analysis(
+        [details.get('name') for details in commanders_details], commanders_details,
+        color_masks, cmd_bonus, support, synergy_scores, tribes
+    )
+
+def rank_commanders(analysis, preferences=None):
+    """
+    Classe les lignes d'une analyse (commandants ou paires) selon les préférences, sans relire les cartes.
+    Les commandants sont filtrés par couleur et par stratégie (bonus non nul), et par tribu citée si la stratégie
+    est 'tribal' et qu'une tribu est choisie (preferences['tribe']), puis triés par score de pertinence.
+    Retourne une liste de tuples (nom_commandant, détails_scryfall, pertinence_strategique_str, score_total, score_cmd_bonus, score_support_cards, score_synergy).
+    """
+    preferred_colors = set(preferences.get('colors', [])) if preferences else set()
+    chosen_strategy = preferences.get('strategy', None) if preferences else None
+    chosen_tribe = preferences.get('tribe') if preferences and chosen_strategy == 'tribal' else None
+
+    selected = np.ones(len(analysis['names']), dtype=bool)
+    if preferred_colors:
+        selected &= (analysis['color_masks'] & ~colors_to_mask(preferred_colors)) == 0
+
+    if chosen_strategy:
+        if chosen_strategy not in STRATEGY_COLUMNS:
+            return [] # Stratégie sans mots-clés : aucun commandant n'a de bonus
+        strategy_column = STRATEGY_COLUMNS.index(chosen_strategy)
+        cmd_bonus = analysis['cmd_bonus'][:, strategy_column]
+        selected &= cmd_bonus > 0
+        if chosen_tribe:
+            selected &= np.array([chosen_tribe in tribes for tribes in analysis['tribes']], dtype=bool)
+    else:
+        strategy_column = -1
+        cmd_bonus = np.zeros(len(analysis['names']), dtype=np.int64)
+    support = analysis['support'][:, strategy_column]
+    totals = cmd_bonus + support + analysis['synergy']
+
+    relevance_str = f" (pertinent pour {chosen_strategy.capitalize()})" if chosen_strategy else ""
+    potential_commanders = [
+        (analysis['names'][i], analysis['details'][i], relevance_str, int(totals[i]), int(cmd_bonus[i]), int(support[i]), int(analysis['synergy'][i]))
+        for i in np.flatnonzero(selected)
+    ]
+    potential_commanders.sort(key=lambda x: (-x[3], x[0]))
     return potential_commanders
+
+def identify_commanders_in_inventory(inventory, preferences=None):
+    """
+    Identifie les commandants potentiels dans l'inventaire en fonction des préférences.
+    Calcule un score de pertinence stratégique détaillé pour chaque commandant.
+    Retourne une liste de tuples (nom_commandant, détails_scryfall, pertinence_strategique_str, score_total, score_cmd_bonus, score_support_cards, score_synergy).
+    L'analyse de l'inventaire est mise en cache une fois pour toutes les stratégies (voir analyze_commanders_in_inventory).
+    """
+    return rank_commanders(analyze_commanders_in_inventory(inventory), preferences)
+
+
+def _enumerate_commander_pairs(members):
+    """
+    Paires candidates parmi les membres [(row_index, row, capacités, partner_with)] : indices (premier, second),
+    le premier étant le commandant qui choisit (ex: "Choose a Background" avant le Background).
+    """
+    members_by_ability = defaultdict(list)
+    member_by_name = {}
+    for member_index, (_, row, abilities, _) in enumerate(members):
+        member_by_name[row['details'].get('name')] = member_index
+        for ability in abilities:
+            members_by_ability[ability].append(member_index)
+
+    pairs = set()
+    for first_ability, second_ability in PAIRING_RULES:
+        if first_ability == second_ability:
+            pairs.update(combinations(members_by_ability[first_ability], 2))
+        else:
+            pairs.update((first, second) for first in members_by_ability[first_ability]
+                         for second in members_by_ability[second_ability] if first != second)
+    for member_index, (_, _, _, partner_with) in enumerate(members):
+        other_index = member_by_name.get(partner_with)
+        if other_index is not None and (other_index, member_index) not in pairs:
+            pairs.add((member_index, other_index))
+    return sorted(pairs)
+
+@st.cache_data(ttl=3600*24)
+def analyze_commander_pairs_in_inventory(inventory):
+    """
+    Analyse les paires de commandants jouables ensemble (Partner, Partner with, Friends forever,
+    Choose a Background + Background, Doctor's companion + Doctor) présentes dans l'inventaire,
+    pour toutes les stratégies à la fois. Retourne les mêmes colonnes que analyze_commanders_in_inventory
+    (les détails d'une paire sont la liste des deux commandants).
+
+    L'inventaire n'est parcouru qu'une fois : les cartes sont agrégées par masque d'identité couleur (32 masques),
+    puis une transformée "somme sur les sous-ensembles" donne pour chaque identité le nombre de cartes jouables
+    de chaque stratégie et la synergie de chaque membre. Le score d'une paire est alors une lecture à l'index
+    de l'union de leurs masques.
+    """
+    classified_rows = load_classified_inventory(inventory)
+
+    # Membres possibles d'une paire (une seule impression par nom)
+    members = []
+    seen_names = set()
+    for row_index, row in enumerate(classified_rows):
+        name = row['details'].get('name')
+        if name in seen_names:
+            continue
+        abilities, partner_with = get_pairing_abilities(row['details'])
+        if not abilities and not partner_with:
+            continue
+        if not (is_potential_commander(row['details']) or 'background' in abilities):
+            continue
+        seen_names.add(name)
+        members.append((row_index, row, abilities, partner_with))
+
+    pairs = [pair for pair in _enumerate_commander_pairs(members)
+             if can_form_commander_pair(members[pair[0]][1]['details'], members[pair[1]][1]['details'])]
+    if not pairs:
+        return _make_commander_analysis([], [], [], _get_strategy_bonus_matrix([]),
+                                        np.zeros((0, len(STRATEGY_COLUMNS) + 1)), [])
+
+    member_rows = [row for _, row, _, _ in members]
+    member_row_indices = np.array([row_index for row_index, _, _, _ in members])
+    member_masks = np.array([row['color_mask'] for row in member_rows], dtype=np.int64)
+    member_cmd_bonus = _get_strategy_bonus_matrix([row['details'] for row in member_rows])
+    card_masks = np.array([row['color_mask'] for row in classified_rows], dtype=np.int64)
+
+    # Cartes jouables par identité couleur et par stratégie : comptage par masque exact puis somme sur les sous-ensembles
+    in_support = _get_strategy_support_matrix(classified_rows)
+    playable_support = subset_sums(aggregate_by_color_mask(in_support.T, card_masks)) # (stratégies + 1) x 32
+
+    # Synergie brute de chaque membre avec chaque carte, agrégée de la même façon (membres x 32)
+    member_vectors = [extract_commander_features(row['details'], row['features']) for row in member_rows]
+    raw_synergy, _ = compute_synergy_matrix(
+        member_vectors, member_masks,
+        [row['features'] for row in classified_rows], card_masks,
+        apply_color_mask=False
+    )
+    playable_synergy = subset_sums(aggregate_by_color_mask(raw_synergy, card_masks))
+    member_norms = np.array([max(1.0, sum(vector.values())) for vector in member_vectors])
+
+    first = np.array([pair[0] for pair in pairs])
+    second = np.array([pair[1] for pair in pairs])
+    union_masks = member_masks[first] | member_masks[second]
+    first_rows, second_rows = member_row_indices[first], member_row_indices[second]
+
+    # Les deux commandants ne comptent ni comme support ni dans la synergie de la paire
+    support_counts = playable_support[:, union_masks].T - in_support[first_rows] - in_support[second_rows]
+    self_synergy = (raw_synergy[first, first_rows] + raw_synergy[first, second_rows]
+                    + raw_synergy[second, first_rows] + raw_synergy[second, second_rows])
+    pair_synergy = playable_synergy[first, union_masks] + playable_synergy[second, union_masks] - self_synergy
+    synergy_scores = np.rint(pair_synergy / (member_norms[first] + member_norms[second]))
+
+    pairs_details = [[member_rows[first_index]['details'], member_rows[second_index]['details']] for first_index, second_index in pairs]
+    cmd_bonus = member_cmd_bonus[first] + member_cmd_bonus[second]
+    tribes = _apply_tribal_scores(inventory, classified_rows, pairs_details, union_masks, cmd_bonus, support_counts)
+    return _make_commander_analysis(
+        [f"{first_details.get('name')} + {second_details.get('name')}" for first_details, second_details in pairs_details],
+        pairs_details, union_masks, cmd_bonus, support_counts, synergy_scores, tribes
+    )
+
+def identify_commander_pairs_in_inventory(inventory, preferences=None):
+    """
+    Identifie les paires de commandants de l'inventaire en fonction des préférences (voir analyze_commander_pairs_in_inventory).
+    Retourne une liste de tuples (nom_paire, [détails_1, détails_2], pertinence_strategique_str, score_total,
+    score_cmd_bonus, score_support_cards, score_synergy), triée comme identify_commanders_in_inventory.
+    """
+    return rank_commanders(analyze_commander_pairs_in_inventory(inventory), preferences)
+
+# --- Commandants similaires (plus proches voisins) ---
+# Chaque commandant potentiel de l'inventaire est décrit par son profil (voir extract_commander_profile) ;
+# la matrice normalisée des profils est construite une fois par inventaire. Chercher les commandants proches
+# d'un commandant (ou d'une paire) est ensuite un produit matrice-vecteur suivi d'une sélection partielle.
+
+def build_commander_profile_index(classified_rows):
+    """
+    Construit l'index des profils des commandants potentiels d'une table classifiée (voir classify_inventory) :
+    'names', 'details', 'color_masks', 'rows' ({nom: ligne de la matrice}), 'matrix' (profils normalisés) et 'vocabulary'.
+    Un nom présent en plusieurs impressions n'a qu'une ligne.
+    """
+    names = []
+    rows = {}
+    commanders_details = []
+    color_masks = []
+    profile_vectors = []
+    for row in classified_rows:
+        details = row['details']
+        name = details.get('name')
+        if not is_potential_commander(details) or name in rows:
+            continue
+        rows[name] = len(names)
+        names.append(name)
+        commanders_details.append(details)
+        color_masks.append(row['color_mask'])
+        profile_vectors.append(extract_commander_profile(details, row['categories'], row['features']))
+    matrix, vocabulary = build_profile_matrix(profile_vectors)
+    return {
+        'names': names,
+        'details': commanders_details,
+        'color_masks': np.asarray(color_masks, dtype=np.int64),
+        'rows': rows,
+        'matrix': matrix,
+        'vocabulary': vocabulary,
+    }
+
+@st.cache_resource(max_entries=INVENTORY_PREFETCH_MAX_JOBS)
+def get_inventory_commander_profiles(inventory_key, _inventory, _classified_rows=None):
+    """
+    Index des profils des commandants d'un inventaire, partagé entre les sessions et mémoïsé sur sa clé
+    (voir compute_inventory_key). `_classified_rows` évite de relire la table classifiée quand l'appelant l'a déjà.
+    """
+    if _classified_rows is None:
+        _classified_rows = load_classified_inventory(_inventory)
+    return build_commander_profile_index(_classified_rows)
+
+def find_similar_commanders(profile_index, commander_names, limit=SIMILAR_COMMANDERS_LIMIT, colors=None):
+    """
+    Commandants de l'index les plus proches (similarité cosinus des profils) d'un commandant ou d'une paire
+    (`commander_names` : un ou deux noms ; le profil d'une paire est la somme de ceux de ses membres).
+    `colors` restreint aux commandants dont l'identité y est incluse. Les membres eux-mêmes sont exclus.
+    Retourne une liste de (nom, détails_scryfall, similarité), de la plus proche à la moins proche.
+    """
+    member_rows = [profile_index['rows'][name] for name in commander_names if name in profile_index['rows']]
+    if not member_rows:
+        return []
+    query = profile_index['matrix'][member_rows].sum(axis=0)
+    similarities = profile_index['matrix'] @ (query / max(float(np.linalg.norm(query)), 1e-12))
+
+    candidates = np.ones(len(similarities), dtype=bool)
+    candidates[member_rows] = False
+    if colors:
+        candidates &= (profile_index['color_masks'] & ~colors_to_mask(colors)) == 0
+    candidate_rows = np.flatnonzero(candidates)
+    if len(candidate_rows) > limit: # Sélection partielle : seuls les `limit` meilleurs sont triés
+        candidate_rows = candidate_rows[np.argpartition(-similarities[candidate_rows], limit - 1)[:limit]]
+    candidate_rows = sorted(candidate_rows, key=lambda row_index: (-similarities[row_index], profile_index['names'][row_index]))
+    return [(profile_index['names'][row_index], profile_index['details'][row_index], float(similarities[row_index]))
+            for row_index in candidate_rows]
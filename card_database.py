@@ -0,0 +1,386 @@
+# card_database.py
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+
+import numpy as np
+
+from config import CARD_DATABASE_FILE
+
+# Base de cartes binaire, ouverte en mmap : tous les processus Streamlit partagent les mêmes pages
+# et l'ouverture ne dépend pas du nombre de cartes (aucun JSON à relire, aucun dictionnaire à reconstruire).
+# Format du fichier :
+#   en-tête (HEADER_STRUCT)
+#   enregistrements à largeur fixe (RECORD_DTYPE) : colonnes numériques, masques, et (position, longueur)
+#   de chaque chaîne dans la table de chaînes
+#   empreintes 64 bits triées des clés d'inventaire, et l'index (uint32) des enregistrements correspondants
+#   deux index triés (uint32) : par nom et par impression ("SET numéro")
+#   table de chaînes UTF-8 (chaque chaîne distincte n'est stockée qu'une fois)
+# Une liste de clés est cherchée en une fois (np.searchsorted sur les empreintes) ; les noms et impressions
+# par recherche dichotomique. Seules les cartes trouvées sont décodées.
+
+DATABASE_MAGIC = b'MTGCDB01'
+# magic, version, nb d'enregistrements, nb de cartes trouvées, indicateurs de la base, 6 positions
+HEADER_STRUCT = struct.Struct('<8sIIII6Q')
+DATABASE_VERSION = 2
+# Version 1 : même en-tête sans indicateurs, encore lue pour ne pas perdre ses cartes à la prochaine intégration
+LEGACY_HEADER_STRUCTS = {1: struct.Struct('<8sIII6Q')}
+DATABASE_FLAG_BULK_DATA = 1 # La base contient les données en masse Scryfall, pas seulement les cartes des inventaires
+
+STRING_FIELDS = ('key', 'name', 'set', 'collector_number', 'print_key', 'type_line', 'oracle_text', 'mana_cost', 'rarity', 'keywords')
+
+RECORD_DTYPE = np.dtype(
+    [(f"{field}_{part}", '<u4') for field in STRING_FIELDS for part in ('offset', 'length')]
+    + [('cmc', '<f4'), ('edhrec_rank', '<i4'), ('price_usd', '<f4'),
+       ('color_identity', 'u1'), ('colors', 'u1'), ('produced_mana', 'u1'), ('flags', 'u1'), ('commander_legality', 'u1')]
+)
+
+# Position de chaque colonne dans un enregistrement lu d'un bloc (tuple), et des chaînes à décoder
+RECORD_FIELD_POSITIONS = {name: position for position, name in enumerate(RECORD_DTYPE.names)}
+DECODED_STRING_POSITIONS = [(field, RECORD_FIELD_POSITIONS[f"{field}_offset"], RECORD_FIELD_POSITIONS[f"{field}_length"])
+                            for field in STRING_FIELDS if field not in ('key', 'print_key')]
+
+MANA_LETTERS = ['W', 'U', 'B', 'R', 'G', 'C'] # Bits 0 à 5 des masques de couleurs et de mana produit
+COMMANDER_LEGALITIES = ['', 'legal', 'not_legal', 'banned', 'restricted']
+FLAG_FOUND = 1 # Absent : Scryfall a répondu 'not_found' pour cette clé
+FLAG_FOIL = 2
+FLAG_BULK_DATA = 4 # Carte venue des données en masse (gardée quand on vide le cache des cartes résolues)
+KEYWORD_SEPARATOR = '\n'
+
+def _letters_to_mask(letters):
+    return sum(1 << MANA_LETTERS.index(letter) for letter in set(letters or []) if letter in MANA_LETTERS)
+
+MASK_LETTERS = [[letter for bit, letter in enumerate(MANA_LETTERS) if mask & (1 << bit)] for mask in range(1 << len(MANA_LETTERS))]
+
+def _mask_to_letters(mask):
+    return list(MASK_LETTERS[mask])
+
+def get_print_key(set_code, collector_number):
+    """Clé d'impression, unique pour une carte : 'SET numéro'."""
+    return f"{str(set_code).upper()} {collector_number}"
+
+def hash_card_key(cache_key):
+    """Empreinte 64 bits stable d'une clé d'inventaire (identique dans tous les processus)."""
+    return int.from_bytes(hashlib.blake2b(cache_key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def _align(position, alignment=8):
+    return -(-position // alignment) * alignment
+
+# --- Construction ---
+
+def build_card_database(cards_by_key, path=CARD_DATABASE_FILE, database_flags=0, bulk_data_keys=frozenset()):
+    """
+    Écrit la base binaire à partir d'un dictionnaire {clé d'inventaire: données Scryfall ou None (carte introuvable)}.
+    `database_flags` combine les indicateurs DATABASE_FLAG_* de la base ; les clés de `bulk_data_keys` sont
+    marquées comme venant des données en masse (FLAG_BULK_DATA).
+    Le fichier est remplacé atomiquement : les processus qui ont ouvert l'ancienne version la gardent jusqu'à
+    leur prochaine ouverture. Retourne le nombre d'enregistrements écrits.
+    """
+    keys = sorted(cards_by_key)
+    records = np.zeros(len(keys), dtype=RECORD_DTYPE)
+    string_table = bytearray()
+    string_positions = {}
+
+    def intern(value):
+        encoded = value.encode('utf-8')
+        position = string_positions.get(encoded)
+        if position is None:
+            position = string_positions[encoded] = len(string_table)
+            string_table.extend(encoded)
+        return position, len(encoded)
+
+    for index, key in enumerate(keys):
+        card_data = cards_by_key[key] or {}
+        price_usd = (card_data.get('prices') or {}).get('usd')
+        values = {
+            'key': key,
+            'name': card_data.get('name', ''),
+            'set': card_data.get('set', ''),
+            'collector_number': card_data.get('collector_number', ''),
+            'print_key': get_print_key(card_data.get('set', ''), card_data.get('collector_number', '')) if card_data else '',
+            'type_line': card_data.get('type_line', ''),
+            'oracle_text': card_data.get('oracle_text', ''),
+            'mana_cost': card_data.get('mana_cost', ''),
+            'rarity': card_data.get('rarity', ''),
+            'keywords': KEYWORD_SEPARATOR.join(card_data.get('keywords', [])),
+        }
+        record = records[index]
+        for field in STRING_FIELDS:
+            record[f"{field}_offset"], record[f"{field}_length"] = intern(values[field])
+        record['cmc'] = card_data.get('cmc', 0) or 0
+        record['edhrec_rank'] = card_data.get('edhrec_rank') or -1
+        record['price_usd'] = float(price_usd) if price_usd else np.nan
+        record['color_identity'] = _letters_to_mask(card_data.get('color_identity'))
+        record['colors'] = _letters_to_mask(card_data.get('colors'))
+        record['produced_mana'] = _letters_to_mask(card_data.get('produced_mana'))
+        record['flags'] = ((FLAG_FOUND if card_data else 0) | (FLAG_FOIL if card_data.get('foil') else 0)
+                           | (FLAG_BULK_DATA if key in bulk_data_keys else 0))
+        commander_legality = (card_data.get('legalities') or {}).get('commander', '')
+        record['commander_legality'] = COMMANDER_LEGALITIES.index(commander_legality) if commander_legality in COMMANDER_LEGALITIES else 0
+
+    key_hashes = np.array([hash_card_key(key) for key in keys], dtype='<u8')
+    key_index = np.argsort(key_hashes, kind='stable').astype('<u4')
+    key_hashes = key_hashes[key_index]
+    found_indices = [i for i, key in enumerate(keys) if cards_by_key[key]]
+    name_index = np.array(sorted(found_indices, key=lambda i: (cards_by_key[keys[i]].get('name', ''), keys[i])), dtype='<u4')
+    print_index = np.array(sorted(found_indices, key=lambda i: (get_print_key(cards_by_key[keys[i]].get('set', ''), cards_by_key[keys[i]].get('collector_number', '')), keys[i])), dtype='<u4')
+
+    records_offset = _align(HEADER_STRUCT.size)
+    key_hashes_offset = _align(records_offset + records.nbytes)
+    key_index_offset = _align(key_hashes_offset + key_hashes.nbytes)
+    name_index_offset = _align(key_index_offset + key_index.nbytes)
+    print_index_offset = _align(name_index_offset + name_index.nbytes)
+    strings_offset = _align(print_index_offset + print_index.nbytes)
+
+    temporary_path = f"{path}.tmp{os.getpid()}"
+    with open(temporary_path, 'wb') as f:
+        f.write(HEADER_STRUCT.pack(DATABASE_MAGIC, DATABASE_VERSION, len(keys), len(found_indices), database_flags,
+                                   records_offset, key_hashes_offset, key_index_offset, name_index_offset, print_index_offset, strings_offset))
+        for offset, array in ((records_offset, records), (key_hashes_offset, key_hashes), (key_index_offset, key_index),
+                              (name_index_offset, name_index), (print_index_offset, print_index)):
+            f.seek(offset)
+            f.write(array.tobytes())
+        f.seek(strings_offset)
+        f.write(string_table)
+        f.truncate(strings_offset + len(string_table)) # Taille exacte, même sans chaîne ni carte
+    os.replace(temporary_path, path)
+    close_card_database()
+    return len(keys)
+
+# --- Lecture ---
+
+_open_database = None # (chemin, mtime, taille, base ouverte)
+_open_database_lock = threading.Lock()
+
+def open_card_database(path=CARD_DATABASE_FILE):
+    """
+    Ouvre la base en mmap (une fois par version du fichier et par processus).
+    Retourne un dictionnaire de vues NumPy sur le fichier, ou None si la base est absente ou invalide.
+    """
+    global _open_database
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    file_version = (path, stat.st_mtime_ns, stat.st_size)
+    with _open_database_lock:
+        if _open_database is not None and _open_database[0] == file_version:
+            return _open_database[1]
+        try:
+            with open(path, 'rb') as f:
+                database_mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        if len(database_mmap) < HEADER_STRUCT.size:
+            return None
+        magic, version = struct.unpack_from('<8sI', database_mmap, 0)
+        if magic != DATABASE_MAGIC:
+            return None
+        if version == DATABASE_VERSION:
+            (_, _, record_count, found_count, database_flags, records_offset, key_hashes_offset, key_index_offset,
+             name_index_offset, print_index_offset, strings_offset) = HEADER_STRUCT.unpack_from(database_mmap, 0)
+        elif version in LEGACY_HEADER_STRUCTS:
+            database_flags = 0
+            (_, _, record_count, found_count, records_offset, key_hashes_offset, key_index_offset,
+             name_index_offset, print_index_offset, strings_offset) = LEGACY_HEADER_STRUCTS[version].unpack_from(database_mmap, 0)
+        else:
+            return None
+        records = np.frombuffer(database_mmap, dtype=RECORD_DTYPE, count=record_count, offset=records_offset)
+        database = {
+            'mmap': database_mmap,
+            'record_count': record_count,
+            'database_flags': database_flags,
+            'records': records,
+            'columns': {name: records[name] for name in RECORD_DTYPE.names}, # Vues, sans copie
+            'key_hashes': np.frombuffer(database_mmap, dtype='<u8', count=record_count, offset=key_hashes_offset),
+            'key_index': np.frombuffer(database_mmap, dtype='<u4', count=record_count, offset=key_index_offset),
+            'name_index': np.frombuffer(database_mmap, dtype='<u4', count=found_count, offset=name_index_offset),
+            'print_index': np.frombuffer(database_mmap, dtype='<u4', count=found_count, offset=print_index_offset),
+            'strings': memoryview(database_mmap)[strings_offset:],
+        }
+        _open_database = (file_version, database)
+        return database
+
+def close_card_database():
+    """Oublie la base ouverte (elle sera rouverte, éventuellement dans sa nouvelle version, au prochain accès)."""
+    global _open_database
+    with _open_database_lock:
+        _open_database = None
+
+def _read_string(database, field, record_index):
+    columns = database['columns']
+    offset = int(columns[f"{field}_offset"][record_index])
+    length = int(columns[f"{field}_length"][record_index])
+    return str(database['strings'][offset : offset + length], 'utf-8')
+
+def _find_record(database, index_name, field, target):
+    """Recherche dichotomique de `target` dans un index trié ; retourne le numéro d'enregistrement ou None."""
+    index = database[index_name]
+    low, high = 0, len(index)
+    while low < high:
+        middle = (low + high) // 2
+        if _read_string(database, field, int(index[middle])) < target:
+            low = middle + 1
+        else:
+            high = middle
+    if low < len(index) and _read_string(database, field, int(index[low])) == target:
+        return int(index[low])
+    return None
+
+def _decode_record(database, record_index):
+    """Reconstruit les données d'une carte au format Scryfall (champs utilisés par l'application)."""
+    record = database['records'][record_index].item() # Un seul accès à l'enregistrement (tuple)
+    field = lambda name: record[RECORD_FIELD_POSITIONS[name]]
+    flags = field('flags')
+    if not flags & FLAG_FOUND:
+        return None
+    strings = database['strings']
+    text = {name: str(strings[record[offset_position] : record[offset_position] + record[length_position]], 'utf-8')
+            for name, offset_position, length_position in DECODED_STRING_POSITIONS}
+    commander_legality = COMMANDER_LEGALITIES[field('commander_legality')]
+    edhrec_rank = field('edhrec_rank')
+    price_usd = field('price_usd')
+    return {
+        'name': text['name'],
+        'set': text['set'],
+        'collector_number': text['collector_number'],
+        'type_line': text['type_line'],
+        'oracle_text': text['oracle_text'],
+        'mana_cost': text['mana_cost'],
+        'rarity': text['rarity'],
+        'cmc': field('cmc'),
+        'color_identity': _mask_to_letters(field('color_identity')),
+        'colors': _mask_to_letters(field('colors')),
+        'produced_mana': _mask_to_letters(field('produced_mana')),
+        'keywords': text['keywords'].split(KEYWORD_SEPARATOR) if text['keywords'] else [],
+        'foil': bool(flags & FLAG_FOIL),
+        'legalities': {'commander': commander_legality} if commander_legality else {},
+        'edhrec_rank': edhrec_rank if edhrec_rank >= 0 else None,
+        'prices': {'usd': f"{price_usd:.2f}" if price_usd == price_usd else None}, # NaN : pas de prix
+    }
+
+def lookup_cards_by_keys(cache_keys, database=None):
+    """
+    Cherche une liste de clés d'inventaire en une seule recherche vectorisée sur les empreintes.
+    Retourne {clé: données ou None si Scryfall l'a déclarée introuvable} pour les seules clés connues.
+    """
+    database = database or open_card_database()
+    if database is None or not cache_keys or not database['record_count']:
+        return {}
+    key_hashes, key_index = database['key_hashes'], database['key_index']
+    hashes = np.array([hash_card_key(key) for key in cache_keys], dtype='<u8')
+    positions = np.searchsorted(key_hashes, hashes)
+    # Seules les clés dont l'empreinte figure dans la base sont vérifiées puis décodées
+    matched = (positions < len(key_hashes)) & (key_hashes[np.minimum(positions, len(key_hashes) - 1)] == hashes)
+    known_cards = {}
+    for candidate in np.flatnonzero(matched).tolist():
+        cache_key, target_hash, position = cache_keys[candidate], hashes[candidate], int(positions[candidate])
+        # Plusieurs clés peuvent partager une empreinte : on vérifie la clé elle-même
+        while position < len(key_hashes) and key_hashes[position] == target_hash:
+            record_index = int(key_index[position])
+            if _read_string(database, 'key', record_index) == cache_key:
+                known_cards[cache_key] = _decode_record(database, record_index)
+                break
+            position += 1
+    return known_cards
+
+def get_card_by_print(set_code, collector_number, database=None):
+    """Données de la carte imprimée (set, numéro de collection), ou None si inconnue."""
+    database = database or open_card_database()
+    if database is None:
+        return None
+    record_index = _find_record(database, 'print_index', 'print_key', get_print_key(set_code, collector_number))
+    return _decode_record(database, record_index) if record_index is not None else None
+
+def get_card_by_name(card_name, database=None):
+    """Données d'une impression de la carte portant ce nom exact, ou None si inconnue."""
+    database = database or open_card_database()
+    if database is None:
+        return None
+    record_index = _find_record(database, 'name_index', 'name', card_name)
+    return _decode_record(database, record_index) if record_index is not None else None
+
+def get_card_database_version(path=CARD_DATABASE_FILE):
+    """Version du fichier de la base (date de modification, taille), ou None s'il est absent : clé des index dérivés."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def get_card_database_flags(database=None):
+    """Indicateurs DATABASE_FLAG_* de la base (0 si elle est absente)."""
+    database = database or open_card_database()
+    return database['database_flags'] if database is not None else 0
+
+def get_bulk_data_keys(database=None):
+    """Clés des cartes venues des données en masse (ensemble vide sans base)."""
+    database = database or open_card_database()
+    if database is None:
+        return set()
+    record_indices = np.flatnonzero(database['columns']['flags'] & FLAG_BULK_DATA)
+    return set(read_string_column('key', record_indices, database))
+
+def read_string_column(field, record_indices, database=None):
+    """Chaînes du champ `field` des enregistrements `record_indices` (sans décoder le reste des cartes)."""
+    database = database or open_card_database()
+    if database is None:
+        return []
+    columns, strings = database['columns'], database['strings']
+    offsets = columns[f"{field}_offset"][record_indices].tolist()
+    lengths = columns[f"{field}_length"][record_indices].tolist()
+    return [str(strings[offset : offset + length], 'utf-8') for offset, length in zip(offsets, lengths)]
+
+def read_all_cards(database=None):
+    """Décode toute la base en {clé: données ou None} (utilisé pour la reconstruire avec de nouvelles cartes)."""
+    database = database or open_card_database()
+    if database is None:
+        return {}
+    return {_read_string(database, 'key', i): _decode_record(database, i) for i in range(database['record_count'])}
+
+def _build_from_bulk_data(bulk_data_path, path=CARD_DATABASE_FILE):
+    """Ajoute à la base les cartes d'un fichier de données en masse Scryfall (tableau JSON de cartes)."""
+    with open(bulk_data_path, 'r', encoding='utf-8') as f:
+        bulk_cards = json.load(f)
+    cards_by_key = read_all_cards()
+    bulk_data_keys = get_bulk_data_keys()
+    for card_data in bulk_cards:
+        cache_key = f"{card_data.get('name')} ({card_data.get('set', '').upper()}) {card_data.get('collector_number')}"
+        cards_by_key[cache_key] = card_data
+        bulk_data_keys.add(cache_key)
+    return build_card_database(cards_by_key, path, get_card_database_flags() | DATABASE_FLAG_BULK_DATA, bulk_data_keys)
+
+def remove_resolved_cards(path=CARD_DATABASE_FILE):
+    """
+    Vide la base des cartes résolues pour les inventaires en gardant celles des données en masse : la base est
+    reconstruite avec ces seules cartes, ou supprimée s'il n'y en a pas. Une base importée avant le marquage
+    des cartes (aucune marquée) est gardée telle quelle, faute de pouvoir les distinguer.
+    Retourne le nombre de cartes gardées.
+    """
+    database = open_card_database(path)
+    if database is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return 0
+    bulk_data_keys = get_bulk_data_keys(database)
+    if not bulk_data_keys:
+        if get_card_database_flags(database) & DATABASE_FLAG_BULK_DATA:
+            return database['record_count']
+        close_card_database()
+        os.remove(path)
+        return 0
+    cards_by_key = {key: card_data for key, card_data in read_all_cards(database).items() if key in bulk_data_keys}
+    return build_card_database(cards_by_key, path, DATABASE_FLAG_BULK_DATA, bulk_data_keys)
+
+if __name__ == "__main__":
+    # python card_database.py                      -> intègre les points de reprise Scryfall à la base
+    # python card_database.py default-cards.json   -> intègre en plus un fichier de données en masse Scryfall
+    from scryfall_api import compact_resolved_cards_store
+    if len(sys.argv) > 1:
+        print(f"{_build_from_bulk_data(sys.argv[1])} cartes dans {CARD_DATABASE_FILE}")
+    print(f"{compact_resolved_cards_store()} cartes dans {CARD_DATABASE_FILE}")
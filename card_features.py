@@ -0,0 +1,186 @@
+# card_features.py
+
+import numpy as np
+
+from scryfall_api import get_color_identity, get_creature_subtypes
+from config import CATEGORY_KEYWORDS, SYNERGY_FEATURE_WEIGHTS, PROFILE_FEATURE_WEIGHTS, PROFILE_MAX_CMC
+
+# Chaque carte est décrite par un vecteur creux {caractéristique: poids} :
+#   'cat:<catégorie>' -> nombre de mots-clés de CATEGORY_KEYWORDS trouvés dans le texte / la ligne de type
+#   'kw:<mot-clé>'    -> mots-clés Scryfall (Flying, Landfall, ...)
+#   'sub:<sous-type>' -> sous-types de créature
+#   'mana:<couleur>'  -> mana produit
+# La synergie commandant -> carte est le produit scalaire de leurs vecteurs, calculé pour
+# tous les commandants et toutes les cartes en un seul produit matriciel.
+
+def extract_card_features(card_details):
+    """Transforme une carte Scryfall en vecteur creux de caractéristiques pondérées."""
+    features = {}
+    oracle_text = card_details.get('oracle_text', '').lower()
+    type_line = card_details.get('type_line', '').lower()
+
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        hits = sum(1 for keyword in keywords if keyword in oracle_text or keyword in type_line)
+        if hits:
+            features[f"cat:{category}"] = hits * SYNERGY_FEATURE_WEIGHTS['cat']
+
+    for keyword in card_details.get('keywords', []):
+        features[f"kw:{keyword.lower()}"] = SYNERGY_FEATURE_WEIGHTS['kw']
+
+    for subtype in get_creature_subtypes(card_details):
+        features[f"sub:{subtype.lower()}"] = SYNERGY_FEATURE_WEIGHTS['sub']
+
+    for color in card_details.get('produced_mana', []):
+        features[f"mana:{color}"] = SYNERGY_FEATURE_WEIGHTS['mana']
+
+    return features
+
+def extract_commander_features(commander_details, card_features=None):
+    """
+    Vecteur d'un commandant : celui de la carte, mais le mana recherché est celui de son identité couleur
+    (les cartes qui produisent ses couleurs le soutiennent, peu importe ce qu'il produit lui-même).
+    """
+    features = dict(card_features if card_features is not None else extract_card_features(commander_details))
+    for feature in [f for f in features if f.startswith('mana:')]:
+        del features[feature]
+    for color in get_color_identity(commander_details):
+        features[f"mana:{color}"] = SYNERGY_FEATURE_WEIGHTS['mana']
+    return features
+
+def build_feature_matrix(feature_vectors, vocabulary):
+    """Matrice dense (lignes x vocabulaire) ; les caractéristiques hors vocabulaire sont ignorées."""
+    matrix = np.zeros((len(feature_vectors), len(vocabulary)), dtype=np.float32)
+    for row, features in enumerate(feature_vectors):
+        for feature, weight in features.items():
+            column = vocabulary.get(feature)
+            if column is not None:
+                matrix[row, column] = weight
+    return matrix
+
+def compute_synergy_matrix(commander_vectors, commander_masks, card_vectors, card_masks, apply_color_mask=True):
+    """
+    Calcule en un produit matriciel la synergie de chaque commandant avec chaque carte.
+    Le vocabulaire est restreint aux caractéristiques des commandants (les autres ne contribuent pas).
+    Retourne (synergy, compatible) de forme (commandants x cartes) ; synergy vaut 0 hors identité couleur
+    sauf si `apply_color_mask` est False (synergie brute, utile pour agréger par masque de couleurs).
+    """
+    vocabulary = {}
+    for features in commander_vectors:
+        for feature in features:
+            vocabulary.setdefault(feature, len(vocabulary))
+
+    commander_matrix = build_feature_matrix(commander_vectors, vocabulary)
+    card_matrix = build_feature_matrix(card_vectors, vocabulary)
+
+    commander_masks = np.asarray(commander_masks, dtype=np.int8)
+    card_masks = np.asarray(card_masks, dtype=np.int8)
+    compatible = (card_masks[np.newaxis, :] & ~commander_masks[:, np.newaxis]) == 0
+
+    synergy = commander_matrix @ card_matrix.T
+    if apply_color_mask:
+        synergy *= compatible
+    return synergy, compatible
+
+def combine_feature_vectors(feature_vectors):
+    """Somme de plusieurs vecteurs creux (ex: les deux commandants d'une paire)."""
+    combined = {}
+    for features in feature_vectors:
+        for feature, weight in features.items():
+            combined[feature] = combined.get(feature, 0.0) + weight
+    return combined
+
+def get_feature_vector_mass(features):
+    """Masse d'un vecteur de commandant (au moins 1) : divisée par elle, la synergie se compare d'un commandant à l'autre."""
+    return max(1.0, sum(features.values()))
+
+def get_commander_vector_mass(commander_details):
+    """Masse du vecteur de compute_card_synergy pour ce commandant ou cette paire (vecteurs additionnés)."""
+    commanders_details = commander_details if isinstance(commander_details, list) else [commander_details]
+    return get_feature_vector_mass(combine_feature_vectors(extract_commander_features(details) for details in commanders_details))
+
+# --- Profils de commandants (similarité cosinus) ---
+# Le profil d'un commandant décrit ce qu'il fait plutôt que ce qu'il soutient :
+#   'cat:<catégorie>'  -> catégories de classify_card, pondérées par leurs mots-clés trouvés (au moins 1)
+#   'color:<couleur>'  -> couleurs de l'identité
+#   'cmc:<coût>'       -> tranche de coût, les tranches voisines à moitié (deux coûts proches restent similaires)
+#   'kw:<mot-clé>'     -> mots-clés Scryfall
+# Les profils sont rangés une fois dans une matrice aux lignes normalisées : la similarité cosinus d'un
+# commandant avec tous les autres est alors un seul produit matrice-vecteur.
+
+def extract_commander_profile(card_details, categories, card_features=None):
+    """Vecteur creux du profil d'un commandant ; `categories` vient de classify_card."""
+    card_features = card_features if card_features is not None else extract_card_features(card_details)
+    profile = {}
+    for category in categories:
+        keyword_hits = card_features.get(f"cat:{category}", 0.0) / SYNERGY_FEATURE_WEIGHTS['cat']
+        profile[f"cat:{category}"] = max(1.0, keyword_hits) * PROFILE_FEATURE_WEIGHTS['cat']
+
+    for color in get_color_identity(card_details):
+        profile[f"color:{color}"] = PROFILE_FEATURE_WEIGHTS['color']
+
+    cmc = min(PROFILE_MAX_CMC, int(card_details.get('cmc', 0) or 0))
+    profile[f"cmc:{cmc}"] = PROFILE_FEATURE_WEIGHTS['cmc']
+    for neighbour_cmc in (cmc - 1, cmc + 1):
+        if 0 <= neighbour_cmc <= PROFILE_MAX_CMC:
+            profile[f"cmc:{neighbour_cmc}"] = PROFILE_FEATURE_WEIGHTS['cmc'] / 2
+
+    for keyword in card_details.get('keywords', []):
+        profile[f"kw:{keyword.lower()}"] = PROFILE_FEATURE_WEIGHTS['kw']
+    return profile
+
+def normalize_rows(matrix):
+    """Lignes de norme 1 (les lignes nulles restent nulles), pour que le produit scalaire soit le cosinus."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, np.finfo(np.float32).tiny)
+
+def build_profile_matrix(profile_vectors):
+    """Retourne (matrice normalisée (profils x vocabulaire), vocabulaire {caractéristique: colonne})."""
+    vocabulary = {}
+    for profile in profile_vectors:
+        for feature in profile:
+            vocabulary.setdefault(feature, len(vocabulary))
+    return normalize_rows(build_feature_matrix(profile_vectors, vocabulary)), vocabulary
+
+# --- Agrégats par masque d'identité couleur (32 masques sur 5 bits) ---
+
+COLOR_MASK_COUNT = 32
+
+def aggregate_by_color_mask(values, card_masks):
+    """
+    Somme les colonnes de `values` (lignes x cartes) par masque d'identité exact des cartes.
+    Retourne un tableau (lignes x 32).
+    """
+    one_hot = np.zeros((len(card_masks), COLOR_MASK_COUNT), dtype=np.float32)
+    one_hot[np.arange(len(card_masks)), np.asarray(card_masks, dtype=np.int64)] = 1.0
+    return np.asarray(values, dtype=np.float32) @ one_hot
+
+def subset_sums(per_mask_values):
+    """
+    Transformée "somme sur les sous-ensembles" sur le dernier axe (32 masques) :
+    result[..., m] = somme des per_mask_values[..., s] pour tout s inclus dans m.
+    Ainsi, result[..., identité] totalise toutes les cartes jouables dans cette identité couleur.
+    """
+    result = np.array(per_mask_values, dtype=np.float64, copy=True)
+    masks = np.arange(COLOR_MASK_COUNT)
+    for bit in range(5):
+        with_bit = masks[(masks >> bit) & 1 == 1]
+        result[..., with_bit] += result[..., with_bit ^ (1 << bit)]
+    return result
+
+def compute_card_synergy(commander_details, cards_details):
+    """
+    Synergie du commandant avec chaque carte : {cache_key: score}.
+    `commander_details` peut être une liste (paire de commandants) : leurs vecteurs sont additionnés.
+    `cards_details` est un dictionnaire {cache_key: détails Scryfall}.
+    """
+    if not cards_details:
+        return {}
+    commanders_details = commander_details if isinstance(commander_details, list) else [commander_details]
+    cache_keys = list(cards_details.keys())
+    synergy, _ = compute_synergy_matrix(
+        [combine_feature_vectors(extract_commander_features(details) for details in commanders_details)],
+        [0b11111], # La synergie brute, sans filtre d'identité (l'appelant filtre déjà les couleurs)
+        [extract_card_features(cards_details[key]) for key in cache_keys],
+        [0] * len(cache_keys)
+    )
+    return dict(zip(cache_keys, synergy[0].tolist()))
@@ -0,0 +1,193 @@
+# card_search.py
+
+import re
+from collections import defaultdict
+
+import numpy as np
+import streamlit as st
+
+from card_classifier import load_classified_inventory, compute_inventory_key
+from scryfall_api import colors_to_mask, get_mana_value
+from config import INVENTORY_PREFETCH_MAX_JOBS
+
+# Recherche dans l'inventaire avec une syntaxe proche de celle de Scryfall, par exemple :
+#   t:creature cmc<=3 id:WU cat:draw o:"draw a card" -in:deck
+# Les termes sont combinés par ET ; un '-' devant un terme l'inverse. Un mot sans champ cherche dans le nom.
+#   t: / type:       ligne de type (ex: t:elf, t:legendary)
+#   o: / oracle:     texte de la carte
+#   cat:             catégorie du classifieur (ramp, draw, token, ...)
+#   kw: / keyword:   mot-clé Scryfall (flying, landfall, ...)
+#   r: / rarity:     rareté
+#   cmc / mv         valeur de mana, avec : = != < <= > >=
+#   id: / identity:  identité couleur (WUBRG, C pour incolore) ; ':' et '<=' = incluse dans, '>=' = contient, '=' = exactement
+#   in:deck          cartes du deck généré
+# Les index (inversés pour catégories, types, mots-clés et raretés, tableau trié pour la valeur de mana,
+# masques de couleurs) sont construits une fois par inventaire à partir de sa table classifiée.
+
+FIELD_ALIASES = {
+    't': 'type', 'type': 'type',
+    'o': 'oracle', 'oracle': 'oracle',
+    'cat': 'category', 'category': 'category',
+    'kw': 'keyword', 'keyword': 'keyword',
+    'r': 'rarity', 'rarity': 'rarity',
+    'cmc': 'cmc', 'mv': 'cmc',
+    'id': 'identity', 'identity': 'identity', 'ci': 'identity',
+    'in': 'in',
+}
+INDEXED_FIELDS = {'type': 'type_index', 'category': 'category_index', 'keyword': 'keyword_index', 'rarity': 'rarity_index'}
+QUERY_TOKEN_PATTERN = re.compile(r'(?:[^\s"]+|"[^"]*")+') # Mots, les passages entre guillemets restant groupés
+QUERY_TERM_PATTERN = re.compile(r"^(-?)([a-z]+)(<=|>=|!=|:|=|<|>)(.+)$", re.IGNORECASE)
+TYPE_WORD_PATTERN = re.compile(r"[a-z'\-]+")
+
+def build_search_index(classified_rows):
+    """
+    Construit les index de recherche d'une table classifiée (voir classify_inventory).
+    Les listes d'index inversés sont des tableaux numpy d'indices de lignes.
+    """
+    postings = {field: defaultdict(list) for field in INDEXED_FIELDS.values()}
+    for row_index, row in enumerate(classified_rows):
+        details = row['details']
+        for type_word in set(TYPE_WORD_PATTERN.findall(details.get('type_line', '').lower())):
+            postings['type_index'][type_word].append(row_index)
+        for category in row['categories']:
+            postings['category_index'][category].append(row_index)
+        for keyword in details.get('keywords', []):
+            postings['keyword_index'][keyword.lower()].append(row_index)
+        postings['rarity_index'][details.get('rarity', '').lower()].append(row_index)
+
+    mana_values = np.array([get_mana_value(row['details']) for row in classified_rows], dtype=np.float64)
+    mana_value_order = np.argsort(mana_values, kind='stable')
+    search_index = {
+        'rows': classified_rows,
+        'row_count': len(classified_rows),
+        'cache_keys': [row['cache_key'] for row in classified_rows],
+        'names_lower': [row['details'].get('name', '').lower() for row in classified_rows],
+        'oracle_lower': [row['details'].get('oracle_text', '').lower() for row in classified_rows],
+        'mana_value_order': mana_value_order,
+        'sorted_mana_values': mana_values[mana_value_order],
+        'color_masks': np.array([row['color_mask'] for row in classified_rows], dtype=np.int64),
+    }
+    for field, field_postings in postings.items():
+        search_index[field] = {term: np.array(row_indices, dtype=np.int64) for term, row_indices in field_postings.items()}
+    return search_index
+
+@st.cache_resource(max_entries=INVENTORY_PREFETCH_MAX_JOBS)
+def get_inventory_search_index(inventory_key, _inventory):
+    """
+    Index de recherche d'un inventaire, partagé entre les sessions et mémoïsé sur sa clé (voir compute_inventory_key).
+    Réutilise la table classifiée du préchargement quand elle est disponible.
+    """
+    return build_search_index(load_classified_inventory(_inventory))
+
+def parse_search_query(query):
+    """
+    Découpe une requête en termes (négation, champ, opérateur, valeur).
+    Un mot sans champ devient un terme ('name', ':', mot). Lève ValueError si la requête est invalide.
+    """
+    terms = []
+    for token in QUERY_TOKEN_PATTERN.findall(query):
+        token = token.replace('"', '')
+        if not token or token == '-':
+            continue
+        match = QUERY_TERM_PATTERN.match(token)
+        if match and match.group(2).lower() in FIELD_ALIASES:
+            negated, field, operator, value = match.groups()
+            terms.append((bool(negated), FIELD_ALIASES[field.lower()], operator, value.lower()))
+        elif match:
+            raise ValueError(f"Champ inconnu : '{match.group(2)}'.")
+        else:
+            negated = token.startswith('-')
+            terms.append((negated, 'name', ':', token[1:].lower() if negated else token.lower()))
+    return terms
+
+def _postings_mask(search_index, field, value, exact):
+    """Lignes dont un terme indexé vaut `value` (ou le contient, pour les types et mots-clés partiels)."""
+    mask = np.zeros(search_index['row_count'], dtype=bool)
+    field_index = search_index[INDEXED_FIELDS[field]]
+    if value in field_index:
+        mask[field_index[value]] = True
+    elif not exact:
+        # Peu de termes distincts : on parcourt le vocabulaire, pas les cartes
+        for term, row_indices in field_index.items():
+            if value in term:
+                mask[row_indices] = True
+    return mask
+
+def _mana_value_mask(search_index, operator, value):
+    """Lignes dont la valeur de mana satisfait la comparaison, par recherche dichotomique dans le tableau trié."""
+    try:
+        threshold = float(value)
+    except ValueError:
+        raise ValueError(f"Valeur de mana invalide : '{value}'.")
+    sorted_mana_values = search_index['sorted_mana_values']
+    lower = np.searchsorted(sorted_mana_values, threshold, side='left')
+    upper = np.searchsorted(sorted_mana_values, threshold, side='right')
+    bounds = {':': (lower, upper), '=': (lower, upper), '<': (0, lower), '<=': (0, upper),
+              '>': (upper, len(sorted_mana_values)), '>=': (lower, len(sorted_mana_values))}
+    mask = np.zeros(search_index['row_count'], dtype=bool)
+    if operator == '!=':
+        mask[:] = True
+        mask[search_index['mana_value_order'][lower:upper]] = False
+    else:
+        start, stop = bounds[operator]
+        mask[search_index['mana_value_order'][start:stop]] = True
+    return mask
+
+def _identity_mask(search_index, operator, value):
+    """Lignes dont l'identité couleur se compare au masque demandé (inclusion, contenance, égalité)."""
+    letters = set(value.upper())
+    if not letters <= set('WUBRGC'):
+        raise ValueError(f"Identité couleur invalide : '{value}' (lettres WUBRG, ou C pour incolore).")
+    query_mask = colors_to_mask(letters)
+    color_masks = search_index['color_masks']
+    subset = (color_masks & ~query_mask) == 0
+    superset = (color_masks & query_mask) == query_mask
+    equal = color_masks == query_mask
+    masks = {':': subset, '<=': subset, '<': subset & ~equal, '>=': superset, '>': superset & ~equal,
+             '=': equal, '!=': ~equal}
+    return masks[operator]
+
+def search_inventory_index(search_index, query, deck_keys=None):
+    """
+    Exécute une requête sur un index de recherche (voir build_search_index).
+    `deck_keys` : clés d'inventaire des cartes du deck, pour le terme in:deck.
+    Retourne les indices des lignes trouvées, triés par nom. Lève ValueError si la requête est invalide.
+    """
+    terms = parse_search_query(query)
+    selected = np.ones(search_index['row_count'], dtype=bool)
+    text_terms = []
+    for negated, field, operator, value in terms:
+        if field in ('name', 'oracle'):
+            text_terms.append((negated, field, value)) # Parcours du texte, seulement sur les lignes restantes
+            continue
+        if field in INDEXED_FIELDS:
+            if operator != ':' and operator != '=':
+                raise ValueError(f"Opérateur '{operator}' non pris en charge pour {field}.")
+            mask = _postings_mask(search_index, field, value, exact=(field in ('category', 'rarity') or operator == '='))
+        elif field == 'cmc':
+            mask = _mana_value_mask(search_index, operator, value)
+        elif field == 'identity':
+            mask = _identity_mask(search_index, operator, value)
+        else: # in:
+            if value != 'deck':
+                raise ValueError(f"Valeur inconnue pour in: '{value}' (seul in:deck est pris en charge).")
+            deck_keys = set(deck_keys or ())
+            mask = np.fromiter((cache_key in deck_keys for cache_key in search_index['cache_keys']), dtype=bool,
+                               count=search_index['row_count'])
+        selected &= ~mask if negated else mask
+
+    row_indices = np.flatnonzero(selected)
+    for negated, field, value in text_terms:
+        texts = search_index['names_lower'] if field == 'name' else search_index['oracle_lower']
+        row_indices = [row_index for row_index in row_indices if (value in texts[row_index]) != negated]
+
+    names_lower = search_index['names_lower']
+    return sorted((int(row_index) for row_index in row_indices), key=lambda row_index: names_lower[row_index])
+
+def search_inventory(inventory, query, deck_keys=None):
+    """
+    Recherche dans l'inventaire (voir search_inventory_index pour la syntaxe).
+    Retourne les lignes classifiées trouvées (dictionnaires de classify_inventory), triées par nom.
+    """
+    search_index = get_inventory_search_index(compute_inventory_key(inventory), inventory)
+    return [search_index['rows'][row_index] for row_index in search_inventory_index(search_index, query, deck_keys)]
@@ -0,0 +1,46 @@
+# charts.py
+
+import io
+import streamlit as st
+from config import CHART_BACKEND
+
+# Le rendu matplotlib est mis en cache par Streamlit (clé = hachage des données du graphique),
+# donc une même courbe n'est dessinée qu'une fois pour toutes les réexécutions et toutes les sessions.
+# matplotlib n'est importé que lorsqu'une image doit réellement être dessinée.
+
+@st.cache_data(ttl=3600*24, max_entries=256)
+def render_bar_chart_png(labels, values, title, xlabel, ylabel, color='skyblue'):
+    """
+    Dessine un diagramme en barres avec matplotlib et retourne l'image PNG (bytes).
+    `labels` et `values` doivent être des tuples pour que la clé de cache reste stable.
+    """
+    from matplotlib.figure import Figure # Import paresseux ; Figure évite l'état global de pyplot
+
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    ax.bar(labels, values, color=color)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    ax.set_xticks(labels)
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+def display_bar_chart(labels, values, title, xlabel, ylabel, backend=None):
+    """
+    Affiche un diagramme en barres avec le moteur choisi :
+    'matplotlib' (image PNG mise en cache) ou 'native' (st.bar_chart, sans matplotlib).
+    """
+    backend = backend or CHART_BACKEND
+    labels = tuple(labels)
+    values = tuple(values)
+
+    if backend == 'native':
+        st.markdown(f"**{title}**")
+        st.bar_chart({xlabel: labels, ylabel: values}, x=xlabel, y=ylabel)
+    else:
+        st.image(render_bar_chart_png(labels, values, title, xlabel, ylabel))
@@ -0,0 +1,97 @@
+# collection_analytics.py
+
+import numpy as np
+import streamlit as st
+
+from card_classifier import load_classified_inventory, is_potential_commander
+from card_features import aggregate_by_color_mask, subset_sums, COLOR_MASK_COUNT
+from config import CATEGORY_KEYWORDS, MTG_COLOR_ORDER, INVENTORY_PREFETCH_MAX_JOBS
+
+# Vue d'ensemble de la collection, calculée sur la table classifiée (voir classify_inventory) sans aucune requête :
+# la table est d'abord mise en colonnes NumPy (une passe sur les cartes), puis chaque agrégat est un regroupement
+# (np.bincount ou produit par une matrice indicatrice) sur ces colonnes. Le tout est mémoïsé sur la clé de
+# l'inventaire (voir get_inventory_collection_analytics) : réafficher le tableau de bord ne recalcule rien.
+
+ANALYTICS_MAX_CMC = 7 # Les coûts supérieurs sont comptés avec celui-ci ("7+")
+ANALYTICS_CATEGORIES = list(CATEGORY_KEYWORDS) + ['threat', 'utility']
+ANALYTICS_COLORS = MTG_COLOR_ORDER + ['C'] # 'C' : cartes incolores
+RARITIES = ['common', 'uncommon', 'rare', 'mythic', 'special', 'bonus']
+
+def get_mask_colors(color_mask):
+    """Couleurs ('W', 'U', ...) d'un masque d'identité, dans l'ordre canonique."""
+    return ''.join(color for bit, color in enumerate(MTG_COLOR_ORDER) if color_mask & (1 << bit))
+
+def build_collection_columns(classified_rows):
+    """Colonnes de la table classifiée : masques, tranches de coût, quantités, indicateurs et catégories (cartes x catégories)."""
+    row_count = len(classified_rows)
+    category_columns = {category: column for column, category in enumerate(ANALYTICS_CATEGORIES)}
+    columns = {
+        'color_masks': np.zeros(row_count, dtype=np.int64),
+        'cmc_buckets': np.zeros(row_count, dtype=np.int64),
+        'quantities': np.zeros(row_count, dtype=np.int64),
+        'rarities': np.zeros(row_count, dtype=np.int64),
+        'foils': np.zeros(row_count, dtype=np.int64),
+        'lands': np.zeros(row_count, dtype=bool),
+        'commanders': np.zeros(row_count, dtype=bool),
+        'categories': np.zeros((row_count, len(ANALYTICS_CATEGORIES)), dtype=np.float32),
+    }
+    for row_index, row in enumerate(classified_rows):
+        details = row['details']
+        rarity = details.get('rarity', 'common')
+        columns['color_masks'][row_index] = row['color_mask']
+        columns['cmc_buckets'][row_index] = min(ANALYTICS_MAX_CMC, int(details.get('cmc', 0) or 0))
+        columns['quantities'][row_index] = row['inventory_info'].get('quantity_owned', 1)
+        columns['rarities'][row_index] = RARITIES.index(rarity) if rarity in RARITIES else RARITIES.index('special')
+        columns['foils'][row_index] = 1 if row['inventory_info'].get('foil_in_txt') else 0
+        columns['lands'][row_index] = 'Land' in details.get('type_line', '').split(' — ')[0]
+        columns['commanders'][row_index] = is_potential_commander(details)
+        for category in row['categories']:
+            column = category_columns.get(category)
+            if column is not None:
+                columns['categories'][row_index, column] = 1.0
+    return columns
+
+def compute_collection_analytics(classified_rows):
+    """
+    Agrégats de la collection (cartes distinctes, sauf mention des exemplaires) :
+    'card_count', 'copy_count', 'mask_cards' et 'mask_copies' (32 masques d'identité exacts), 'playable_cards'
+    (32 : cartes jouables sous un commandant de cette identité), 'curve_by_color' (ANALYTICS_COLORS x coûts, sorts
+    seulement ; une carte multicolore compte dans chacune de ses couleurs), 'categories_by_mask' (32 x ANALYTICS_CATEGORIES),
+    'legends_by_mask' (32 : commandants potentiels) et 'rarity_foil_copies' (RARITIES x (non foil, foil)).
+    """
+    columns = build_collection_columns(classified_rows)
+    color_masks = columns['color_masks']
+    mask_cards = np.bincount(color_masks, minlength=COLOR_MASK_COUNT)
+
+    # Appartenance de chaque sort à chaque couleur (incolore en dernier), puis histogramme des coûts par couleur
+    spells = ~columns['lands']
+    color_membership = np.zeros((len(color_masks), len(ANALYTICS_COLORS)), dtype=np.float32)
+    for bit in range(len(MTG_COLOR_ORDER)):
+        color_membership[:, bit] = ((color_masks >> bit) & 1) * spells
+    color_membership[:, -1] = (color_masks == 0) & spells
+    cmc_one_hot = np.zeros((len(color_masks), ANALYTICS_MAX_CMC + 1), dtype=np.float32)
+    cmc_one_hot[np.arange(len(color_masks)), columns['cmc_buckets']] = 1.0
+
+    rarity_foil_copies = np.bincount(columns['rarities'] * 2 + columns['foils'], weights=columns['quantities'],
+                                     minlength=len(RARITIES) * 2)
+    return {
+        'card_count': len(classified_rows),
+        'copy_count': int(columns['quantities'].sum()),
+        'mask_cards': mask_cards,
+        'mask_copies': np.bincount(color_masks, weights=columns['quantities'], minlength=COLOR_MASK_COUNT).astype(np.int64),
+        'playable_cards': np.rint(subset_sums(mask_cards)).astype(np.int64),
+        'curve_by_color': np.rint(color_membership.T @ cmc_one_hot).astype(np.int64),
+        'categories_by_mask': np.rint(aggregate_by_color_mask(columns['categories'].T, color_masks).T).astype(np.int64),
+        'legends_by_mask': np.bincount(color_masks, weights=columns['commanders'], minlength=COLOR_MASK_COUNT).astype(np.int64),
+        'rarity_foil_copies': rarity_foil_copies.astype(np.int64).reshape(len(RARITIES), 2),
+    }
+
+@st.cache_resource(max_entries=INVENTORY_PREFETCH_MAX_JOBS)
+def get_inventory_collection_analytics(inventory_key, _inventory, _classified_rows=None):
+    """
+    Tableau de bord d'un inventaire, partagé entre les sessions et mémoïsé sur sa clé (voir compute_inventory_key).
+    `_classified_rows` évite de relire la table classifiée quand l'appelant l'a déjà.
+    """
+    if _classified_rows is None:
+        _classified_rows = load_classified_inventory(_inventory)
+    return compute_collection_analytics(_classified_rows)
@@ -0,0 +1,81 @@
+# commander_browser.py
+
+from scryfall_api import get_color_identity
+from config import MTG_COLOR_ORDER
+
+SORT_BY_TOTAL = "total"
+SORT_BY_COMMANDER = "commander"
+
+def build_commander_table(commanders_data):
+    """
+    Construit une fois (après chaque recherche) la table des commandants en colonnes,
+    avec les ordres de tri précalculés pour chaque score.
+    `commanders_data` est la liste retournée par identify_commanders_in_inventory ou
+    identify_commander_pairs_in_inventory (détails : une carte ou la liste des deux commandants).
+    """
+    names = []
+    members = []
+    color_identities = []
+    scores_total = []
+    scores_cmd_bonus = []
+    scores_support_cards = []
+    scores_synergy = []
+
+    for cmd_name, cmd_details, relevance_str, score_total, score_cmd_bonus, score_support_cards, score_synergy in commanders_data:
+        cmd_details_list = cmd_details if isinstance(cmd_details, list) else [cmd_details]
+        cmd_ci_set = set().union(*(get_color_identity(details) for details in cmd_details_list))
+        names.append(cmd_name)
+        members.append([details.get('name') for details in cmd_details_list])
+        color_identities.append(''.join(c for c in MTG_COLOR_ORDER if c in cmd_ci_set))
+        scores_total.append(score_total)
+        scores_cmd_bonus.append(score_cmd_bonus)
+        scores_support_cards.append(score_support_cards)
+        scores_synergy.append(score_synergy)
+
+    row_indices = range(len(names))
+    return {
+        'names': names,
+        'members': members,
+        'names_lower': [name.lower() for name in names],
+        'color_identities': color_identities,
+        'scores_total': scores_total,
+        'scores_cmd_bonus': scores_cmd_bonus,
+        'scores_support_cards': scores_support_cards,
+        'scores_synergy': scores_synergy,
+        'sort_orders': {
+            SORT_BY_TOTAL: sorted(row_indices, key=lambda i: (-scores_total[i], names[i])),
+            SORT_BY_COMMANDER: sorted(row_indices, key=lambda i: (-scores_cmd_bonus[i], names[i])),
+        },
+    }
+
+def filter_commander_rows(commander_table, sort_by=SORT_BY_TOTAL, name_query="", allowed_colors=None, min_score=0):
+    """
+    Retourne les indices des commandants visibles, dans l'ordre de tri demandé.
+    Réutilise l'ordre précalculé : aucun tri n'est refait, seul un filtre linéaire est appliqué.
+    `allowed_colors` : l'identité couleur du commandant doit être incluse dans ces couleurs (None = pas de filtre).
+    """
+    name_query = name_query.strip().lower()
+    allowed_colors = set(allowed_colors) if allowed_colors else None
+    names_lower = commander_table['names_lower']
+    color_identities = commander_table['color_identities']
+    scores_total = commander_table['scores_total']
+
+    visible_rows = []
+    for i in commander_table['sort_orders'][sort_by]:
+        if scores_total[i] < min_score:
+            continue
+        if name_query and name_query not in names_lower[i]:
+            continue
+        if allowed_colors is not None and not set(color_identities[i]).issubset(allowed_colors):
+            continue
+        visible_rows.append(i)
+    return visible_rows
+
+def get_page_count(row_count, page_size):
+    """Nombre de pages nécessaires pour afficher `row_count` lignes (au moins une)."""
+    return max(1, -(-row_count // page_size))
+
+def get_page_rows(visible_rows, page_number, page_size):
+    """Retourne les indices de la page demandée (numérotée à partir de 1)."""
+    start = (page_number - 1) * page_size
+    return visible_rows[start : start + page_size]
@@ -1,13 +1,50 @@
 # config.py
 
+import os
+
 # --- Fichiers et chemins ---
 # INVENTORY_FILE = 'mon_inventaire.txt' # <-- RETIRÉ: Le fichier sera téléversé par l'utilisateur
-SCRYFALL_CACHE_FILE = 'scryfall_cache.json'
+SCRYFALL_CACHE_FILE = 'scryfall_cache.jsonl' # Points de reprise des requêtes collection (une carte résolue par ligne)
+CARD_DATABASE_FILE = 'card_database.bin' # Base de cartes binaire partagée en mmap (voir card_database.py)
+CARD_DATABASE_COMPACT_THRESHOLD = 2000 # Nombre de cartes en points de reprise au-delà duquel elles sont intégrées à la base
 MANA_SYMBOLS_PATH = 'mana_symbols'
 
+# --- API HTTP locale (voir api_server.py) ---
+API_HOST = '127.0.0.1' # Interface d'écoute (local uniquement par défaut)
+API_PORT = 8765
+API_WORKER_COUNT = 4 # Requêtes de calcul traitées simultanément
+API_MAX_QUEUED_REQUESTS = 16 # Requêtes en attente d'un worker ; au-delà, le serveur répond 503
+API_MAX_REQUEST_BYTES = 20 * 1024 * 1024 # Taille maximale d'un corps de requête (inventaire)
+API_MAX_STORED_INVENTORIES = 16 # Inventaires téléversés gardés en mémoire
+API_MAX_STORED_DECKS = 64 # Decks construits gardés en mémoire
+API_MAX_DECK_CANDIDATES = 1024 # Decks candidats au plus par construction (champ "candidates", voir build_best_of_n_deck_state)
+API_MAX_VALIDATED_DECKLISTS = 10000 # Decklists au plus par appel de /decklists/validate
+
+# --- Travaux en arrière-plan (voir build_jobs.py) ---
+BUILD_JOB_WORKER_COUNT = 4 # Recherches et constructions exécutées simultanément (toutes sessions confondues)
+BUILD_JOBS_MAX_KEPT = 64 # Travaux terminés gardés en mémoire (résultat repris par la session qui les a lancés)
+BUILD_JOB_POLL_SECONDS = 0.5 # Intervalle de rafraîchissement de l'état d'un travail dans l'interface
+
+# --- Mesures (voir metrics.py) ---
+METRICS_HOST = '127.0.0.1' # Interface d'écoute du serveur de mesures (local uniquement par défaut)
+METRICS_PORT = 9464 # Port de /metrics (texte Prometheus) et /metrics.json ; 0 désactive le serveur
+
+# --- Affichage ---
+CHART_BACKEND = 'matplotlib' # 'matplotlib' (image mise en cache) ou 'native' (st.bar_chart, plus léger)
+COMMANDERS_PAGE_SIZE = 25 # Nombre de commandants affichés par page dans le tableau de sélection
+INVENTORY_SEARCH_RESULTS_LIMIT = 200 # Nombre maximal de cartes affichées par une recherche dans l'inventaire
+SIMILAR_COMMANDERS_LIMIT = 8 # Commandants similaires proposés à côté du rapport du deck
+UPGRADE_SUGGESTIONS_PER_CATEGORY = 5 # Cartes à acquérir proposées par catégorie sous-représentée (voir upgrade_suggestions.py)
+
 # --- API Scryfall ---
+SCRYFALL_API_URL = 'https://api.scryfall.com' # Racine de l'API (remplaçable par un serveur local, voir load_test.py)
 SCRYFALL_RATE_LIMIT_DELAY = 0.1 # Délai entre les requêtes Scryfall (100ms pour respecter 10 req/sec)
 SCRYFALL_BATCH_SIZE = 75 # Max 75 identificateurs par requête collection
+SCRYFALL_REQUEST_TIMEOUT = 30 # Délai maximal (secondes) d'une requête avant de la considérer en échec
+SCRYFALL_MAX_RETRIES = 5 # Nombre de nouvelles tentatives pour une erreur transitoire (timeout, 429, 5xx)
+SCRYFALL_BACKOFF_BASE = 0.5 # Délai initial (secondes) du backoff exponentiel
+SCRYFALL_BACKOFF_MAX = 30 # Plafond (secondes) du backoff exponentiel
+INVENTORY_PREFETCH_MAX_JOBS = 4 # Nombre d'inventaires préchargés gardés en mémoire (partagés entre sessions)
 
 # --- Règles du Commander ---
 TARGET_DECK_SIZE = 100
@@ -49,7 +86,7 @@ CATEGORY_KEYWORDS = {
     'artifacts_matter': ['artifact enters the battlefield', 'artifacts you control', 'metalcraft', 'affinity', 'when you cast an artifact spell', 'historic spell'],
     'counters_matter': ['+1/+1 counter', 'put a counter', 'proliferate', 'haste if it has a counter', 'counter on it', 'remove a counter', 'double counters'],
     'superfriends': ['planeswalker enters the battlefield', 'planeswalkers you control', 'loyalty abilities', 'emblem', 'loyalty counter'],
-    'tribal': ['elf', 'goblin', 'zombie', 'dragon', 'angel', 'human', 'wizard', 'vampire', 'cleric', 'warrior', 'merfolk', 'slivers', 'cat', 'dog', 'elemental'],
+    'tribal': [], # Pas de mots-clés : les tribus viennent de l'index des sous-types de créature (voir card_classifier)
     'group_hug': ['each player draws', 'target player draws', 'each player gains', 'everyone draws', 'gain life', 'each player creates a token', 'all players'],
     'group_slug': ['each opponent loses life', 'whenever a player casts a spell', 'damage to each opponent', 'each opponent sacrifices a permanent', 'you lose life', 'punish', 'pay life', 'opponent takes damage'],
     'pillow_fort': ['can\'t attack you', 'cost to attack', 'prevent all combat damage', 'shroud', 'hexproof', 'protection from', 'untargetable'],
@@ -57,6 +94,25 @@ CATEGORY_KEYWORDS = {
 }
 
 
+# --- Stratégie tribale (voir build_subtype_index) ---
+TRIBAL_BONUS_PER_REFERENCE = 10 # Bonus d'un commandant par mention d'une tribu dans son texte (comme get_strategy_bonus)
+DOMINANT_TRIBES_LIMIT = 8 # Tribus suggérées dans les préférences
+# Pluriels irréguliers des sous-types de créature (les autres prennent 's' ou 'es')
+IRREGULAR_SUBTYPE_PLURALS = {
+    'Elf': 'Elves', 'Dwarf': 'Dwarves', 'Wolf': 'Wolves', 'Werewolf': 'Werewolves', 'Mouse': 'Mice',
+    'Fungus': 'Fungi', 'Ox': 'Oxen', 'Cyclops': 'Cyclopes',
+}
+
+# --- Synergie commandant <-> cartes (poids des familles de caractéristiques) ---
+# 'cat': mots-clés de CATEGORY_KEYWORDS, 'kw': mots-clés Scryfall, 'sub': sous-types de créature, 'mana': mana produit
+SYNERGY_FEATURE_WEIGHTS = {'cat': 1.0, 'kw': 1.0, 'sub': 2.0, 'mana': 0.5}
+
+# --- Profils des commandants (voir build_commander_profile_index) ---
+# 'cat': catégories de classify_card, 'color': couleurs de l'identité, 'cmc': coût (tranche exacte, voisines à moitié),
+# 'kw': mots-clés Scryfall
+PROFILE_FEATURE_WEIGHTS = {'cat': 1.0, 'color': 1.5, 'cmc': 0.5, 'kw': 1.0}
+PROFILE_MAX_CMC = 8 # Les coûts supérieurs partagent la dernière tranche
+
 # --- Préférences de courbes de mana (nombre de sorts ciblés par CMC) ---
 CMC_TARGET_DISTRIBUTION = {
     0: 1,
@@ -71,3 +127,12 @@ CMC_TARGET_DISTRIBUTION = {
     9: 0,
     10: 0
 }
+
+# --- Meilleur de N constructions (voir build_best_of_n_deck_state) ---
+BEST_OF_N_CANDIDATES = 64 # Decks candidats construits (un tirage aléatoire chacun)
+BEST_OF_N_WORKER_COUNT = min(8, os.cpu_count() or 1) # Processus de construction des candidats
+BEST_OF_N_MIN_PARALLEL_CANDIDATES = 128 # En dessous, les candidats sont construits dans le processus courant (~2 ms chacun)
+# Poids des composantes de la note de qualité d'un deck (voir score_deck_quality)
+DECK_QUALITY_WEIGHTS = {'cmc_curve': 1.0, 'categories': 1.0, 'strategy': 1.0, 'mana_base': 1.0}
+DECK_QUALITY_STRATEGY_DENSITY = 0.3 # Part des sorts dans la stratégie choisie au-delà de laquelle la composante est pleine
+DECK_QUALITY_DRAWN_CARDS = 9 # Cartes vues au tour 3 (main de départ + 2 pioches) pour les chances du mana
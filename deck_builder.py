@@ -2,83 +2,131 @@
 
 import streamlit as st
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import math
+import multiprocessing
 import random
+import statistics
+import time
 
 from scryfall_api import get_card_details_batch_scryfall, get_card_details_scryfall, get_color_identity, is_basic_land, get_mana_value, get_card_rarity, get_card_set_code, get_card_collector_number, is_foil, _get_cache_key
-from card_classifier import classify_card
+from card_classifier import classify_card, can_form_commander_pair, compute_inventory_key, get_inventory_subtype_index, get_commander_tribes, get_tribe_member_keys
+from card_features import compute_card_synergy, get_commander_vector_mass
+from inventory_manager import get_card_owner
+from metrics import observe, timed
 from config import TARGET_DECK_SIZE, TARGET_LAND_COUNT, MIN_NON_LAND_CARDS, COLOR_MAP, CARD_CATEGORIES_RATIOS, CMC_TARGET_DISTRIBUTION, CATEGORY_KEYWORDS
-
-def build_commander_deck(commandant_name, inventory_cards, preferences={}, progress_bar_global_deck_build=None):
-    """
-    Construit un deck Commander en se basant sur un commandant, l'inventaire
-    de l'utilisateur et ses préférences.
-    Affiche la progression via `progress_bar_global_deck_build`.
-    """
-    deck_list_names = []
-    deck_full_details_for_export = []
-    
-    # Initialisation des compteurs pour le rapport détaillé
-    deck_category_counts = Counter()
-    mana_curve_spells_cmc = []
-    synergy_cards_info = [] # Pour stocker des infos sur les cartes clés pour la synergie
-
+from config import BEST_OF_N_CANDIDATES, BEST_OF_N_WORKER_COUNT, BEST_OF_N_MIN_PARALLEL_CANDIDATES, DECK_QUALITY_WEIGHTS, DECK_QUALITY_STRATEGY_DENSITY, DECK_QUALITY_DRAWN_CARDS
+
+GENERAL_CATEGORIES_ORDERED = ['ramp', 'draw', 'spot_removal', 'board_wipe', 'threat', 'utility', 'flex_slots']
+
+BASIC_LAND_SETS_CN = {
+    'White': {'set': 'STA', 'cn': '63'},
+    'Blue': {'set': 'STA', 'cn': '64'},
+    'Black': {'set': 'STA', 'cn': '65'},
+    'Red': {'set': 'STA', 'cn': '66'},
+    'Green': {'set': 'STA', 'cn': '67'},
+    'Colorless': {'set': 'OGW', 'cn': '183'}
+}
+
+# La construction se fait en phases réutilisables :
+#   1. prepare_deck_pool : commandant + cartes candidates de l'inventaire (catégories, synergie)
+#   2. allocate_spells / allocate_lands : sélection des sorts puis des terrains non-base, pour un ou
+#      plusieurs decks à la fois, en respectant la quantité possédée de chaque carte
+#   3. assemble_deck : terrains de base, statistiques et liste d'export
+#   4. rebuild_deck (optionnel) : reconstruction incrémentale avec cartes verrouillées / exclues
+
+def _make_progress_updater(progress_bar_global_deck_build):
     # Mise à jour de la barre de progression (si fournie)
     def update_global_progress(value, text=""):
         if progress_bar_global_deck_build:
             progress_bar_global_deck_build.progress(value, text=text)
+    return update_global_progress
+
+def _add_commander_category_counts(commander_category_counts, commandant_details):
+    # Le commandant compte comme une "menace" ou "utilité" selon sa nature, mais pour les stats de deck, on le gère à part.
+    # On ajoute son type de carte principal
+    cmd_types = commandant_details.get('type_line', '').split(' — ')[0].split(' ')
+    for t in cmd_types:
+        if t not in ["Legendary", "Creature", "Planeswalker"]: # Éviter les types génériques qui ne sont pas des catégories de deck
+            commander_category_counts[t] += 1
+    if "Creature" in cmd_types:
+        commander_category_counts["Creature"] += 1
+    if "Planeswalker" in cmd_types:
+        commander_category_counts["Planeswalker"] += 1
+
+def prepare_deck_pool(commandant_name, inventory_cards, preferences, update_global_progress=None, partner_name=None):
+    """
+    Prépare le pool de cartes candidates pour un commandant : détails du commandant,
+    cartes de l'inventaire dans son identité couleur, classifiées et notées par synergie.
+    Si `partner_name` est fourni (Partner, Background...), le deck a deux commandants et
+    l'identité couleur est l'union des leurs.
+    Retourne un dictionnaire (le pool), ou None si le commandant est invalide.
+    """
+    update_global_progress = update_global_progress or (lambda value, text="": None)
 
     update_global_progress(5, f"Début de construction pour {commandant_name} : Récupération des détails...")
     commandant_details = get_card_details_scryfall(commandant_name)
     if not commandant_details:
         st.error(f"❌ Erreur : Impossible de trouver les détails pour le commandant '{commandant_name}'.")
-        return None, None, None, None
+        return None
 
     is_legendary_creature = "Legendary Creature" in commandant_details.get('type_line', '')
     is_pw_commander = ("Planeswalker" in commandant_details.get('type_line', '') and
                         "can be your commander" in commandant_details.get('oracle_text', '').lower())
-    
+
     if not (is_legendary_creature or is_pw_commander):
         st.error(f"❌ Erreur : '{commandant_name}' n'est pas un commandant valide.")
-        return None, None, None, None
+        return None
+
+    commanders_details = [commandant_details]
+    if partner_name:
+        partner_details = get_card_details_scryfall(partner_name)
+        if not partner_details:
+            st.error(f"❌ Erreur : Impossible de trouver les détails pour le commandant '{partner_name}'.")
+            return None
+        if not can_form_commander_pair(commandant_details, partner_details):
+            st.error(f"❌ Erreur : '{commandant_name}' et '{partner_name}' ne peuvent pas être commandants ensemble.")
+            return None
+        commanders_details.append(partner_details)
+
+    commander_names = [details.get('name') for details in commanders_details]
+    deck_commander_name = " + ".join(commander_names)
+    commander_color_identity = set().union(*(get_color_identity(details) for details in commanders_details))
 
-    commander_color_identity = get_color_identity(commandant_details)
-    
     if 'colors' in preferences and preferences['colors']:
         chosen_colors_set = set(preferences['colors'])
         if not chosen_colors_set.issubset(commander_color_identity):
             st.warning(f"⚠️ Avertissement : Couleurs préférées non compatibles avec le commandant. Le deck utilisera les couleurs valides.")
             preferences['colors'] = list(chosen_colors_set.intersection(commander_color_identity))
 
-    deck_list_names.append(commandant_name)
-    deck_full_details_for_export.append({
-        'name': commandant_name,
-        'set': get_card_set_code(commandant_details),
-        'collector_number': get_card_collector_number(commandant_details),
-        'foil': is_foil(commandant_details),
-        'details': commandant_details # Ajout des détails complets pour analyse post-construction
-    })
-    # Le commandant compte comme une "menace" ou "utilité" selon sa nature, mais pour les stats de deck, on le gère à part.
-    # On ajoute son type de carte principal
-    cmd_types = commandant_details.get('type_line', '').split(' — ')[0].split(' ')
-    for t in cmd_types:
-        if t not in ["Legendary", "Creature", "Planeswalker"]: # Éviter les types génériques qui ne sont pas des catégories de deck
-            deck_category_counts[t] += 1
-    if "Creature" in cmd_types:
-        deck_category_counts["Creature"] += 1
-    if "Planeswalker" in cmd_types:
-        deck_category_counts["Planeswalker"] += 1
+    commander_entries = []
+    commander_keys = set()
+    commander_inventory_keys = []
+    commander_category_counts = Counter()
+    for name, details in zip(commander_names, commanders_details):
+        commander_inventory_key = next((key for key, info in inventory_cards.items() if info['name'] == name), None)
+        commander_inventory_keys.append(commander_inventory_key)
+        commander_entries.append({
+            'name': name,
+            'set': get_card_set_code(details),
+            'collector_number': get_card_collector_number(details),
+            'foil': is_foil(details),
+            'owner': get_card_owner(inventory_cards.get(commander_inventory_key)),
+            'details': details # Ajout des détails complets pour analyse post-construction
+        })
+        commander_keys.add(_get_cache_key({"name": name,
+                                           "set": get_card_set_code(details),
+                                           "collector_number": get_card_collector_number(details)}))
+        _add_commander_category_counts(commander_category_counts, details)
 
-    st.info(f"Identité couleur du commandant '{commandant_name}' : {', '.join(commander_color_identity) if commander_color_identity else 'Incolore'}")
+    st.info(f"Identité couleur du commandant '{deck_commander_name}' : {', '.join(commander_color_identity) if commander_color_identity else 'Incolore'}")
 
     available_cards_processed = {}
-    
+
     all_inventory_identifiers = []
-    cmd_full_ident = _get_cache_key({"name": commandant_name, 
-                                    "set": get_card_set_code(commandant_details), 
-                                    "collector_number": get_card_collector_number(commandant_details)})
-    
     for cache_key, card_info in inventory_cards.items():
-        if cache_key == cmd_full_ident:
+        if cache_key in commander_keys:
             continue
         all_inventory_identifiers.append({
             "name": card_info['name'],
@@ -98,17 +146,18 @@ def build_commander_deck(commandant_name, inventory_cards, preferences={}, progr
     update_global_progress(25, "Filtrage et catégorisation des cartes disponibles...")
     for inv_cache_key, card_details_scryfall in card_details_map.items():
         original_inventory_info = inventory_cards.get(inv_cache_key)
-        
-        if original_inventory_info:
+
+        # Les autres impressions des commandants ne sont pas candidates (règle du singleton)
+        if original_inventory_info and card_details_scryfall.get('name') not in commander_names:
             card_color_identity = get_color_identity(card_details_scryfall)
-            
+
             if card_color_identity.issubset(commander_color_identity):
                 if 'colors' in preferences and preferences['colors']:
                     if not card_color_identity.issubset(set(preferences['colors'])):
                         continue
-                
+
                 categories = classify_card(card_details_scryfall, preferences.get('strategy'))
-                
+
                 available_cards_processed[inv_cache_key] = {
                     'name': original_inventory_info['name'],
                     'details': card_details_scryfall,
@@ -118,207 +167,665 @@ def build_commander_deck(commandant_name, inventory_cards, preferences={}, progr
                     'cmc': get_mana_value(card_details_scryfall),
                     'categories': categories,
                     'rarity': get_card_rarity(card_details_scryfall),
-                    'foil_in_txt': original_inventory_info['foil_in_txt']
+                    'foil_in_txt': original_inventory_info['foil_in_txt'],
+                    'owner': get_card_owner(original_inventory_info)
                 }
 
-    st.info(f"Cartes valides de l'inventaire (prêtes à être sélectionnées) : **{len(available_cards_processed)}**")
-    
-    potential_lands_from_inventory = {k: data for k, data in available_cards_processed.items() if "Land" in data['details'].get('type_line', '')}
-    potential_spells_from_inventory = {k: data for k, data in available_cards_processed.items() if "Land" not in data['details'].get('type_line', '')}
-
-    # --- LOGIQUE DE CONSTRUCTION DU DECK ---
-
-    # Phase 1: Ajouter les sorts (non-terrains)
-    temp_deck_spells_data = []
-    added_to_deck_keys = set([cmd_full_ident])
+    # Synergie de chaque carte avec le commandant (un seul produit matriciel) : à catégorie égale,
+    # les cartes les plus synergiques sont choisies en premier, le mélange départageant les égalités.
+    card_synergy = compute_card_synergy(commanders_details, {k: data['details'] for k, data in available_cards_processed.items()})
+    for inv_cache_key, data in available_cards_processed.items():
+        data['synergy'] = card_synergy.get(inv_cache_key, 0.0)
 
-    shuffled_spells = list(potential_spells_from_inventory.items())
-    random.shuffle(shuffled_spells)
+    st.info(f"Cartes valides de l'inventaire (prêtes à être sélectionnées) : **{len(available_cards_processed)}**")
 
-    categorized_spells_for_filling = {cat: [] for cat in CARD_CATEGORIES_RATIOS.keys()}
-    for strategy_key in CATEGORY_KEYWORDS.keys():
-        if strategy_key not in categorized_spells_for_filling:
-            categorized_spells_for_filling[strategy_key] = []
+    chosen_strategy = preferences.get('strategy')
+    deck_tribes = []
+    if chosen_strategy == 'tribal':
+        # Cartes de la tribu lues dans l'index des sous-types : la tribu choisie, sinon celles du commandant
+        subtype_index = get_inventory_subtype_index(compute_inventory_key(inventory_cards), inventory_cards)
+        deck_tribes = [preferences['tribe']] if preferences.get('tribe') else get_commander_tribes(subtype_index, commanders_details)
+        tribe_member_keys = get_tribe_member_keys(subtype_index, deck_tribes)
+        for inv_cache_key, data in available_cards_processed.items():
+            if inv_cache_key in tribe_member_keys:
+                data['categories'] = [category for category in data['categories'] if category != 'threat'] + ['tribal']
+        if deck_tribes:
+            st.info(f"Tribu(s) du deck : **{', '.join(deck_tribes)}** ({sum(1 for key in available_cards_processed if key in tribe_member_keys)} cartes candidates)")
+        else:
+            st.warning("⚠️ Avertissement : le commandant ne cite aucune tribu et n'a pas de sous-type de créature.")
 
-    for cache_key, data in shuffled_spells:
-        for cat in data['categories']:
-            if cat in categorized_spells_for_filling:
-                categorized_spells_for_filling[cat].append((cache_key, data))
-    
     fill_order = []
-    chosen_strategy = preferences.get('strategy')
     if chosen_strategy and chosen_strategy in CATEGORY_KEYWORDS:
         fill_order.append(chosen_strategy)
-
-    general_categories_ordered = ['ramp', 'draw', 'spot_removal', 'board_wipe', 'threat', 'utility', 'flex_slots']
-    for cat in general_categories_ordered:
+    for cat in GENERAL_CATEGORIES_ORDERED:
         if cat not in fill_order:
              fill_order.append(cat)
-    
-    progress_text_spells = "Sélection des sorts..."
-    spell_progress_bar = st.progress(0, text=progress_text_spells)
-    
-    spells_added_count = 0
+
+    return {
+        'commander_name': deck_commander_name,
+        'commanders_details': commanders_details,
+        'commander_keys': commander_keys,
+        'commander_inventory_keys': commander_inventory_keys,
+        'commander_entries': commander_entries,
+        'commander_category_counts': commander_category_counts,
+        'color_identity': commander_color_identity,
+        'strategy': chosen_strategy,
+        'tribes': deck_tribes,
+        'fill_order': fill_order,
+        'cards': available_cards_processed,
+        'synergy_norm': get_commander_vector_mass(commanders_details),
+        'spell_keys': [k for k, data in available_cards_processed.items() if "Land" not in data['details'].get('type_line', '')],
+        'land_keys': [k for k, data in available_cards_processed.items() if "Land" in data['details'].get('type_line', '')],
+    }
+
+def get_inventory_capacities(inventory_cards, pools):
+    """
+    Nombre d'exemplaires encore disponibles de chaque carte, partagé entre tous les decks construits :
+    quantité possédée, moins les exemplaires utilisés comme commandants.
+    """
+    capacities = {key: info['quantity_owned'] for key, info in inventory_cards.items()}
+    for pool in pools:
+        for commander_inventory_key in pool['commander_inventory_keys']:
+            if commander_inventory_key in capacities:
+                capacities[commander_inventory_key] = max(0, capacities[commander_inventory_key] - 1)
+    return capacities
+
+def _get_tie_break_ranks(pools, keys_name, rng):
+    """Ordre aléatoire de chaque carte par deck, utilisé pour départager les synergies égales."""
+    ranks = []
+    for pool in pools:
+        shuffled_keys = list(pool[keys_name])
+        rng.shuffle(shuffled_keys)
+        ranks.append({key: rank for rank, key in enumerate(shuffled_keys)})
+    return ranks
+
+def _get_allocation_synergy(pool, cache_key):
+    """
+    Synergie d'une carte rapportée à la masse du vecteur du commandant (comme analyze_commanders_in_inventory) :
+    sans cela, le commandant au texte le plus long (ou une paire, vecteurs additionnés) emporterait toute carte disputée.
+    """
+    return pool['cards'][cache_key]['synergy'] / pool.get('synergy_norm', 1.0)
+
+def allocate_spells(pools, capacities, rng=random, initial_spell_keys=None, excluded_keys=None):
+    """
+    Sélectionne les sorts de plusieurs decks en une seule passe globale sur l'inventaire partagé.
+    Pour chaque catégorie (dans l'ordre de remplissage de chaque deck), toutes les paires (deck, carte)
+    candidates sont triées par synergie normalisée décroissante (voir _get_allocation_synergy) puis
+    attribuées tant que le deck a besoin de la catégorie et qu'il reste un exemplaire : une carte disputée
+    va au deck où elle est la plus synergique.
+    Les places restantes sont ensuite complétées de la même façon, toutes catégories confondues.
+    `initial_spell_keys` (par deck) sont déjà dans le deck (leurs exemplaires déjà décomptés de `capacities`) :
+    seules les places restantes sont attribuées. `excluded_keys` (par deck) ne sont jamais choisies.
+    `capacities` est décrémenté en place. Retourne la liste des clés de sorts de chaque deck.
+    """
+    deck_spell_keys = [list(keys) for keys in initial_spell_keys] if initial_spell_keys else [[] for _ in pools]
+    deck_keys = [set(pool['commander_keys']) | set(spell_keys) for pool, spell_keys in zip(pools, deck_spell_keys)]
+    if excluded_keys:
+        for keys, excluded in zip(deck_keys, excluded_keys):
+            keys.update(excluded)
+    ranks = _get_tie_break_ranks(pools, 'spell_keys', rng)
     total_spells_target = MIN_NON_LAND_CARDS
 
-    for category in fill_order:
-        if len(temp_deck_spells_data) >= total_spells_target:
-            break
-        
-        target_count = CARD_CATEGORIES_RATIOS.get(category, 0)
-        current_count_in_category = len([c_key for c_key, c_data in temp_deck_spells_data if category in c_data['categories']])
-        
-        needed = target_count - current_count_in_category
-        if needed <= 0:
+    def assign(candidates, needed=None):
+        candidates.sort()
+        for negative_synergy, rank, deck_index, cache_key in candidates:
+            if needed is not None and needed[deck_index] <= 0:
+                continue
+            if len(deck_spell_keys[deck_index]) >= total_spells_target:
+                continue
+            if cache_key in deck_keys[deck_index] or capacities.get(cache_key, 0) <= 0:
+                continue
+            deck_spell_keys[deck_index].append(cache_key)
+            deck_keys[deck_index].add(cache_key)
+            capacities[cache_key] -= 1
+            if needed is not None:
+                needed[deck_index] -= 1
+
+    for position in range(max(len(pool['fill_order']) for pool in pools)):
+        candidates = []
+        needed = [0] * len(pools)
+        for deck_index, pool in enumerate(pools):
+            if position >= len(pool['fill_order']):
+                continue
+            category = pool['fill_order'][position]
+            cards = pool['cards']
+            target_count = CARD_CATEGORIES_RATIOS.get(category, 0)
+            current_count_in_category = sum(1 for key in deck_spell_keys[deck_index] if category in cards[key]['categories'])
+            needed[deck_index] = target_count - current_count_in_category
+            if needed[deck_index] <= 0:
+                continue
+            for cache_key in pool['spell_keys']:
+                if category in cards[cache_key]['categories']:
+                    candidates.append((-_get_allocation_synergy(pool, cache_key), ranks[deck_index][cache_key], deck_index, cache_key))
+        assign(candidates, needed)
+
+    candidates = []
+    for deck_index, pool in enumerate(pools):
+        if len(deck_spell_keys[deck_index]) >= total_spells_target:
             continue
+        for cache_key in pool['spell_keys']:
+            if cache_key not in deck_keys[deck_index]:
+                candidates.append((-_get_allocation_synergy(pool, cache_key), ranks[deck_index][cache_key], deck_index, cache_key))
+    assign(candidates)
 
-        category_cards = categorized_spells_for_filling.get(category, [])
-        random.shuffle(category_cards)
-        
-        for cache_key, data in category_cards:
-            if len(temp_deck_spells_data) >= total_spells_target:
-                break
-            if cache_key not in added_to_deck_keys and data['available_qty'] > 0:
-                temp_deck_spells_data.append((cache_key, data))
-                added_to_deck_keys.add(cache_key)
-                spells_added_count += 1
-                update_global_progress(25 + int((spells_added_count / total_spells_target) * 35), f"Sélection des sorts: {category}...")
-                spell_progress_bar.progress(spells_added_count / total_spells_target, text=progress_text_spells)
-
-    remaining_slots_for_spells = total_spells_target - len(temp_deck_spells_data)
-    if remaining_slots_for_spells > 0:
-        all_other_spells = [(key, data) for key, data in shuffled_spells if key not in added_to_deck_keys and data['available_qty'] > 0]
-        random.shuffle(all_other_spells)
-
-        for cache_key, data in all_other_spells:
-            if len(temp_deck_spells_data) >= total_spells_target:
-                break
-            if cache_key not in added_to_deck_keys:
-                temp_deck_spells_data.append((cache_key, data))
-                added_to_deck_keys.add(cache_key)
-                spells_added_count += 1
-                update_global_progress(25 + int((spells_added_count / total_spells_target) * 35), "Sélection des sorts: Remplissage final...")
-                spell_progress_bar.progress(spells_added_count / total_spells_target, text=progress_text_spells)
-    spell_progress_bar.empty()
+    return deck_spell_keys
 
-    # Remplir les statistiques et informations de synergie pour les sorts ajoutés
-    for cache_key, data in temp_deck_spells_data:
-        deck_list_names.append(data['name'])
-        deck_full_details_for_export.append({
-            'name': data['name'],
-            'set': data['set_from_scryfall'],
-            'collector_number': data['cn_from_scryfall'],
-            'foil': data['foil_in_txt'],
-            'details': data['details'] # Ajout des détails complets
-        })
-        mana_curve_spells_cmc.append(data['cmc'])
-        for cat in data['categories']:
-            deck_category_counts[cat] += 1
-        
-        # Logique simplifiée pour la synergie
-        if chosen_strategy and chosen_strategy in data['categories']:
-            synergy_cards_info.append({'name': data['name'], 'category': chosen_strategy})
-        elif any(c in data['categories'] for c in ['ramp', 'draw', 'board_wipe', 'spot_removal']):
-             synergy_cards_info.append({'name': data['name'], 'category': data['categories'][0]}) # Prendre la première catégorie significative
+def allocate_lands(pools, deck_spell_keys, capacities, rng=random, initial_land_keys=None, excluded_keys=None):
+    """
+    Sélectionne les terrains non-base de plusieurs decks en une passe globale (synergie décroissante,
+    donc en priorité les terrains qui produisent les couleurs du commandant), jusqu'à remplir chaque deck.
+    `initial_land_keys` et `excluded_keys` (par deck) s'utilisent comme pour allocate_spells.
+    `capacities` est décrémenté en place. Retourne la liste des clés de terrains de chaque deck.
+    """
+    deck_land_keys = [list(keys) for keys in initial_land_keys] if initial_land_keys else [[] for _ in pools]
+    ranks = _get_tie_break_ranks(pools, 'land_keys', rng)
+    free_slots = [TARGET_DECK_SIZE - len(pool['commander_entries']) - len(spell_keys) - len(land_keys)
+                  for pool, spell_keys, land_keys in zip(pools, deck_spell_keys, deck_land_keys)]
+
+    candidates = []
+    for deck_index, pool in enumerate(pools):
+        skipped_keys = set(deck_land_keys[deck_index]) | (set(excluded_keys[deck_index]) if excluded_keys else set())
+        for cache_key in pool['land_keys']:
+            if cache_key in skipped_keys:
+                continue
+            candidates.append((-_get_allocation_synergy(pool, cache_key), ranks[deck_index][cache_key], deck_index, cache_key))
+    candidates.sort()
+
+    for negative_synergy, rank, deck_index, cache_key in candidates:
+        if free_slots[deck_index] <= 0 or capacities.get(cache_key, 0) <= 0:
+            continue
+        deck_land_keys[deck_index].append(cache_key)
+        capacities[cache_key] -= 1
+        free_slots[deck_index] -= 1
 
-    update_global_progress(60, "Ajout des terrains non-base...")
-    non_basic_lands_available = [key for key, data in potential_lands_from_inventory.items() if key not in added_to_deck_keys]
-    random.shuffle(non_basic_lands_available)
+    return deck_land_keys
 
-    for cache_key in non_basic_lands_available:
-        if len(deck_list_names) >= TARGET_DECK_SIZE:
-            break
-        
-        land_data = potential_lands_from_inventory[cache_key]
-        deck_list_names.append(land_data['name'])
-        deck_full_details_for_export.append({
-            'name': land_data['name'],
-            'set': land_data['set_from_scryfall'],
-            'collector_number': land_data['cn_from_scryfall'],
-            'foil': land_data['foil_in_txt'],
-            'details': land_data['details'] # Ajout des détails complets
-        })
-        added_to_deck_keys.add(cache_key)
-        deck_category_counts["Land"] += 1 # Compter les terrains non-base
-
-    current_deck_size = len(deck_list_names)
-    basic_lands_to_add_count = TARGET_DECK_SIZE - current_deck_size
-    
+def choose_basic_lands(pool, deck_cards_details, count, rng=random):
+    """Choisit `count` terrains de base, répartis selon les symboles de mana des cartes du deck."""
+    commander_color_identity = pool['color_identity']
     color_needs = Counter()
-    for card_data_added in deck_full_details_for_export:
-        details = card_data_added['details'] # Utiliser les détails déjà chargés
-        
+    for details in deck_cards_details:
         if details and 'mana_cost' in details:
             mana_cost_str = details['mana_cost']
             for color_symbol in ['W', 'U', 'B', 'R', 'G']:
                 color_needs[color_symbol] += mana_cost_str.count(color_symbol)
 
     if not color_needs and commander_color_identity:
-        for c in commander_color_identity:
+        for c in sorted(commander_color_identity): # Ordre fixe : même tirage pour une même graine, quel que soit le processus
             color_needs[c] = 1
     elif not color_needs and not commander_color_identity:
         color_needs['C'] = 1
 
     total_color_symbols = sum(color_needs.values())
-    
+
+    basic_lands = []
+    for _ in range(count):
+        chosen_color_symbol = 'C'
+        if total_color_symbols > 0:
+            chosen_color_symbol = rng.choices(
+                list(color_needs.keys()),
+                weights=list(color_needs.values()),
+                k=1
+            )[0]
+        elif commander_color_identity:
+            chosen_color_symbol = rng.choice(list(commander_color_identity))
+
+        basic_land_name = f"{COLOR_MAP.get(chosen_color_symbol, 'Colorless')} Basic Land"
+        bl_info = BASIC_LAND_SETS_CN.get(COLOR_MAP.get(chosen_color_symbol, 'Colorless'), {'set': 'STX', 'cn': '265'})
+
+        basic_lands.append({
+            'name': basic_land_name,
+            'set': bl_info['set'],
+            'collector_number': bl_info['cn'],
+            'foil': False,
+            'owner': None,
+            'details': {'name': basic_land_name, 'type_line': 'Basic Land'} # Détails min pour les terrains de base
+        })
+    return basic_lands
+
+def _make_deck_entry(data):
+    return {
+        'name': data['name'],
+        'set': data['set_from_scryfall'],
+        'collector_number': data['cn_from_scryfall'],
+        'foil': data['foil_in_txt'],
+        'owner': data['owner'],
+        'details': data['details'] # Ajout des détails complets
+    }
+
+def _get_synergy_card_info(data, chosen_strategy):
+    # Logique simplifiée pour la synergie
+    if chosen_strategy and chosen_strategy in data['categories']:
+        return {'name': data['name'], 'category': chosen_strategy}
+    if any(c in data['categories'] for c in ['ramp', 'draw', 'board_wipe', 'spot_removal']):
+        return {'name': data['name'], 'category': data['categories'][0]} # Prendre la première catégorie significative
+    return None
+
+def assemble_deck(pool, spell_keys, land_keys, rng=random):
+    """
+    Assemble le deck final à partir des sorts et terrains retenus, complète avec des terrains de base
+    et calcule les informations du rapport.
+    Retourne (deck_full_details, mana_curve_spells_cmc, deck_category_counts, synergy_cards_info).
+    """
+    cards = pool['cards']
+    chosen_strategy = pool['strategy']
+    deck_full_details_for_export = list(pool['commander_entries'])
+    deck_category_counts = Counter(pool['commander_category_counts'])
+    mana_curve_spells_cmc = []
+    synergy_cards_info = [] # Pour stocker des infos sur les cartes clés pour la synergie
+
+    # Remplir les statistiques et informations de synergie pour les sorts ajoutés
+    for cache_key in spell_keys:
+        data = cards[cache_key]
+        deck_full_details_for_export.append(_make_deck_entry(data))
+        mana_curve_spells_cmc.append(data['cmc'])
+        for cat in data['categories']:
+            deck_category_counts[cat] += 1
+        synergy_card_info = _get_synergy_card_info(data, chosen_strategy)
+        if synergy_card_info:
+            synergy_cards_info.append(synergy_card_info)
+
+    for cache_key in land_keys:
+        deck_full_details_for_export.append(_make_deck_entry(cards[cache_key]))
+        deck_category_counts["Land"] += 1 # Compter les terrains non-base
+
+    basic_lands_to_add_count = TARGET_DECK_SIZE - len(deck_full_details_for_export)
     if basic_lands_to_add_count > 0:
-        added_basic_lands_info = []
-        progress_text_lands = "Complétion avec terrains de base..."
-        land_progress_bar = st.progress(0, text=progress_text_lands)
-
-        for i in range(basic_lands_to_add_count):
-            chosen_color_symbol = 'C'
-            if total_color_symbols > 0:
-                chosen_color_symbol = random.choices(
-                    list(color_needs.keys()), 
-                    weights=list(color_needs.values()), 
-                    k=1
-                )[0]
-            elif commander_color_identity:
-                chosen_color_symbol = random.choice(list(commander_color_identity))
-
-            basic_land_name = f"{COLOR_MAP.get(chosen_color_symbol, 'Colorless')} Basic Land"
-            
-            basic_land_sets_cn = {
-                'White': {'set': 'STA', 'cn': '63'},
-                'Blue': {'set': 'STA', 'cn': '64'},
-                'Black': {'set': 'STA', 'cn': '65'},
-                'Red': {'set': 'STA', 'cn': '66'},
-                'Green': {'set': 'STA', 'cn': '67'},
-                'Colorless': {'set': 'OGW', 'cn': '183'}
-            }
-            bl_info = basic_land_sets_cn.get(COLOR_MAP.get(chosen_color_symbol, 'Colorless'), {'set': 'STX', 'cn': '265'})
-
-            added_basic_lands_info.append({
-                'name': basic_land_name,
-                'set': bl_info['set'],
-                'collector_number': bl_info['cn'],
-                'foil': False,
-                'details': {'name': basic_land_name, 'type_line': 'Basic Land'} # Détails min pour les terrains de base
-            })
-            update_global_progress(60 + int(((i + 1) / basic_lands_to_add_count) * 20), progress_text_lands)
-            land_progress_bar.progress((i + 1) / basic_lands_to_add_count, text=progress_text_lands)
-        land_progress_bar.empty()
-        
-        for bl_data in added_basic_lands_info:
-            deck_list_names.append(bl_data['name'])
+        for bl_data in choose_basic_lands(pool, [card['details'] for card in deck_full_details_for_export], basic_lands_to_add_count, rng):
             deck_full_details_for_export.append(bl_data)
             deck_category_counts["Basic Land"] += 1 # Compter les terrains de base
 
-    update_global_progress(90, "Vérification finale du deck...")
-    
     # Assurez-vous que le deck a exactement TARGET_DECK_SIZE cartes
     if len(deck_full_details_for_export) > TARGET_DECK_SIZE:
         deck_full_details_for_export = deck_full_details_for_export[:TARGET_DECK_SIZE]
-        deck_list_names = [card['name'] for card in deck_full_details_for_export]
-    
-    if len(deck_list_names) < TARGET_DECK_SIZE:
-        st.warning(f"\n⚠️ Avertissement : Le deck n'a que {len(deck_list_names)} cartes. Il en manque {TARGET_DECK_SIZE - len(deck_list_names)} pour atteindre 100.")
+
+    return deck_full_details_for_export, mana_curve_spells_cmc, deck_category_counts, synergy_cards_info
+
+def _report_deck_size(deck_full_details):
+    if len(deck_full_details) < TARGET_DECK_SIZE:
+        st.warning(f"\n⚠️ Avertissement : Le deck n'a que {len(deck_full_details)} cartes. Il en manque {TARGET_DECK_SIZE - len(deck_full_details)} pour atteindre 100.")
         st.warning("Cela peut être dû à un inventaire insuffisant ou à des préférences trop restrictives.")
     else:
-        st.success(f"\n✅ Deck complet de {len(deck_list_names)} cartes généré avec succès ! 🎉")
+        st.success(f"\n✅ Deck complet de {len(deck_full_details)} cartes généré avec succès ! 🎉")
+
+def build_commander_deck_state(commandant_name, inventory_cards, preferences={}, progress_bar_global_deck_build=None, partner_name=None,
+                               on_phase=None):
+    """
+    Construit un deck comme build_commander_deck, mais retourne son état complet (ou None si le commandant est invalide) :
+    pool candidat, exemplaires restants, sorts et terrains retenus, cartes verrouillées/exclues et informations du rapport.
+    Cet état permet de reconstruire le deck par incréments, sans refaire le pool (voir rebuild_deck).
+    `on_phase(phase, valeur)` reçoit le résultat de chaque phase dès qu'elle se termine : 'pool' (le pool),
+    'spells' et 'lands' (clés retenues), puis 'deck' (l'état final).
+    """
+    update_global_progress = _make_progress_updater(progress_bar_global_deck_build)
+    on_phase = on_phase or (lambda phase, value: None)
+
+    with timed('build_phase_seconds', phase='prepare_pool'):
+        pool = prepare_deck_pool(commandant_name, inventory_cards, preferences, update_global_progress, partner_name)
+    if pool is None:
+        return None
+    on_phase('pool', pool)
 
+    # --- LOGIQUE DE CONSTRUCTION DU DECK ---
+    capacities = get_inventory_capacities(inventory_cards, [pool])
+
+    # Phase 1: Ajouter les sorts (non-terrains)
+    update_global_progress(40, "Sélection des sorts...")
+    with timed('build_phase_seconds', phase='allocate_spells'):
+        spell_keys = allocate_spells([pool], capacities)[0]
+    on_phase('spells', spell_keys)
+
+    # Phase 2: Terrains non-base, puis complétion avec terrains de base
+    update_global_progress(60, "Ajout des terrains non-base...")
+    with timed('build_phase_seconds', phase='allocate_lands'):
+        land_keys = allocate_lands([pool], [spell_keys], capacities)[0]
+    on_phase('lands', land_keys)
+
+    update_global_progress(80, "Complétion avec terrains de base...")
+    with timed('build_phase_seconds', phase='assemble'):
+        deck_full_details, mana_curve_spells_cmc, deck_category_counts, synergy_cards_info = assemble_deck(pool, spell_keys, land_keys)
+
+    update_global_progress(90, "Vérification finale du deck...")
+    _report_deck_size(deck_full_details)
     update_global_progress(100, "Deck prêt!")
 
+    deck_state = _make_deck_state(pool, capacities, spell_keys, land_keys,
+                                  (deck_full_details, mana_curve_spells_cmc, deck_category_counts, synergy_cards_info))
+    on_phase('deck', deck_state)
+    return deck_state
+
+def _make_deck_state(pool, capacities, spell_keys, land_keys, assembled_deck):
+    """État complet d'un deck nouvellement construit, `assembled_deck` étant le résultat de assemble_deck."""
+    deck_full_details, mana_curve_spells_cmc, deck_category_counts, synergy_cards_info = assembled_deck
+    return {
+        'pool': pool,
+        'capacities': capacities,
+        'spell_keys': spell_keys,
+        'land_keys': land_keys,
+        'basic_lands': deck_full_details[len(pool['commander_entries']) + len(spell_keys) + len(land_keys):],
+        'pinned_keys': set(),
+        'excluded_keys': set(),
+        'deck_full_details': deck_full_details,
+        'mana_curve_spells_cmc': mana_curve_spells_cmc,
+        'deck_category_counts': deck_category_counts,
+        'synergy_cards_info': synergy_cards_info,
+        'last_changes': {'added': [], 'removed': []},
+    }
+
+def build_commander_deck(commandant_name, inventory_cards, preferences={}, progress_bar_global_deck_build=None, partner_name=None):
+    """
+    Construit un deck Commander en se basant sur un commandant (et son partenaire éventuel), l'inventaire
+    de l'utilisateur et ses préférences.
+    Affiche la progression via `progress_bar_global_deck_build`.
+    """
+    deck_state = build_commander_deck_state(commandant_name, inventory_cards, preferences, progress_bar_global_deck_build, partner_name)
+    if deck_state is None:
+        return None, None, None, None
+
     # Retourner les informations supplémentaires pour le rapport
-    return deck_full_details_for_export, mana_curve_spells_cmc, deck_category_counts, synergy_cards_info
+    return deck_state['deck_full_details'], deck_state['mana_curve_spells_cmc'], deck_state['deck_category_counts'], deck_state['synergy_cards_info']
+
+def _keep_selected_keys(previous_keys, pool_keys, pinned_keys, excluded_keys, capacities, cards, limit):
+    """
+    Cartes gardées lors d'une reconstruction : les précédentes moins les exclues, plus les verrouillées
+    du pool (si un exemplaire est disponible). Au-delà de `limit`, les cartes non verrouillées les moins
+    synergiques sont retirées. `capacities` est mis à jour en place.
+    """
+    kept_keys = [key for key in previous_keys if key not in excluded_keys]
+    kept_set = set(kept_keys)
+    for key in sorted(pinned_keys & pool_keys - kept_set):
+        if capacities.get(key, 0) <= 0:
+            st.warning(f"⚠️ Plus d'exemplaire disponible pour la carte verrouillée '{cards[key]['name']}'.")
+            continue
+        kept_keys.append(key)
+        capacities[key] -= 1
+    while len(kept_keys) > limit:
+        unpinned_keys = [key for key in kept_keys if key not in pinned_keys]
+        if not unpinned_keys:
+            break
+        kept_keys.remove(min(unpinned_keys, key=lambda key: cards[key]['synergy']))
+    for key in set(previous_keys) - set(kept_keys):
+        capacities[key] = capacities.get(key, 0) + 1
+    return kept_keys
+
+def rebuild_deck(deck_state, pinned_keys=(), excluded_keys=(), rng=random):
+    """
+    Reconstruit un deck par incréments à partir de son état (voir build_commander_deck_state) :
+    les cartes verrouillées sont gardées (ou ajoutées), les exclues retirées, et seules les places
+    libérées sont re-sélectionnées dans le pool déjà préparé (aucun appel Scryfall).
+    Les catégories, la courbe de mana et les terrains de base sont mis à jour par différence.
+    Retourne le nouvel état ; 'last_changes' liste les cartes ajoutées et retirées.
+    """
+    start = time.perf_counter()
+    pool = deck_state['pool']
+    cards = pool['cards']
+    pinned_keys = set(pinned_keys) & set(cards)
+    excluded_keys = set(excluded_keys) & set(cards) - pinned_keys
+    capacities = dict(deck_state['capacities'])
+    commander_count = len(pool['commander_entries'])
+
+    kept_spell_keys = _keep_selected_keys(deck_state['spell_keys'], set(pool['spell_keys']), pinned_keys, excluded_keys,
+                                          capacities, cards, MIN_NON_LAND_CARDS)
+    spell_keys = allocate_spells([pool], capacities, rng, [kept_spell_keys], [excluded_keys])[0]
+
+    kept_land_keys = _keep_selected_keys(deck_state['land_keys'], set(pool['land_keys']), pinned_keys, excluded_keys,
+                                         capacities, cards, TARGET_DECK_SIZE - commander_count - len(spell_keys))
+    land_keys = allocate_lands([pool], [spell_keys], capacities, rng, [kept_land_keys], [excluded_keys])[0]
+
+    # Différences avec le deck précédent
+    previous_spell_set, previous_land_set = set(deck_state['spell_keys']), set(deck_state['land_keys'])
+    spell_set, land_set = set(spell_keys), set(land_keys)
+    removed_spells = [key for key in deck_state['spell_keys'] if key not in spell_set]
+    added_spells = [key for key in spell_keys if key not in previous_spell_set]
+    removed_lands = [key for key in deck_state['land_keys'] if key not in land_set]
+    added_lands = [key for key in land_keys if key not in previous_land_set]
+
+    mana_curve_spells_cmc = list(deck_state['mana_curve_spells_cmc'])
+    deck_category_counts = Counter(deck_state['deck_category_counts'])
+    removed_names = {cards[key]['name'] for key in removed_spells}
+    synergy_cards_info = [info for info in deck_state['synergy_cards_info'] if info['name'] not in removed_names]
+    for key in removed_spells:
+        mana_curve_spells_cmc.remove(cards[key]['cmc'])
+        deck_category_counts.subtract(cards[key]['categories'])
+    for key in added_spells:
+        mana_curve_spells_cmc.append(cards[key]['cmc'])
+        deck_category_counts.update(cards[key]['categories'])
+        synergy_card_info = _get_synergy_card_info(cards[key], pool['strategy'])
+        if synergy_card_info:
+            synergy_cards_info.append(synergy_card_info)
+    deck_category_counts["Land"] += len(added_lands) - len(removed_lands)
+
+    # Terrains de base : on garde les précédents et on n'ajoute ou ne retire que la différence
+    deck_non_basic_entries = (list(pool['commander_entries']) + [_make_deck_entry(cards[key]) for key in spell_keys]
+                              + [_make_deck_entry(cards[key]) for key in land_keys])
+    basic_lands_count = max(0, TARGET_DECK_SIZE - len(deck_non_basic_entries))
+    basic_lands = deck_state['basic_lands'][:basic_lands_count]
+    if len(basic_lands) < basic_lands_count:
+        basic_lands += choose_basic_lands(pool, [card['details'] for card in deck_non_basic_entries],
+                                          basic_lands_count - len(basic_lands), rng)
+    deck_category_counts["Basic Land"] += len(basic_lands) - len(deck_state['basic_lands'])
+
+    new_deck_state = {
+        'pool': pool,
+        'capacities': capacities,
+        'spell_keys': spell_keys,
+        'land_keys': land_keys,
+        'basic_lands': basic_lands,
+        'pinned_keys': pinned_keys,
+        'excluded_keys': excluded_keys,
+        'deck_full_details': deck_non_basic_entries + basic_lands,
+        'mana_curve_spells_cmc': mana_curve_spells_cmc,
+        'deck_category_counts': +deck_category_counts, # Retire les catégories devenues vides
+        'synergy_cards_info': synergy_cards_info,
+        'last_changes': {
+            'added': [cards[key]['name'] for key in added_spells + added_lands],
+            'removed': [cards[key]['name'] for key in removed_spells + removed_lands],
+        },
+    }
+    observe('build_phase_seconds', time.perf_counter() - start, phase='rebuild')
+    return new_deck_state
+
+def build_multiple_decks(commander_names, inventory_cards, preferences={}, progress_bar_global_deck_build=None):
+    """
+    Construit simultanément un deck pour chacun des commandants à partir du même inventaire.
+    Les cartes sont attribuées en une seule passe globale : aucune carte n'est utilisée plus de fois
+    qu'elle n'est possédée, et une carte disputée va au deck où sa synergie est la plus forte.
+    Retourne une liste de tuples (nom_commandant, deck_full_details, mana_curve_spells_cmc, deck_category_counts, synergy_cards_info).
+    """
+    update_global_progress = _make_progress_updater(progress_bar_global_deck_build)
+
+    pools = []
+    for index, commandant_name in enumerate(commander_names):
+        update_global_progress(int(40 * index / len(commander_names)), f"Préparation du pool de {commandant_name}...")
+        # Copie des préférences : l'ajustement des couleurs à un commandant ne doit pas affecter les autres
+        with timed('build_phase_seconds', phase='prepare_pool'):
+            pool = prepare_deck_pool(commandant_name, inventory_cards, dict(preferences))
+        if pool is not None:
+            pools.append(pool)
+    if not pools:
+        return []
+
+    capacities = get_inventory_capacities(inventory_cards, pools)
+
+    update_global_progress(50, "Attribution globale des sorts...")
+    with timed('build_phase_seconds', phase='allocate_spells'):
+        deck_spell_keys = allocate_spells(pools, capacities)
+
+    update_global_progress(70, "Attribution globale des terrains non-base...")
+    with timed('build_phase_seconds', phase='allocate_lands'):
+        deck_land_keys = allocate_lands(pools, deck_spell_keys, capacities)
+
+    update_global_progress(85, "Complétion avec terrains de base...")
+    built_decks = []
+    with timed('build_phase_seconds', phase='assemble'):
+        for pool, spell_keys, land_keys in zip(pools, deck_spell_keys, deck_land_keys):
+            built_decks.append((pool['commander_name'],) + assemble_deck(pool, spell_keys, land_keys))
+
+    update_global_progress(100, "Decks prêts!")
+    return built_decks
+
+# --- Meilleur de N constructions ---
+# Le départage aléatoire des synergies égales et le choix des terrains de base font varier un deck d'une
+# construction à l'autre. build_best_of_n_deck_state prépare le pool une seule fois, construit N candidats
+# (une graine chacun) dans des processus de travail, note chacun (score_deck_quality) et garde le meilleur.
+
+BASIC_LAND_COLORS = {f"{color_name} Basic Land": color_symbol for color_symbol, color_name in COLOR_MAP.items()}
+
+def _get_mana_base_odds(pool, spell_keys, land_keys, basic_lands):
+    """
+    Probabilité (approchée, couleurs supposées indépendantes) d'avoir vu au moins une source de chaque couleur
+    demandée par les sorts dans les DECK_QUALITY_DRAWN_CARDS premières cartes (loi hypergéométrique).
+    """
+    cards = pool['cards']
+    mana_costs = [details.get('mana_cost', '') for details in pool['commanders_details']]
+    mana_costs += [cards[key]['details'].get('mana_cost', '') for key in spell_keys]
+    needed_colors = {color for color in COLOR_MAP if any(color in mana_cost for mana_cost in mana_costs)}
+    if not needed_colors:
+        return 1.0
+
+    sources = Counter(BASIC_LAND_COLORS[land['name']] for land in basic_lands if land['name'] in BASIC_LAND_COLORS)
+    for key in land_keys:
+        sources.update(needed_colors.intersection(cards[key]['details'].get('produced_mana', [])))
+    library_size = TARGET_DECK_SIZE - len(pool['commander_entries'])
+    drawn_count = min(DECK_QUALITY_DRAWN_CARDS, library_size)
+    odds = 1.0
+    for color in needed_colors:
+        odds *= 1 - math.comb(library_size - min(sources[color], library_size), drawn_count) / math.comb(library_size, drawn_count)
+    return odds
+
+def score_deck_quality(pool, spell_keys, land_keys, basic_lands):
+    """
+    Note de qualité d'un deck entre 0 et 1, moyenne pondérée (DECK_QUALITY_WEIGHTS) de quatre composantes :
+      - 'cmc_curve' : proximité de la courbe de mana des sorts avec CMC_TARGET_DISTRIBUTION (1 - distance L1 / 2)
+      - 'categories' : part des objectifs de CARD_CATEGORIES_RATIOS atteinte
+      - 'strategy' : densité de sorts de la stratégie choisie (sans stratégie : synergie moyenne rapportée au maximum du pool)
+      - 'mana_base' : chances d'avoir les couleurs nécessaires au tour 3 (voir _get_mana_base_odds)
+    Retourne (score, {composante: valeur}).
+    """
+    cards = pool['cards']
+    spell_count = max(1, len(spell_keys))
+
+    max_cmc = max(CMC_TARGET_DISTRIBUTION)
+    cmc_counts = Counter(min(int(cards[key]['cmc']), max_cmc) for key in spell_keys)
+    target_total = sum(CMC_TARGET_DISTRIBUTION.values())
+    cmc_distance = sum(abs(cmc_counts[cmc] / spell_count - CMC_TARGET_DISTRIBUTION.get(cmc, 0) / target_total)
+                       for cmc in range(max_cmc + 1))
+
+    category_counts = Counter(pool['commander_category_counts'])
+    for key in spell_keys:
+        category_counts.update(cards[key]['categories'])
+    categories_coverage = (sum(min(category_counts[category], target) for category, target in CARD_CATEGORIES_RATIOS.items())
+                           / sum(CARD_CATEGORIES_RATIOS.values()))
+
+    if pool['strategy']:
+        strategy_density = sum(1 for key in spell_keys if pool['strategy'] in cards[key]['categories']) / spell_count
+        strategy_score = min(1.0, strategy_density / DECK_QUALITY_STRATEGY_DENSITY)
+    else:
+        max_synergy = max((data['synergy'] for data in cards.values()), default=0.0)
+        mean_synergy = sum(cards[key]['synergy'] for key in spell_keys) / spell_count
+        strategy_score = min(1.0, mean_synergy / max_synergy) if max_synergy > 0 else 1.0
+
+    components = {
+        'cmc_curve': 1.0 - cmc_distance / 2,
+        'categories': categories_coverage,
+        'strategy': strategy_score,
+        'mana_base': _get_mana_base_odds(pool, spell_keys, land_keys, basic_lands),
+    }
+    total_weight = sum(DECK_QUALITY_WEIGHTS.values())
+    score = sum(DECK_QUALITY_WEIGHTS[name] * value for name, value in components.items()) / total_weight
+    return score, components
+
+def _build_deck_candidate(pool, capacities, seed):
+    """Construit un deck candidat avec sa propre graine ; retourne (exemplaires restants, sorts, terrains, assemble_deck)."""
+    rng = random.Random(seed)
+    capacities = dict(capacities)
+    spell_keys = allocate_spells([pool], capacities, rng)[0]
+    land_keys = allocate_lands([pool], [spell_keys], capacities, rng)[0]
+    return capacities, spell_keys, land_keys, assemble_deck(pool, spell_keys, land_keys, rng)
+
+def _score_deck_candidates(pool, capacities, seeds):
+    """Construit et note les candidats des graines `seeds` ; retourne [(score, graine, composantes)]."""
+    scored_candidates = []
+    for seed in seeds:
+        _, spell_keys, land_keys, (deck_full_details, *_) = _build_deck_candidate(pool, capacities, seed)
+        basic_lands = deck_full_details[len(pool['commander_entries']) + len(spell_keys) + len(land_keys):]
+        score, components = score_deck_quality(pool, spell_keys, land_keys, basic_lands)
+        scored_candidates.append((score, seed, components))
+    return scored_candidates
+
+@st.cache_resource
+def get_candidate_build_executor():
+    """
+    Processus de construction des candidats, démarrés une fois et partagés entre les sessions.
+    Démarrage 'spawn' : pas de fork d'un processus dont les threads (serveur Streamlit, API) tiennent des verrous.
+    """
+    return ProcessPoolExecutor(max_workers=BEST_OF_N_WORKER_COUNT, mp_context=multiprocessing.get_context('spawn'))
+
+def score_deck_candidates(pool, capacities, seeds):
+    """
+    Construit et note un candidat par graine. Les graines sont réparties en un lot par processus de travail,
+    le pool n'étant ainsi transmis qu'une fois par processus ; sous BEST_OF_N_MIN_PARALLEL_CANDIDATES candidats
+    (ou si les processus sont indisponibles), tout est fait dans le processus courant.
+    Retourne [(score, graine, composantes)] dans l'ordre des graines.
+    """
+    seeds = list(seeds)
+    if len(seeds) < BEST_OF_N_MIN_PARALLEL_CANDIDATES or BEST_OF_N_WORKER_COUNT <= 1:
+        return _score_deck_candidates(pool, capacities, seeds)
+    seed_batches = [seeds[index::BEST_OF_N_WORKER_COUNT] for index in range(BEST_OF_N_WORKER_COUNT)]
+    try:
+        executor = get_candidate_build_executor()
+        futures = [executor.submit(_score_deck_candidates, pool, capacities, batch) for batch in seed_batches if batch]
+        scored_candidates = [candidate for future in futures for candidate in future.result()]
+    except (BrokenProcessPool, OSError):
+        get_candidate_build_executor.clear() # Un processus est mort : un nouveau pool sera créé au prochain appel
+        return _score_deck_candidates(pool, capacities, seeds)
+    order = {seed: index for index, seed in enumerate(seeds)}
+    return sorted(scored_candidates, key=lambda candidate: order[candidate[1]])
+
+def build_best_of_n_deck_state(commandant_name, inventory_cards, preferences={}, progress_bar_global_deck_build=None,
+                               partner_name=None, candidate_count=BEST_OF_N_CANDIDATES, seed=None, on_phase=None):
+    """
+    Construit `candidate_count` decks candidats à partir d'un même pool et retourne l'état du meilleur
+    (voir build_commander_deck_state), ou None si le commandant est invalide.
+    L'état contient en plus 'quality' : note et composantes du deck retenu, sa graine, et la dispersion
+    des notes des candidats (min, médiane, max, écart-type).
+    `seed` fixe les graines des candidats (constructions reproductibles).
+    `on_phase` reçoit 'pool', 'candidates' (la qualité, une fois les candidats notés) et 'deck' (voir build_commander_deck_state).
+    """
+    update_global_progress = _make_progress_updater(progress_bar_global_deck_build)
+    on_phase = on_phase or (lambda phase, value: None)
+
+    with timed('build_phase_seconds', phase='prepare_pool'):
+        pool = prepare_deck_pool(commandant_name, inventory_cards, preferences, update_global_progress, partner_name)
+    if pool is None:
+        return None
+    on_phase('pool', pool)
+    capacities = get_inventory_capacities(inventory_cards, [pool])
+
+    update_global_progress(40, f"Construction et notation de {candidate_count} decks candidats...")
+    seeds_rng = random.Random(seed)
+    seeds = [seeds_rng.getrandbits(64) for _ in range(max(1, candidate_count))]
+    with timed('build_phase_seconds', phase='best_of_n'):
+        scored_candidates = score_deck_candidates(pool, capacities, seeds)
+
+    # Le meilleur candidat est reconstruit ici avec sa graine (construction déterministe) : seules les notes
+    # reviennent des processus de travail, pas les decks.
+    update_global_progress(85, "Assemblage du meilleur deck...")
+    best_score, best_seed, best_components = max(scored_candidates, key=lambda candidate: candidate[0])
+    deck_state = _make_deck_state(pool, *_build_deck_candidate(pool, capacities, best_seed))
+
+    scores = [candidate[0] for candidate in scored_candidates]
+    deck_state['quality'] = {
+        'score': best_score,
+        'components': best_components,
+        'seed': best_seed,
+        'candidate_count': len(scores),
+        'spread': {'min': min(scores), 'median': statistics.median(scores), 'max': max(scores), 'stdev': statistics.pstdev(scores)},
+    }
+    on_phase('candidates', deck_state['quality'])
+
+    update_global_progress(90, "Vérification finale du deck...")
+    _report_deck_size(deck_state['deck_full_details'])
+    update_global_progress(100, "Deck prêt!")
+    on_phase('deck', deck_state)
+    return deck_state
@@ -0,0 +1,88 @@
+# deck_report.py
+
+import hashlib
+from collections import Counter
+import streamlit as st
+
+from config import TARGET_DECK_SIZE, TARGET_LAND_COUNT, CARD_CATEGORIES_RATIOS
+
+# Catégories affichées dans la répartition par catégorie de sort
+REPORT_CATEGORIES = [
+    'ramp', 'draw', 'spot_removal', 'board_wipe', 'threat', 'utility', 'flex_slots',
+    # Catégories de stratégie non-génériques
+    'token', 'voltron', 'stax', 'mill', 'discard', 'aristocrats', 'reanimator',
+    'spellslinger', 'enchantments_matter', 'artifacts_matter', 'counters_matter',
+    'superfriends', 'tribal', 'group_hug', 'group_slug', 'pillow_fort', 'theft'
+]
+
+def compute_deck_hash(deck_full_details, strategy=None):
+    """Empreinte du contenu d'un deck (cartes + stratégie), utilisée comme clé de mémoïsation du rapport."""
+    hasher = hashlib.sha1((strategy or '').encode('utf-8'))
+    for card_info in sorted(deck_full_details, key=lambda c: (c['name'], c['set'], str(c['collector_number']))):
+        hasher.update(f"|{card_info['name']}|{card_info['set']}|{card_info['collector_number']}|{card_info['foil']}".encode('utf-8'))
+    return hasher.hexdigest()
+
+def format_deck_list(deck_full_details):
+    """Lignes d'export du deck au format Archidekt, triées par nom."""
+    deck_display_list = []
+    for card_info in sorted(deck_full_details, key=lambda x: x['name']):
+        foil_str = " *F*" if card_info['foil'] else ""
+        deck_display_list.append(f"1 {card_info['name']} ({card_info['set']}) {card_info['collector_number']}{foil_str}")
+    return deck_display_list
+
+@st.cache_data(ttl=3600*24, max_entries=64)
+def build_deck_report(deck_hash, _deck_full_details, _mana_curve_spells_cmc, _deck_category_counts, _synergy_cards_info, strategy=None):
+    """
+    Calcule le rapport d'un deck généré (statistiques, synergie, suggestions) sans aucun affichage.
+    Fonction pure mémoïsée sur `deck_hash` : les arguments préfixés par '_' ne sont pas hachés par Streamlit,
+    leur contenu est entièrement décrit par l'empreinte (voir compute_deck_hash).
+    Les types sont lus dans les détails Scryfall déjà présents dans le deck (aucune requête).
+    """
+    land_count = 0
+    type_counts = Counter()
+    for card_info in _deck_full_details:
+        type_line = card_info.get('details', {}).get('type_line', '')
+        if "Basic Land" in type_line:
+            land_count += 1
+            type_counts['Basic Land'] += 1
+            continue
+        if "Land" in type_line:
+            land_count += 1
+        for card_type in type_line.split(' — ')[0].split(' '):
+            if card_type:
+                type_counts[card_type] += 1
+
+    avg_cmc = None
+    if _mana_curve_spells_cmc:
+        avg_cmc = sum(_mana_curve_spells_cmc) / len(_mana_curve_spells_cmc)
+
+    category_lines = [(cat.replace('_', ' ').title(), _deck_category_counts[cat])
+                      for cat in REPORT_CATEGORIES if _deck_category_counts.get(cat, 0) > 0]
+
+    synergy_cards_for_strategy = []
+    if strategy:
+        synergy_cards_for_strategy = [c['name'] for c in _synergy_cards_info if c['category'] == strategy]
+
+    deck_size = len(_deck_full_details)
+    suggestions = []
+    if deck_size < TARGET_DECK_SIZE:
+        suggestions.append(f"- **Il manque {TARGET_DECK_SIZE - deck_size} cartes pour atteindre la taille standard de 100 cartes pour un deck Commander.**")
+    if land_count < TARGET_LAND_COUNT:
+        suggestions.append(f"- **Terrains** (il est recommandé d'avoir environ {TARGET_LAND_COUNT} terrains).")
+    if _deck_category_counts.get('ramp', 0) < CARD_CATEGORIES_RATIOS['ramp']:
+        suggestions.append(f"- **Rampe de mana** (objectif: {CARD_CATEGORIES_RATIOS['ramp']} cartes).")
+    if _deck_category_counts.get('draw', 0) < CARD_CATEGORIES_RATIOS['draw']:
+        suggestions.append(f"- **Pioche de cartes** (objectif: {CARD_CATEGORIES_RATIOS['draw']} cartes).")
+    total_removal = _deck_category_counts.get('spot_removal', 0) + _deck_category_counts.get('board_wipe', 0)
+    if total_removal < (CARD_CATEGORIES_RATIOS['spot_removal'] + CARD_CATEGORIES_RATIOS['board_wipe']):
+        suggestions.append(f"- **Gestion des menaces** (objectif: {CARD_CATEGORIES_RATIOS['spot_removal']} ciblées, {CARD_CATEGORIES_RATIOS['board_wipe']} de masse).")
+
+    return {
+        'deck_size': deck_size,
+        'land_count': land_count,
+        'avg_cmc': avg_cmc,
+        'type_counts': type_counts.most_common(),
+        'category_lines': category_lines,
+        'synergy_cards_for_strategy': synergy_cards_for_strategy,
+        'suggestions': suggestions,
+    }
@@ -0,0 +1,236 @@
+# deck_validator.py
+
+import re
+from collections import Counter
+
+from scryfall_api import get_card_details_scryfall, get_card_details_batch_scryfall, get_color_mask, _get_cache_key
+from card_classifier import can_form_commander_pair
+from config import TARGET_DECK_SIZE
+
+# Validation d'une decklist selon les règles du format Commander :
+#   - un commandant (créature légendaire, ou carte qui "can be your commander") ou une paire valide
+#     (Partner, Friends forever, Choose a Background...)
+#   - exactement TARGET_DECK_SIZE cartes, commandants compris
+#   - aucune carte bannie ou non légale en Commander (legalities.commander de Scryfall)
+#   - un seul exemplaire par nom, sauf terrains de base et cartes qui l'autorisent ("A deck can have any number...")
+#   - identité couleur de chaque carte incluse dans celle des commandants
+# Les indicateurs de chaque carte (bannie, limite d'exemplaires, masque de couleurs, éligibilité comme commandant)
+# sont précalculés une fois dans une table (voir build_legality_table) ; valider une decklist ne fait ensuite que
+# des opérations d'ensembles sur ses noms. Un lot de decklists partage une seule table (voir validate_decklists).
+
+ANY_NUMBER_PATTERN = re.compile(r"A deck can have any number of cards named")
+UP_TO_PATTERN = re.compile(r"A deck can have up to (\w+) cards named")
+NUMBER_WORDS = {'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10}
+# "1 Sol Ring", "1x Sol Ring (C13) 1 *F*", "1 Atraxa, Praetors' Voice (2XM) 190 [Commander]"
+DECKLIST_LINE_PATTERN = re.compile(
+    r"^(\d+)x?\s+(.+?)(?:\s+\(([^)]+)\)\s*(\S+))?(?:\s*\*[Ff]\*)?\s*(\[Commander[^\]]*\])?\s*$", re.IGNORECASE
+)
+
+VIOLATION_MESSAGES = {
+    'unknown_card': "carte introuvable sur Scryfall",
+    'banned': "bannie en Commander",
+    'not_legal': "non légale en Commander",
+    'color_identity': "hors de l'identité couleur du commandant",
+    'singleton': "trop d'exemplaires",
+    'commander': "ne peut pas être commandant",
+    'commander_pair': "ces commandants ne peuvent pas être joués ensemble",
+    'deck_size': "taille du deck incorrecte",
+}
+
+def get_copy_limit(card_details):
+    """Nombre d'exemplaires autorisés : 1, None (illimité : terrains de base, "any number") ou la limite imprimée."""
+    if 'Basic' in card_details.get('type_line', '').split(' — ')[0]:
+        return None
+    oracle_text = card_details.get('oracle_text', '')
+    if ANY_NUMBER_PATTERN.search(oracle_text):
+        return None
+    up_to_match = UP_TO_PATTERN.search(oracle_text)
+    if up_to_match:
+        return NUMBER_WORDS.get(up_to_match.group(1).lower(), 1)
+    return 1
+
+def is_commander_eligible(card_details):
+    """Vérifie si une carte peut être seule commandant (créature légendaire ou "can be your commander")."""
+    front_type_line = card_details.get('type_line', '').split(' // ')[0]
+    return (('Legendary' in front_type_line and 'Creature' in front_type_line)
+            or "can be your commander" in card_details.get('oracle_text', '').lower())
+
+def build_legality_table(cards_details):
+    """
+    Précalcule les indicateurs des cartes (détails Scryfall), par nom : 'banned' et 'not_legal' (ensembles),
+    'copy_limits' (cartes dont la limite n'est pas 1), 'color_masks', 'commander_eligible' (ensemble) et 'details'.
+    Une seule impression par nom suffit : les règles du format portent sur le nom.
+    """
+    table = {'details': {}, 'banned': set(), 'not_legal': set(), 'copy_limits': {}, 'color_masks': {},
+             'commander_eligible': set(), 'names_within_mask': {}}
+    for card_details in cards_details:
+        name = card_details.get('name') if card_details else None
+        if not name or name in table['details']:
+            continue
+        table['details'][name] = card_details
+        commander_legality = card_details.get('legalities', {}).get('commander')
+        if commander_legality == 'banned':
+            table['banned'].add(name)
+        elif commander_legality == 'not_legal':
+            table['not_legal'].add(name)
+        copy_limit = get_copy_limit(card_details)
+        if copy_limit != 1:
+            table['copy_limits'][name] = copy_limit
+        table['color_masks'][name] = get_color_mask(card_details)
+        if is_commander_eligible(card_details):
+            table['commander_eligible'].add(name)
+    return table
+
+def _get_names_within_mask(legality_table, color_mask):
+    """Noms de la table dont l'identité couleur est incluse dans `color_mask` (calculé une fois par masque)."""
+    names_within_mask = legality_table['names_within_mask'].get(color_mask)
+    if names_within_mask is None:
+        names_within_mask = frozenset(name for name, mask in legality_table['color_masks'].items() if not mask & ~color_mask)
+        legality_table['names_within_mask'][color_mask] = names_within_mask
+    return names_within_mask
+
+def _make_violation(card_name, rule, detail=None):
+    message = VIOLATION_MESSAGES[rule] + (f" ({detail})" if detail else "")
+    return {'card': card_name, 'rule': rule, 'message': message}
+
+def _validate_commanders(commander_names, legality_table):
+    details = legality_table['details']
+    known_names = [name for name in commander_names if name in details]
+    if len(commander_names) == 1:
+        if known_names and known_names[0] not in legality_table['commander_eligible']:
+            return [_make_violation(known_names[0], 'commander')]
+        return []
+    if len(commander_names) != 2:
+        return [_make_violation(None, 'commander_pair', f"{len(commander_names)} commandants")]
+    if len(known_names) == 2:
+        first_details, second_details = details[known_names[0]], details[known_names[1]]
+        if not (can_form_commander_pair(first_details, second_details) or can_form_commander_pair(second_details, first_details)):
+            return [_make_violation(" + ".join(commander_names), 'commander_pair')]
+    return []
+
+def validate_decklist(decklist, legality_table):
+    """
+    Valide une decklist {'commanders': [noms], 'cards': [noms, un par exemplaire, commandants exclus]}.
+    Retourne {'legal': bool, 'deck_size': int, 'violations': [{'card', 'rule', 'message'}]} ;
+    chaque violation porte sur une carte (ou sur le deck entier si 'card' vaut None).
+    """
+    commander_names = list(decklist['commanders'])
+    card_counts = Counter(decklist['cards'])
+    card_counts.update(commander_names)
+    deck_names = set(card_counts)
+
+    violations = _validate_commanders(commander_names, legality_table)
+    unknown_names = deck_names.difference(legality_table['details']) # Parcourt le deck, pas la table
+    violations.extend(_make_violation(name, 'unknown_card') for name in sorted(unknown_names))
+    violations.extend(_make_violation(name, 'banned') for name in sorted(deck_names & legality_table['banned']))
+    violations.extend(_make_violation(name, 'not_legal') for name in sorted(deck_names & legality_table['not_legal']))
+
+    color_masks = legality_table['color_masks']
+    commander_mask = 0
+    for name in commander_names:
+        commander_mask |= color_masks.get(name, 0)
+    off_color_names = deck_names - unknown_names - _get_names_within_mask(legality_table, commander_mask)
+    violations.extend(_make_violation(name, 'color_identity') for name in sorted(off_color_names))
+
+    copy_limits = legality_table['copy_limits']
+    for name in sorted(name for name, count in card_counts.items() if count > 1):
+        copy_limit = copy_limits.get(name, 1)
+        if copy_limit is not None and card_counts[name] > copy_limit:
+            violations.append(_make_violation(name, 'singleton', f"{card_counts[name]} pour {copy_limit} autorisé(s)"))
+
+    deck_size = sum(card_counts.values())
+    if deck_size != TARGET_DECK_SIZE:
+        violations.append(_make_violation(None, 'deck_size', f"{deck_size} cartes au lieu de {TARGET_DECK_SIZE}"))
+    return {'legal': not violations, 'deck_size': deck_size, 'violations': violations}
+
+# --- Decklists ---
+
+def make_decklist(deck_full_details, commander_count=1):
+    """
+    Decklist d'un deck généré (deck_full_details de build_commander_deck, commandants en tête).
+    Les détails Scryfall du deck y sont repris : sa validation ne fait aucune requête.
+    """
+    return {
+        'commanders': [card_info['name'] for card_info in deck_full_details[:commander_count]],
+        'cards': [card_info['name'] for card_info in deck_full_details[commander_count:]],
+        'details': {card_info['name']: card_info.get('details') for card_info in deck_full_details},
+    }
+
+def make_deck_state_decklist(deck_state):
+    """Decklist d'un état de deck (voir build_commander_deck_state)."""
+    return make_decklist(deck_state['deck_full_details'], len(deck_state['pool']['commander_entries']))
+
+def parse_decklist_text(decklist_text, commander_names=()):
+    """
+    Lit une decklist texte (une ligne "quantité Nom (SET) numéro", le set et le numéro étant facultatifs).
+    Les commandants sont les lignes marquées [Commander] (export Archidekt) ou ceux de `commander_names`.
+    Retourne (decklist, lignes non reconnues).
+    """
+    commanders = list(commander_names)
+    cards = []
+    identifiers = {}
+    unparsed_lines = []
+    for line in decklist_text.splitlines():
+        line = line.strip()
+        if not line or line.startswith(('#', '//')):
+            continue
+        match = DECKLIST_LINE_PATTERN.match(line)
+        if not match:
+            unparsed_lines.append(line)
+            continue
+        quantity, full_name, set_code, collector_number, commander_tag = match.groups()
+        name = full_name.split('//')[0].strip() # Comme l'inventaire : la première face suffit
+        if set_code and collector_number:
+            identifiers.setdefault(name, {'name': name, 'set': set_code.strip().upper(), 'collector_number': collector_number})
+        if commander_tag or name in commanders:
+            if name not in commanders:
+                commanders.append(name)
+            quantity = int(quantity) - 1
+        else:
+            quantity = int(quantity)
+        cards.extend([name] * quantity)
+    return {'commanders': commanders, 'cards': cards, 'identifiers': list(identifiers.values())}, unparsed_lines
+
+def get_decklists_card_details(decklists):
+    """
+    Détails Scryfall de toutes les cartes distinctes d'un lot de decklists, par nom : ceux qu'elles portent déjà
+    ('details' : {nom: détails}), puis les impressions indiquées (un seul appel groupé), puis les noms restants.
+    """
+    cards_details = {} # Nom dans la decklist -> détails
+    for decklist in decklists:
+        for name, card_details in (decklist.get('details') or {}).items():
+            if card_details:
+                cards_details.setdefault(name, card_details)
+
+    identifiers = {}
+    for decklist in decklists:
+        for identifier in decklist.get('identifiers') or ():
+            if identifier['name'] not in cards_details:
+                identifiers.setdefault(_get_cache_key(identifier), identifier)
+    if identifiers:
+        found_cards_details, _ = get_card_details_batch_scryfall(list(identifiers.values()))
+        for cache_key, identifier in identifiers.items():
+            if found_cards_details.get(cache_key):
+                cards_details.setdefault(identifier['name'], found_cards_details[cache_key])
+
+    missing_names = set()
+    for decklist in decklists:
+        missing_names.update(name for name in decklist['commanders'] if name not in cards_details)
+        missing_names.update(name for name in decklist['cards'] if name not in cards_details)
+    for name in sorted(missing_names):
+        card_details = get_card_details_scryfall(name)
+        if card_details:
+            cards_details[name] = card_details
+    return cards_details
+
+def validate_decklists(decklists, legality_table=None):
+    """
+    Valide un lot de decklists (voir validate_decklist) avec une seule table d'indicateurs, construite
+    si besoin sur l'union de leurs cartes (voir get_decklists_card_details).
+    Retourne la liste des résultats, dans l'ordre des decklists.
+    """
+    if legality_table is None:
+        cards_details = get_decklists_card_details(decklists)
+        # Indexée par les noms des decklists (première face seulement pour les cartes recto-verso)
+        legality_table = build_legality_table(dict(card_details, name=name) for name, card_details in cards_details.items())
+    return [validate_decklist(decklist, legality_table) for decklist in decklists]
@@ -1,7 +1,9 @@
 # inventory_manager.py
 
+import os
 import re
 import streamlit as st
+from metrics import increment
 # import os # Retiré car chemin_fichier est maintenant un objet fichier, plus un chemin
 
 # INVENTORY_FILE est retiré de config.py, donc pas besoin ici.
@@ -13,6 +15,7 @@ def load_inventory_from_txt(uploaded_file): # <-- MODIFIÉ: Accepte l'objet fich
     Format attendu : "quantité nom de la carte (SET) no de carte *F* si foil"
     Retourne un dictionnaire de type {cache_key: {'name': str, ...}}.
     """
+    increment('cache_misses_total', function='load_inventory_from_txt')
     inventaire = {}
     errors = []
     regex_ligne_carte = re.compile(r"(\d+)\s(.+?)\s\((.*?)\)\s*(\d+)(\s*\*([Ff])\*)?\s*$")
@@ -66,8 +69,49 @@ def load_inventory_from_txt(uploaded_file): # <-- MODIFIÉ: Accepte l'objet fich
 
     return inventaire
 
-def get_inventory(uploaded_file): # <-- MODIFIÉ: Accepte le fichier téléversé
-    """Fonction principale pour obtenir l'inventaire avec un indicateur de cache."""
+def merge_collections(collections):
+    """
+    Fusionne plusieurs inventaires nommés {propriétaire: inventaire} en un seul pool.
+    Les identifiants (nom+set+numéro) sont dédoublonnés : chaque carte n'apparaît qu'une fois, avec
+    la quantité totale dans 'quantity_owned' et la répartition par propriétaire dans 'owners'.
+    La résolution Scryfall et la classification ne portent ensuite que sur les identifiants uniques.
+    """
+    pool = {}
+    for owner, inventory in collections.items():
+        for cache_key, card_info in inventory.items():
+            pooled_info = pool.get(cache_key)
+            if pooled_info is None:
+                pooled_info = dict(card_info, quantity_owned=0, owners={})
+                pool[cache_key] = pooled_info
+            pooled_info['quantity_owned'] += card_info['quantity_owned']
+            pooled_info['owners'][owner] = pooled_info['owners'].get(owner, 0) + card_info['quantity_owned']
+            pooled_info['foil_in_txt'] = pooled_info['foil_in_txt'] or card_info['foil_in_txt']
+    return pool
+
+def get_card_owner(card_info):
+    """Retourne le propriétaire qui fournit la carte (celui qui en possède le plus d'exemplaires), ou None."""
+    owners = card_info.get('owners') if card_info else None
+    if not owners:
+        return None
+    return max(owners.items(), key=lambda item: item[1])[0] # En cas d'égalité, la première collection chargée
+
+def get_inventory(uploaded_files):
+    """
+    Fonction principale pour obtenir l'inventaire avec un indicateur de cache.
+    Accepte un ou plusieurs fichiers téléversés (une collection nommée par fichier).
+    Retourne (pool fusionné, {propriétaire: inventaire}).
+    """
+    if not isinstance(uploaded_files, (list, tuple)):
+        uploaded_files = [uploaded_files]
+
+    collections = {}
     with st.spinner("Chargement de l'inventaire et pré-analyse..."):
-        inventory_data = load_inventory_from_txt(uploaded_file)
-    return inventory_data
+        for uploaded_file in uploaded_files:
+            owner = os.path.splitext(uploaded_file.name)[0]
+            suffix = 2
+            while owner in collections:
+                owner = f"{os.path.splitext(uploaded_file.name)[0]} ({suffix})"
+                suffix += 1
+            increment('cache_calls_total', function='load_inventory_from_txt')
+            collections[owner] = load_inventory_from_txt(uploaded_file)
+    return merge_collections(collections), collections
@@ -0,0 +1,414 @@
+# load_test.py
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+import config
+from config import CATEGORY_KEYWORDS, MTG_COLOR_ORDER
+
+# Test de charge : N sessions simultanées pilotent main.py sans navigateur (AppTest de Streamlit), chacune
+# dans un thread d'un même processus, comme les sessions d'une seule instance du serveur : elles se disputent
+# les caches st.cache_data / st.cache_resource, le pool des travaux de construction et les requêtes Scryfall
+# partagées, ainsi que les points de reprise et la base binaire sur disque.
+# Chaque session téléverse un inventaire, cherche les commandants, construit puis reconstruit un deck,
+# contre un Scryfall local qui sert un catalogue synthétique (aucune requête vers le vrai Scryfall).
+# Rapport : débit, latences p50/p95/p99 par action et pic de mémoire résidente (RSS) de l'instance.
+#
+#   python load_test.py --sessions 8 --rounds 2 --inventory-size 600 --json avant.json
+
+MAIN_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+LOAD_TEST_SET_CODE = 'LDT'
+SESSION_ACTIONS = ('open', 'upload', 'strategy', 'search', 'build', 'rebuild')
+SUBTYPES = ['Elf', 'Goblin', 'Zombie', 'Dragon', 'Angel', 'Human', 'Wizard', 'Vampire', 'Warrior', 'Cat']
+# Stratégies choisies par les sessions (nom affiché -> catégorie de CATEGORY_KEYWORDS)
+LOAD_TEST_STRATEGIES = {'Token': 'token', 'Ramp': 'ramp', 'Aristocrats': 'aristocrats', 'Reanimator': 'reanimator',
+                        'Voltron': 'voltron', '+1/+1 Counters': 'counters_matter', 'Tribal': 'tribal'}
+
+# --- Catalogue synthétique ---
+
+def _get_strategy_phrase(strategy, rng):
+    # La stratégie tribale n'a pas de mots-clés : un commandant tribal cite une tribu (voir build_subtype_index)
+    if strategy == 'tribal':
+        return f"Other {rng.choice(SUBTYPES)} creatures you control get +1/+1"
+    return rng.choice(CATEGORY_KEYWORDS[strategy])
+
+def generate_card_catalog(card_count, seed=0):
+    """
+    Génère un catalogue de cartes au format Scryfall : un commandant légendaire sur 12 (dont quelques Partner),
+    un terrain sur 6, et des sorts dont le texte reprend des mots-clés de CATEGORY_KEYWORDS.
+    Chaque commandant porte les mots-clés de deux stratégies de LOAD_TEST_STRATEGIES, pour que toute session en trouve.
+    """
+    rng = random.Random(seed)
+    keyword_phrases = [keyword for keywords in CATEGORY_KEYWORDS.values() for keyword in keywords]
+    catalog = []
+    for number in range(1, card_count + 1):
+        color_identity = sorted(rng.sample(MTG_COLOR_ORDER, rng.choice([0, 1, 1, 2, 2, 3])), key=MTG_COLOR_ORDER.index)
+        keywords = []
+        produced_mana = []
+        if number % 6 == 0:
+            type_line = 'Land'
+            color_identity = color_identity[:2]
+            produced_mana = color_identity or ['C']
+            oracle_text = ' '.join(f"{{T}}: Add {{{color}}}." for color in produced_mana)
+            mana_value = 0
+        else:
+            is_commander = number % 12 == 1
+            kind = 'Creature' if is_commander else rng.choice(['Creature', 'Creature', 'Instant', 'Sorcery', 'Artifact', 'Enchantment'])
+            type_line = ('Legendary ' if is_commander else '') + kind
+            if kind == 'Creature':
+                type_line += f" — {rng.choice(SUBTYPES)} {rng.choice(SUBTYPES)}"
+            phrases = rng.sample(keyword_phrases, 3)
+            if is_commander:
+                phrases += [_get_strategy_phrase(strategy, rng) for strategy in rng.sample(list(LOAD_TEST_STRATEGIES.values()), 2)]
+            oracle_text = '. '.join(phrases) + '.'
+            if is_commander and number % 36 == 1:
+                keywords.append('Partner')
+                oracle_text += '\nPartner'
+            mana_value = rng.randint(1, 7)
+        catalog.append({
+            'object': 'card',
+            'name': f"Load Test Card {number}",
+            'set': LOAD_TEST_SET_CODE.lower(),
+            'collector_number': str(number),
+            'type_line': type_line,
+            'oracle_text': oracle_text,
+            'mana_cost': ''.join(f"{{{color}}}" for color in color_identity) + (f"{{{mana_value - len(color_identity)}}}" if mana_value > len(color_identity) else ''),
+            'cmc': float(mana_value),
+            'colors': [] if type_line == 'Land' else color_identity,
+            'color_identity': color_identity,
+            'keywords': keywords,
+            'produced_mana': produced_mana,
+            'rarity': rng.choice(['common', 'uncommon', 'rare', 'mythic']),
+            'legalities': {'commander': 'legal'},
+            'edhrec_rank': rng.randint(1, 30000),
+            'prices': {'usd': f"{rng.uniform(0.1, 20):.2f}"},
+        })
+    return catalog
+
+def make_inventory_text(catalog, card_count, rng):
+    """Inventaire ManaBox (.txt) de `card_count` cartes tirées du catalogue."""
+    cards = rng.sample(catalog, min(card_count, len(catalog)))
+    return '\n'.join(f"1 {card['name']} ({LOAD_TEST_SET_CODE}) {card['collector_number']}" for card in cards)
+
+# --- Scryfall local ---
+
+def start_scryfall_stand_in(catalog, latency=0.0):
+    """
+    Démarre un serveur HTTP local qui répond comme Scryfall à /cards/named et /cards/collection
+    (après `latency` secondes par requête). Retourne (serveur, URL racine de l'API).
+    """
+    cards_by_name = {card['name']: card for card in catalog}
+    cards_by_print = {(card['set'].upper(), card['collector_number']): card for card in catalog}
+
+    class ScryfallStandInHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, data):
+            body = json.dumps(data).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            time.sleep(latency)
+            url = urlparse(self.path)
+            card = cards_by_name.get(parse_qs(url.query).get('exact', [''])[0]) if url.path == '/cards/named' else None
+            if card is None:
+                self._send_json(404, {'object': 'error', 'status': 404})
+            else:
+                self._send_json(200, card)
+
+        def do_POST(self):
+            time.sleep(latency)
+            if self.path != '/cards/collection':
+                self._send_json(404, {'object': 'error', 'status': 404})
+                return
+            identifiers = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0)))).get('identifiers', [])
+            found_cards, not_found = [], []
+            for identifier in identifiers:
+                card = cards_by_print.get((str(identifier.get('set', '')).upper(), str(identifier.get('collector_number', ''))))
+                if card is None:
+                    not_found.append(identifier)
+                else:
+                    found_cards.append(card)
+            self._send_json(200, {'object': 'list', 'data': found_cards, 'not_found': not_found})
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ScryfallStandInHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="scryfall-stand-in").start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+# --- Sessions ---
+
+def _get_button(app_test, label):
+    return next(button for button in app_test.button if button.label == label)
+
+def run_session(session_index, round_index, inventory_text, strategy_display_name, timeout, record):
+    """
+    Déroule le parcours d'un utilisateur ; `record(action, secondes, erreur)` reçoit la durée de chaque étape.
+    Une étape en erreur (exception de l'application ou élément attendu absent) interrompt la session.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    app_test = AppTest.from_file(MAIN_SCRIPT_PATH, default_timeout=timeout)
+    steps = (
+        ('open', lambda: app_test.run()),
+        ('upload', lambda: app_test.file_uploader(key="file_uploader").set_value(
+            [(f"session_{session_index}_{round_index}.txt", inventory_text.encode('utf-8'), "text/plain")]).run()),
+        ('strategy', lambda: app_test.selectbox(key="strategy_selectbox_key").set_value(strategy_display_name).run()),
+        ('search', lambda: _run_until_job_done(_get_button(app_test, "Trouver les commandants").click().run(),
+                                               'commander_search_job_id', timeout)),
+        ('build', lambda: _run_until_job_done(_select_first_commander(app_test).run(), 'deck_job_id', timeout)),
+        ('rebuild', lambda: _get_button(app_test, "♻️ Reconstruire le deck").click().run()),
+    )
+    for action, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+            error = str(app_test.exception[0].value) if app_test.exception else None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        record(action, time.perf_counter() - start, error)
+        if error:
+            return False
+    return True
+
+def _run_until_job_done(app_test, job_id_key, timeout):
+    """
+    Attend la fin du travail en arrière-plan lancé par l'étape (voir build_jobs), puis réexécute la page
+    pour en reprendre le résultat, comme le fait le suivi périodique de l'interface.
+    """
+    from build_jobs import get_job
+
+    job = get_job(app_test.session_state[job_id_key]) if job_id_key in app_test.session_state and app_test.session_state[job_id_key] else None
+    if job is not None and not job['done_event'].wait(timeout):
+        raise TimeoutError(f"travail {job_id_key} non terminé après {timeout} s")
+    return app_test.run()
+
+COMMANDER_TABLE_KEY_PREFIX = "commander_table_" # Voir display_commander_table : les autres tableaux n'ont pas cette clé
+
+def _select_first_commander(app_test):
+    """Sélectionne la première ligne du tableau des commandants (ce qui lance la construction du deck)."""
+    table_key = next((dataframe.key for dataframe in app_test.dataframe
+                      if dataframe.key and dataframe.key.startswith(COMMANDER_TABLE_KEY_PREFIX)), None)
+    if table_key is None:
+        raise LookupError("aucun commandant trouvé pour cet inventaire")
+    app_test.session_state[table_key] = {"selection": {"rows": [0], "columns": [], "cells": []}}
+    return app_test
+
+# --- Rapport ---
+
+def get_peak_rss_bytes():
+    """Pic de mémoire résidente du processus (None si indisponible, ex: Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024 # Octets sur macOS, kilo-octets sur Linux
+
+def summarize_durations(durations_by_action, errors_by_action, elapsed_seconds):
+    """Nombre, erreurs, débit (par seconde) et latences p50/p95/p99 (secondes) de chaque action."""
+    summary = {}
+    for action in SESSION_ACTIONS:
+        durations = durations_by_action.get(action, [])
+        if not durations:
+            continue
+        p50, p95, p99 = np.percentile(durations, [50, 95, 99]).tolist()
+        summary[action] = {
+            'count': len(durations),
+            'errors': errors_by_action.get(action, 0),
+            'throughput_per_second': len(durations) / elapsed_seconds if elapsed_seconds else 0.0,
+            'p50': p50, 'p95': p95, 'p99': p99, 'max': max(durations),
+        }
+    return summary
+
+def share_app_test_runtime():
+    """
+    Prépare AppTest pour des sessions en parallèle dans un même processus. Chaque exécution pose un runtime
+    simulé global (Runtime._instance) et l'efface à la fin, ce qui le retirerait aux autres sessions en cours :
+    le dernier posé est conservé. L'option global.appTest est fixée une fois pour toutes pour la même raison.
+    Comme sur un serveur, le script n'est compilé qu'une fois (cache de bytecode commun) : AppTest le recompile
+    à chaque exécution, et des compilations simultanées échouent sur certaines versions de CPython.
+    """
+    from streamlit import config as streamlit_config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    class SharedRuntimeSlot(type(Runtime)):
+        def __setattr__(cls, name, value):
+            if name != '_instance':
+                super().__setattr__(name, value)
+            elif value is not None:
+                Runtime._instance = value
+
+    app_test.Runtime = SharedRuntimeSlot('Runtime', (Runtime,), {})
+    shared_script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: shared_script_cache
+    streamlit_config.set_option('global.appTest', True)
+
+def run_load_test(sessions=4, rounds=1, inventory_size=400, catalog_size=1500, shared_inventory=False,
+                  scryfall_latency=0.05, rate_limit_delay=None, timeout=300, seed=0):
+    """
+    Lance `sessions` sessions simultanées, chacune répétant `rounds` fois le parcours complet.
+    Les sessions sont des threads du processus courant, qui joue le rôle d'une instance de l'application :
+    caches, travaux en arrière-plan et mémoire sont ceux de cette instance. Le dossier de travail (points de
+    reprise Scryfall, base binaire) est temporaire : les fichiers de l'utilisateur ne sont pas touchés.
+    Les inventaires sont tirés au hasard par session (ou identiques si `shared_inventory`, pour mesurer
+    le comportement quand les caches sont chauds).
+    Retourne le rapport (dictionnaire sérialisable en JSON).
+    """
+    catalog = generate_card_catalog(catalog_size, seed)
+    server, api_url = start_scryfall_stand_in(catalog, scryfall_latency)
+
+    rng = random.Random(seed)
+    shared_inventory_text = make_inventory_text(catalog, inventory_size, rng) if shared_inventory else None
+    session_plans = [
+        [(shared_inventory_text or make_inventory_text(catalog, inventory_size, rng), rng.choice(list(LOAD_TEST_STRATEGIES)))
+         for _ in range(rounds)]
+        for _ in range(sessions)
+    ]
+
+    # L'instance pointe vers le Scryfall local ; les modules sont importés avant le départ pour ne pas compter le démarrage
+    config.MANA_SYMBOLS_PATH = os.path.join(os.path.dirname(MAIN_SCRIPT_PATH), config.MANA_SYMBOLS_PATH)
+    config.METRICS_PORT = 0 # Pas de serveur de mesures pendant le test
+    import scryfall_api
+    from metrics import get_metrics_snapshot
+    scryfall_api.SCRYFALL_NAMED_URL = f"{api_url}/cards/named"
+    scryfall_api.SCRYFALL_COLLECTION_URL = f"{api_url}/cards/collection"
+    if rate_limit_delay is not None:
+        scryfall_api.SCRYFALL_RATE_LIMIT_DELAY = rate_limit_delay
+    share_app_test_runtime()
+    from streamlit import logger as streamlit_logger
+    streamlit_logger.set_log_level('error') # Sans les avertissements propres à AppTest et aux threads hors session
+
+    records = []
+    records_lock = threading.Lock()
+    def record(action, seconds, error):
+        with records_lock:
+            records.append((action, seconds, error))
+
+    completed_by_session = [0] * sessions
+    start_barrier = threading.Barrier(sessions + 1)
+    def run_session_thread(session_index):
+        start_barrier.wait()
+        for round_index, (inventory_text, strategy_display_name) in enumerate(session_plans[session_index]):
+            completed_by_session[session_index] += run_session(session_index, round_index, inventory_text,
+                                                               strategy_display_name, timeout, record)
+
+    previous_directory = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="autodeck_load_test_") as working_directory:
+        os.chdir(working_directory)
+        threads = [threading.Thread(target=run_session_thread, args=(session_index,), daemon=True,
+                                    name=f"load-test-session-{session_index}")
+                   for session_index in range(sessions)]
+        try:
+            for thread in threads:
+                thread.start()
+            baseline_rss_bytes = get_peak_rss_bytes()
+            start_barrier.wait()
+            start = time.perf_counter()
+            deadline = time.monotonic() + timeout * len(SESSION_ACTIONS) * rounds
+            for thread in threads:
+                thread.join(max(0.0, deadline - time.monotonic()))
+            elapsed_seconds = time.perf_counter() - start
+        finally:
+            os.chdir(previous_directory)
+            server.shutdown()
+    counter_values = get_metrics_snapshot()['counters']
+
+    durations_by_action = {}
+    errors_by_action = {}
+    first_errors = []
+    with records_lock:
+        session_records = list(records)
+    for action, seconds, error in session_records:
+        durations_by_action.setdefault(action, []).append(seconds)
+        if error:
+            errors_by_action[action] = errors_by_action.get(action, 0) + 1
+            if len(first_errors) < 5:
+                first_errors.append(f"{action}: {error}")
+    counters = {}
+    for counter in counter_values:
+        series_key = (counter['name'], counter['labels'].get('function'))
+        counters[series_key] = counters.get(series_key, 0) + counter['value']
+
+    cache_hit_rates = {function_name: max(0.0, (calls - counters.get(('cache_misses_total', function_name), 0)) / calls)
+                       for (name, function_name), calls in counters.items() if name == 'cache_calls_total' and calls}
+    completed_journeys = sum(completed_by_session)
+    return {
+        'parameters': {'sessions': sessions, 'rounds': rounds, 'inventory_size': inventory_size, 'catalog_size': catalog_size,
+                       'shared_inventory': shared_inventory, 'scryfall_latency': scryfall_latency,
+                       'rate_limit_delay': rate_limit_delay},
+        'elapsed_seconds': elapsed_seconds,
+        'completed_journeys': completed_journeys,
+        'journeys_per_minute': 60 * completed_journeys / elapsed_seconds if elapsed_seconds else 0.0,
+        'actions': summarize_durations(durations_by_action, errors_by_action, elapsed_seconds),
+        'baseline_rss_bytes': baseline_rss_bytes,
+        'peak_rss_bytes': get_peak_rss_bytes(),
+        'scryfall_requests': counters.get(('scryfall_requests_total', None), 0),
+        'scryfall_coalesced': counters.get(('scryfall_coalesced_total', None), 0),
+        'cache_hit_rates': cache_hit_rates,
+        'first_errors': first_errors,
+    }
+
+def format_report(report):
+    """Rapport lisible du test de charge."""
+    parameters = report['parameters']
+    lines = [
+        f"Sessions simultanées : {parameters['sessions']} x {parameters['rounds']} parcours "
+        f"(inventaires de {parameters['inventory_size']} cartes{', identiques' if parameters['shared_inventory'] else ''})",
+        f"Durée : {report['elapsed_seconds']:.1f} s — {report['completed_journeys']} parcours complets "
+        f"({report['journeys_per_minute']:.1f} / min)",
+        "",
+        f"{'Action':<10} {'Nb':>5} {'Err':>4} {'Débit/s':>8} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8} {'max (s)':>8}",
+    ]
+    for action, stats in report['actions'].items():
+        lines.append(f"{action:<10} {stats['count']:>5} {stats['errors']:>4} {stats['throughput_per_second']:>8.2f} "
+                     f"{stats['p50']:>8.3f} {stats['p95']:>8.3f} {stats['p99']:>8.3f} {stats['max']:>8.3f}")
+    lines.append("")
+    if report['peak_rss_bytes'] is not None:
+        lines.append(f"Pic RSS de l'instance : {report['peak_rss_bytes'] / 2**20:.0f} Mo "
+                     f"({report['baseline_rss_bytes'] / 2**20:.0f} Mo avant les sessions)")
+    lines.append(f"Requêtes Scryfall (serveur local) : {report['scryfall_requests']} "
+                 f"({report['scryfall_coalesced']} cartes servies par une requête déjà en cours)")
+    for function_name, hit_rate in sorted(report['cache_hit_rates'].items()):
+        lines.append(f"Taux de succès du cache {function_name} : {hit_rate:.0%}")
+    for error in report['first_errors']:
+        lines.append(f"Erreur : {error}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test de charge de l'application avec des sessions simultanées.")
+    parser.add_argument('--sessions', type=int, default=4, help="Nombre de sessions simultanées")
+    parser.add_argument('--rounds', type=int, default=1, help="Parcours complets par session")
+    parser.add_argument('--inventory-size', type=int, default=400, help="Cartes par inventaire téléversé")
+    parser.add_argument('--catalog-size', type=int, default=1500, help="Cartes du catalogue servi par le Scryfall local")
+    parser.add_argument('--shared-inventory', action='store_true', help="Même inventaire pour toutes les sessions (caches chauds)")
+    parser.add_argument('--scryfall-latency', type=float, default=0.05, help="Latence simulée (s) de chaque requête Scryfall")
+    parser.add_argument('--rate-limit-delay', type=float, default=None, help="Remplace SCRYFALL_RATE_LIMIT_DELAY (s)")
+    parser.add_argument('--timeout', type=float, default=300, help="Délai maximal (s) d'une étape")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', dest='json_path', help="Écrit aussi le rapport en JSON (pour comparer des configurations)")
+    args = parser.parse_args()
+
+    load_test_report = run_load_test(args.sessions, args.rounds, args.inventory_size, args.catalog_size, args.shared_inventory,
+                                     args.scryfall_latency, args.rate_limit_delay, args.timeout, args.seed)
+    print(format_report(load_test_report))
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(load_test_report, f, indent=2)
@@ -1,18 +1,26 @@
 # main.py
 
+import importlib
 import os
-import pyperclip
+import sys
+import threading
+import time
 import streamlit as st
-import matplotlib.pyplot as plt
 from collections import Counter
-import re
-import base64
 
 from inventory_manager import get_inventory
-from card_classifier import identify_commanders_in_inventory
-from deck_builder import build_commander_deck
-from scryfall_api import get_card_details_scryfall, get_color_identity, _get_cache_key
-from config import COLOR_MAP, CATEGORY_KEYWORDS, TARGET_DECK_SIZE, MTG_COLOR_ORDER, SCRYFALL_CACHE_FILE, MANA_SYMBOLS_PATH
+from charts import display_bar_chart
+from deck_report import compute_deck_hash, build_deck_report, format_deck_list
+from metrics import start_metrics_server, timed
+from ui_assets import get_mana_symbol_html, get_clipboard_copy, start_clipboard_detection
+from config import COLOR_MAP, TARGET_DECK_SIZE, MTG_COLOR_ORDER, SCRYFALL_CACHE_FILE, CARD_DATABASE_FILE, COMMANDERS_PAGE_SIZE, INVENTORY_SEARCH_RESULTS_LIMIT, METRICS_HOST, METRICS_PORT, BEST_OF_N_CANDIDATES, BUILD_JOB_POLL_SECONDS
+
+# Démarrage : le premier affichage (page de téléversement) n'a besoin que des modules légers ci-dessus.
+# Les modules qui chargent numpy et requests sont importés à leur première utilisation, dans les fonctions
+# qui s'en servent, et préchargés en arrière-plan une fois la première page affichée (voir warm_up_app_modules).
+DEFERRED_APP_MODULES = ('scryfall_api', 'card_classifier', 'commander_browser', 'card_search', 'deck_builder', 'build_jobs',
+                        'deck_validator', 'upgrade_suggestions', 'collection_analytics')
+APP_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
 
 COLOR_EMOJI_MAP = {
     'W': '⚪', 'U': '🔵', 'B': '⚫', 'R': '🔴', 'G': '🟢', 'C': '🟣'
@@ -43,38 +51,25 @@ STRATEGY_DESCRIPTIONS = {
     'theft': "Se concentre sur le vol des permanents ou des cartes de vos adversaires pour les utiliser contre eux, affaiblissant leur position tout en renforçant la vôtre."
 }
 
-try:
-    pyperclip.copy('')
-    CLIPBOARD_AVAILABLE = True
-except pyperclip.PyperclipException:
-    CLIPBOARD_AVAILABLE = False
-
-# Fonction pour charger et afficher les symboles de mana SVG
-@st.cache_data
-def get_mana_svg_html(symbol, size_px=20):
-    filepath = os.path.join(MANA_SYMBOLS_PATH, f"{symbol.upper()}.svg")
-    try:
-        with open(filepath, "rb") as f:
-            svg_content = f.read()
-        encoded_svg = base64.b64encode(svg_content).decode('utf-8')
-        return f'<img src="data:image/svg+xml;base64,{encoded_svg}" width="{size_px}" height="{size_px}" style="vertical-align: middle; margin: 0 1px;">'
-    except FileNotFoundError:
-        return f"({symbol})" # Fallback si le fichier n'est pas trouvé
-    except Exception as e:
-        return f"({symbol} ERR)"
-
-# Dictionnaire de mappage des symboles de couleur MTG vers leurs HTML SVG
-MANA_SYMBOL_HTML_MAP = {
-    'W': get_mana_svg_html('W'),
-    'U': get_mana_svg_html('U'),
-    'B': get_mana_svg_html('B'),
-    'R': get_mana_svg_html('R'),
-    'G': get_mana_svg_html('G'),
-    'C': get_mana_svg_html('C')
-}
+def _import_deferred_app_modules():
+    # Une fois par processus : l'entrée que Streamlit ajoute le temps d'une exécution du script
+    # peut être retirée pendant ces imports (c'est le cas avec AppTest)
+    sys.path.append(APP_DIRECTORY)
+    for module_name in DEFERRED_APP_MODULES:
+        importlib.import_module(module_name)
+
+@st.cache_resource
+def warm_up_app_modules():
+    """Importe DEFERRED_APP_MODULES dans un thread, une fois par processus, pour que le téléversement n'attende pas."""
+    thread = threading.Thread(target=_import_deferred_app_modules, daemon=True, name="app-modules-warm-up")
+    thread.start()
+    return thread
 
 
 def clear_cache_main():
+    from scryfall_api import clear_resolved_cards_store
+    from card_classifier import clear_inventory_prefetch
+
     if os.path.exists(SCRYFALL_CACHE_FILE):
         try:
             os.remove(SCRYFALL_CACHE_FILE)
@@ -84,6 +79,21 @@ def clear_cache_main():
     else:
         st.info(f"Cache Scryfall '{SCRYFALL_CACHE_FILE}' non trouvé, rien à vider.")
     
+    if os.path.exists(CARD_DATABASE_FILE):
+        # Les cartes importées en masse (python card_database.py) sont gardées, seules celles des inventaires partent
+        from card_database import remove_resolved_cards
+        try:
+            kept_card_count = remove_resolved_cards()
+            if kept_card_count:
+                st.success(f"🗑️ Base de cartes '{CARD_DATABASE_FILE}' vidée des cartes des inventaires "
+                           f"({kept_card_count} cartes des données en masse gardées).")
+            else:
+                st.success(f"🗑️ Base de cartes '{CARD_DATABASE_FILE}' supprimée.")
+        except OSError as e:
+            st.error(f"❌ Erreur lors de la suppression de la base de cartes : {e}")
+
+    clear_resolved_cards_store()
+    clear_inventory_prefetch()
     st.cache_data.clear()
     for key in st.session_state.keys():
         del st.session_state[key]
@@ -97,22 +107,738 @@ def display_cmc_chart(mana_curve_spells_cmc, commandant_name):
         cmc_labels = list(range(max_cmc + 1))
         cmc_values = [cmc_counts.get(cmc, 0) for cmc in cmc_labels]
 
-        fig, ax = plt.subplots(figsize=(10, 6))
-        ax.bar(cmc_labels, cmc_values, color='skyblue')
-        ax.set_xlabel('Coût Converti de Mana (CMC)')
-        ax.set_ylabel('Nombre de cartes')
-        ax.set_title(f'Courbe de Mana du Deck ({commandant_name})')
-        ax.set_xticks(cmc_labels)
-        ax.grid(axis='y', linestyle='--', alpha=0.7)
-        plt.tight_layout()
-        
-        st.pyplot(fig)
-        plt.close(fig)
+        display_bar_chart(cmc_labels, cmc_values, f'Courbe de Mana du Deck ({commandant_name})',
+                          'Coût Converti de Mana (CMC)', 'Nombre de cartes')
     else:
         st.info("📊 Pas assez de sorts pour générer la courbe de mana.")
 
+# --- Sections de l'interface ---
+# Chaque section est un fragment Streamlit : une interaction dans une section ne réexécute que celle-ci.
+# Une action qui change les données des autres sections (recherche, construction) déclenche st.rerun().
+
+def store_generated_deck(deck_state):
+    """Mémorise l'état du deck construit et les données affichées par l'aperçu et le rapport."""
+    st.session_state.generated_deck_state = deck_state
+    st.session_state.generated_deck_details = deck_state['deck_full_details']
+    st.session_state.generated_mana_curve = deck_state['mana_curve_spells_cmc']
+    st.session_state.generated_deck_category_counts = deck_state['deck_category_counts']
+    st.session_state.generated_synergy_cards_info = deck_state['synergy_cards_info']
+    st.session_state.generated_deck_hash = compute_deck_hash(deck_state['deck_full_details'], deck_state['pool']['strategy'])
+
+def on_find_commanders_click():
+    from build_jobs import submit_commander_search, cancel_job
+
+    st.session_state.commanders_searched = True
+    # L'inventaire est déjà chargé si inventaire_loaded est True
+    # st.session_state.inventaire = get_inventory() # Pas besoin de re-l'appeler ici
+
+    st.session_state.deck_generated = False
+    st.session_state.selected_commander_name = None
+    st.session_state.last_selected_commander_name = None
+    st.session_state.commanders_data = None
+    st.session_state.commander_table = None
+    st.session_state.commander_pairs_table = None
+    st.session_state.generated_deck_state = None
+    st.session_state.generated_deck_details = None
+    st.session_state.generated_mana_curve = None
+    st.session_state.generated_deck_category_counts = Counter()
+    st.session_state.generated_synergy_cards_info = []
+    st.session_state.multi_decks = []
+
+    # Analyse des commandants et des paires pour toutes les stratégies, en arrière-plan ; une recherche
+    # ou une construction encore en cours est annulée (voir display_job_status)
+    cancel_job(st.session_state.commander_search_job_id)
+    cancel_job(st.session_state.deck_job_id)
+    st.session_state.deck_job_id = None
+    st.session_state.commander_analysis = None
+    st.session_state.commander_search_job_id = submit_commander_search(st.session_state.inventaire)
+
+def on_commander_search_done(search_result):
+    st.session_state.commander_analysis = {
+        'inventory_key': st.session_state.inventory_key,
+        'commanders': search_result['commanders'],
+        'pairs': search_result['pairs'],
+    }
+    # Classement selon les préférences
+    rank_commander_tables()
+
+def on_deck_build_done(deck_state):
+    store_generated_deck(deck_state)
+    st.session_state.deck_generated = True
+    # Nouveau pool : les verrous et exclusions du deck précédent ne s'appliquent plus
+    st.session_state.deck_pinned_keys = []
+    st.session_state.deck_excluded_keys = []
+    st.session_state.deck_rebuild_message = None
+
+def start_deck_build(commander_members):
+    """Sélectionne le commandant (ou la paire) et lance la construction de son deck en arrière-plan."""
+    from build_jobs import submit_deck_build, cancel_job
+
+    commander_name = " + ".join(commander_members)
+    st.session_state.selected_commander_name = commander_name
+    st.session_state.last_selected_commander_name = commander_name
+    st.session_state.deck_generated = False
+
+    # Construction en arrière-plan ; celle d'un commandant choisi précédemment est annulée
+    cancel_job(st.session_state.deck_job_id)
+    st.session_state.deck_job_id = submit_deck_build(
+        commander_members[0],
+        st.session_state.inventaire,
+        st.session_state.preferences,
+        partner_name=commander_members[1] if len(commander_members) > 1 else None,
+        candidate_count=BEST_OF_N_CANDIDATES if st.session_state.get("best_of_n_build") else 1
+    )
+
+def get_commander_preferences_signature():
+    return (st.session_state.preferences.get('strategy'), tuple(st.session_state.preferences.get('colors', [])),
+            st.session_state.preferences.get('tribe'))
+
+def rank_commander_tables():
+    """
+    (Re)classe les commandants et les paires à partir de l'analyse mémorisée, selon les préférences actuelles.
+    Aucune carte n'est relue : changer de stratégie ou de couleurs après une première recherche est immédiat.
+    """
+    from card_classifier import rank_commanders
+    from commander_browser import build_commander_table
+
+    commander_analysis = st.session_state.commander_analysis
+    with timed('build_phase_seconds', phase='commander_rank'):
+        st.session_state.commanders_data = rank_commanders(commander_analysis['commanders'], st.session_state.preferences)
+        st.session_state.commander_table = build_commander_table(st.session_state.commanders_data)
+        st.session_state.commander_pairs_table = build_commander_table(
+            rank_commanders(commander_analysis['pairs'], st.session_state.preferences)
+        )
+    st.session_state.commander_page = 1
+    st.session_state.pair_page = 1
+    st.session_state.commanders_strategy = st.session_state.preferences.get('strategy')
+    st.session_state.commanders_preferences = get_commander_preferences_signature()
+
+@st.fragment(run_every=BUILD_JOB_POLL_SECONDS)
+def poll_job_status(job_id, title):
+    # État d'un travail en cours, relu périodiquement : progression et résultats des phases déjà terminées
+    from build_jobs import get_job, cancel_job, JOB_FINISHED_STATUSES
+
+    rendered_with_page = st.session_state.pop('job_status_with_page', False)
+    job = get_job(job_id)
+    if job is None or job['status'] in JOB_FINISHED_STATUSES:
+        if rendered_with_page:
+            # Terminé depuis la lecture de display_job_status : relancer la page ici perdrait
+            # les actions de cette exécution (clic de bouton), le prochain rafraîchissement s'en charge
+            st.caption(f"✅ {title} : terminé.")
+            return
+        st.rerun() # Le résultat est repris par display_job_status, lors de la réexécution complète
+    st.markdown(f"**{title}**")
+    for phase in job['phases']:
+        st.write(f"✅ {phase['summary']} ({phase['seconds']:.1f} s)")
+    st.progress(job['progress'], text=f"⏳ {job['phase_text']}")
+    if st.button("Annuler", key=f"cancel_job_{job_id}"):
+        cancel_job(job_id)
+    st.caption(f"Travail {job_id[:8]}")
+
+def display_job_status(job_id_key, title, on_done):
+    """
+    Affiche le travail dont l'identifiant est dans st.session_state[job_id_key] : suivi tant qu'il tourne,
+    puis `on_done(résultat)` une seule fois quand il se termine avec succès.
+    """
+    from build_jobs import get_job
+
+    job_id = st.session_state[job_id_key]
+    job = get_job(job_id) if job_id else None
+    if job is None:
+        st.session_state[job_id_key] = None
+    elif job['status'] == 'done':
+        st.session_state[job_id_key] = None
+        on_done(job['result'])
+    elif job['status'] == 'error':
+        st.error(f"❌ {title} : échec — {job['error']}")
+    elif job['status'] == 'cancelled':
+        st.caption(f"⏹️ {title} : annulé.")
+    else:
+        st.session_state.job_status_with_page = True
+        poll_job_status(job_id, title)
+
+@st.fragment(run_every=1)
+def poll_prefetch_status(inventory_key):
+    # Progression du préchargement en cours, rafraîchie chaque seconde sans réexécuter la page
+    from card_classifier import get_inventory_prefetch
+
+    rendered_with_page = st.session_state.pop('prefetch_status_with_page', False)
+    job = get_inventory_prefetch(inventory_key)
+    if job is None or job['status'] != 'running':
+        if rendered_with_page:
+            # Terminé depuis la lecture de display_prefetch_status : relancer la page ici perdrait
+            # les actions de cette exécution (clic de bouton), le prochain rafraîchissement s'en charge
+            st.caption("✅ Préchargement terminé.")
+            return
+        st.rerun() # display_prefetch_status affiche alors le bilan, sans plus relire
+    st.progress(job['progress'], text=f"⏳ {job['phase_text']} Vous pouvez choisir vos préférences pendant ce temps.")
+
+def display_prefetch_status():
+    # Préchargement lancé au téléversement : suivi périodique tant qu'il tourne, puis bilan statique
+    from card_classifier import get_inventory_prefetch
+
+    job = get_inventory_prefetch(st.session_state.inventory_key)
+    if job is None:
+        return
+    if job['status'] == 'running':
+        st.session_state.prefetch_status_with_page = True
+        poll_prefetch_status(st.session_state.inventory_key)
+    elif job['status'] == 'error':
+        st.caption("⚠️ Le préchargement a échoué : les cartes seront récupérées lors de la recherche de commandants.")
+    else:
+        st.caption(f"✅ {len(job['classified_rows'])} cartes déjà récupérées et analysées : la recherche de commandants sera immédiate.")
+
+def display_collection_dashboard():
+    # Vue d'ensemble de la collection, calculée une fois par inventaire sur la table déjà analysée (aucune requête)
+    from card_classifier import get_inventory_prefetch
+    from collection_analytics import (get_inventory_collection_analytics, get_mask_colors, ANALYTICS_CATEGORIES,
+                                      ANALYTICS_COLORS, ANALYTICS_MAX_CMC, RARITIES)
+
+    job = get_inventory_prefetch(st.session_state.inventory_key)
+    if job is None or job['status'] != 'done':
+        return
+    with st.expander("📈 Vue d'ensemble de votre collection"):
+        analytics = get_inventory_collection_analytics(st.session_state.inventory_key, st.session_state.inventaire, job['classified_rows'])
+        st.markdown(f"**{analytics['card_count']}** cartes distinctes, **{analytics['copy_count']}** exemplaires.")
+        format_mask = lambda mask: ''.join(COLOR_EMOJI_MAP[c] for c in get_mask_colors(mask)) or COLOR_EMOJI_MAP['C']
+        masks = sorted((mask for mask in range(len(analytics['mask_cards'])) if analytics['mask_cards'][mask]),
+                       key=lambda mask: (-analytics['mask_cards'][mask], mask))
+
+        st.markdown("##### Identités couleur")
+        st.dataframe({
+            "Identité": [format_mask(mask) for mask in masks],
+            "Cartes": [int(analytics['mask_cards'][mask]) for mask in masks],
+            "Exemplaires": [int(analytics['mask_copies'][mask]) for mask in masks],
+            "Jouables dans cette identité": [int(analytics['playable_cards'][mask]) for mask in masks],
+            "Commandants potentiels": [int(analytics['legends_by_mask'][mask]) for mask in masks],
+        }, hide_index=True, use_container_width=True)
+
+        st.markdown("##### Courbe de mana des sorts par couleur")
+        curve_table = {"Couleur": [COLOR_EMOJI_MAP[color] for color in ANALYTICS_COLORS]}
+        for cmc in range(ANALYTICS_MAX_CMC + 1):
+            curve_table[f"{cmc}+" if cmc == ANALYTICS_MAX_CMC else str(cmc)] = analytics['curve_by_color'][:, cmc].tolist()
+        st.dataframe(curve_table, hide_index=True, use_container_width=True)
+
+        st.markdown("##### Catégories par identité couleur")
+        category_columns = [column for column, category in enumerate(ANALYTICS_CATEGORIES) if analytics['categories_by_mask'][:, column].any()]
+        category_table = {"Identité": [format_mask(mask) for mask in masks]}
+        for column in category_columns:
+            category_table[ANALYTICS_CATEGORIES[column].replace('_', ' ').title()] = analytics['categories_by_mask'][masks, column].tolist()
+        st.dataframe(category_table, hide_index=True, use_container_width=True)
+
+        st.markdown("##### Raretés et foils (exemplaires)")
+        rarity_rows = [index for index in range(len(RARITIES)) if analytics['rarity_foil_copies'][index].any()]
+        st.dataframe({
+            "Rareté": [RARITIES[index].capitalize() for index in rarity_rows],
+            "Non foil": [int(analytics['rarity_foil_copies'][index, 0]) for index in rarity_rows],
+            "Foil": [int(analytics['rarity_foil_copies'][index, 1]) for index in rarity_rows],
+        }, hide_index=True, use_container_width=True)
+
+def display_tribe_suggestions():
+    # Tribus dominantes de la collection (index des sous-types), dès que l'inventaire est analysé
+    from card_classifier import get_inventory_prefetch, get_inventory_subtype_index, get_dominant_tribes
+
+    job = get_inventory_prefetch(st.session_state.inventory_key)
+    if job is None or job['status'] != 'done':
+        st.caption("Les tribus dominantes de votre collection s'afficheront une fois l'inventaire analysé.")
+        st.session_state.preferences['tribe'] = None
+        return
+    subtype_index = get_inventory_subtype_index(st.session_state.inventory_key, st.session_state.inventaire, job['classified_rows'])
+    dominant_tribes = get_dominant_tribes(subtype_index, st.session_state.preferences.get('colors'))
+    if not dominant_tribes:
+        st.caption("Aucune créature avec un sous-type dans ces couleurs.")
+        st.session_state.preferences['tribe'] = None
+        return
+
+    tribe_labels = {subtype: f"{subtype} — {creature_count} créatures, {legend_count} légende(s) qui la citent"
+                    for subtype, creature_count, legend_count in dominant_tribes}
+    tribe_options = [None] + list(tribe_labels)
+    current_tribe = st.session_state.preferences.get('tribe')
+    chosen_tribe = st.selectbox(
+        "👥 Tribus dominantes de votre collection :", tribe_options,
+        index=tribe_options.index(current_tribe) if current_tribe in tribe_options else 0,
+        format_func=lambda subtype: "Selon le commandant (tribus citées dans son texte)" if subtype is None else tribe_labels[subtype],
+        key="tribe_selectbox_key"
+    )
+    st.session_state.preferences['tribe'] = chosen_tribe
+
+@st.fragment
+def display_preferences_section():
+    st.markdown("🎨 **Préférez-vous certaines couleurs ?** (Cochez pour sélectionner)")
+    selected_colors_list = []
+
+    all_color_symbols_to_display = MTG_COLOR_ORDER + ['C']
+
+    cols_color = st.columns(len(all_color_symbols_to_display))
+    for i, color_symbol in enumerate(all_color_symbols_to_display):
+        with cols_color[i]:
+            checkbox_state = st.session_state.selected_colors_checkbox.get(color_symbol, False)
+
+            st.markdown(get_mana_symbol_html(color_symbol), unsafe_allow_html=True)
+            label = f"{COLOR_MAP.get(color_symbol, 'Incolore')}"
+
+            if st.checkbox(label, value=checkbox_state, key=f"color_checkbox_{color_symbol}"):
+                selected_colors_list.append(color_symbol)
+                st.session_state.selected_colors_checkbox[color_symbol] = True
+            else:
+                st.session_state.selected_colors_checkbox[color_symbol] = False
+
+    if 'C' in selected_colors_list:
+        st.session_state.preferences['colors'] = ['C']
+        st.info("🌈 Préférence définie sur **Incolore** uniquement (précise si d'autres couleurs étaient sélectionnées).")
+    else:
+        st.session_state.preferences['colors'] = selected_colors_list
+        if selected_colors_list:
+            st.info(f"🌈 Couleurs préférées sélectionnées : **{', '.join([COLOR_MAP[c] for c in selected_colors_list])}**")
+        else:
+            st.info("🎨 Aucune couleur préférée sélectionnée. Le deck utilisera toutes les couleurs disponibles du commandant.")
+
+
+    st.subheader("🎯 Choisissez une stratégie pour votre deck")
+    strategies_dict = {
+        'Aggro': 'aggro', 'Contrôle': 'control', 'Combo': 'combo', 'Ramp': 'ramp', 
+        'Voltron': 'voltron', 'Token': 'token', 'Stax': 'stax', 'Mill': 'mill', 'Discard': 'discard',
+        'Aristocrats': 'aristocrats', 'Reanimator': 'reanimator', 'Spellslinger': 'spellslinger', 
+        'Enchantments Matter': 'enchantments_matter', 'Artifacts Matter': 'artifacts_matter', '+1/+1 Counters': 'counters_matter',
+        'Superfriends': 'superfriends', 'Tribal': 'tribal', 'Group Hug': 'group_hug', 'Group Slug': 'group_slug',
+        'Pillow Fort': 'pillow_fort', 'Theft': 'theft'
+    }
+    strategy_display_names = ["Aucune préférence (Deck 'amusant mais valide')"] + list(strategies_dict.keys())
+
+    strategy_selected_name = st.selectbox("Sélectionnez une stratégie :", strategy_display_names, 
+                                          index=strategy_display_names.index(st.session_state.preferences.get('strategy_display_name', strategy_display_names[0])),
+                                          key="strategy_selectbox_key")
+
+    chosen_strategy_key = None
+    if strategy_selected_name != "Aucune préférence (Deck 'amusant mais valide')":
+        chosen_strategy_key = strategies_dict[strategy_selected_name]
+        st.session_state.preferences['strategy'] = chosen_strategy_key
+        st.session_state.preferences['strategy_display_name'] = strategy_selected_name
+
+        st.info(f"✨ Stratégie préférée : **{chosen_strategy_key.capitalize()}**")
+        if chosen_strategy_key in STRATEGY_DESCRIPTIONS:
+            st.markdown(f"*{STRATEGY_DESCRIPTIONS[chosen_strategy_key]}*")
+        if chosen_strategy_key == 'tribal':
+            display_tribe_suggestions()
+        else:
+            st.session_state.preferences['tribe'] = None
+
+    else:
+        st.session_state.preferences['strategy'] = None
+        st.session_state.preferences['tribe'] = None
+        st.session_state.preferences['strategy_display_name'] = strategy_selected_name
+        st.info("🎲 Aucune stratégie spécifique choisie. Tentative de construction d'un deck 'amusant mais valide'.")
+
+    if st.button("Trouver les commandants"):
+        on_find_commanders_click()
+        st.rerun()
+    elif (st.session_state.commander_analysis
+          and st.session_state.commander_analysis['inventory_key'] == st.session_state.inventory_key
+          and st.session_state.commanders_preferences != get_commander_preferences_signature()):
+        # Après une première recherche, les tables suivent les préférences sans nouvelle analyse
+        rank_commander_tables()
+        st.rerun()
+
+def display_commander_table(commander_table, sort_by, key_prefix, rows_label):
+    """
+    Affiche les filtres, la pagination et la page visible d'une table de commandants (ou de paires).
+    Retourne les noms des commandants de la ligne sélectionnée, ou None.
+    """
+    from commander_browser import filter_commander_rows, get_page_count, get_page_rows
+
+    cols_filter = st.columns([0.40, 0.35, 0.25])
+    name_query = cols_filter[0].text_input("🔎 Filtrer par nom", key=f"{key_prefix}_name_filter")
+    filter_colors = cols_filter[1].multiselect(
+        "🎨 Identité couleur incluse dans", MTG_COLOR_ORDER,
+        format_func=lambda c: f"{COLOR_EMOJI_MAP[c]} {COLOR_MAP[c]}", key=f"{key_prefix}_color_filter"
+    )
+    min_score = cols_filter[2].number_input("Score total minimum", min_value=0, value=0, step=1, key=f"{key_prefix}_min_score")
+
+    # Filtrage sur l'ordre de tri précalculé : seules les lignes de la page visible sont rendues
+    visible_rows = filter_commander_rows(commander_table, sort_by, name_query, filter_colors, min_score)
+    page_count = get_page_count(len(visible_rows), COMMANDERS_PAGE_SIZE)
+    if st.session_state.get(f"{key_prefix}_page", 1) > page_count:
+        st.session_state[f"{key_prefix}_page"] = page_count
+    page_number = st.number_input(f"Page (sur {page_count}) — {len(visible_rows)} {rows_label}", min_value=1, max_value=page_count, step=1, key=f"{key_prefix}_page")
+    page_rows = get_page_rows(visible_rows, page_number, COMMANDERS_PAGE_SIZE)
+    first_rank = (page_number - 1) * COMMANDERS_PAGE_SIZE + 1
+
+    page_table = {
+        "#": list(range(first_rank, first_rank + len(page_rows))),
+        "Nom": [commander_table['names'][i] for i in page_rows],
+        "Couleurs": [''.join(COLOR_EMOJI_MAP[c] for c in commander_table['color_identities'][i]) or COLOR_EMOJI_MAP['C'] for i in page_rows],
+        "Score total": [commander_table['scores_total'][i] for i in page_rows],
+    }
+    if st.session_state.commanders_strategy:
+        page_table["Commandant"] = [commander_table['scores_cmd_bonus'][i] for i in page_rows]
+    page_table["Support"] = [commander_table['scores_support_cards'][i] for i in page_rows]
+    page_table["Synergie"] = [commander_table['scores_synergy'][i] for i in page_rows]
+
+    st.caption("Cliquez sur une ligne pour construire le deck correspondant.")
+    # La clé dépend des filtres et de la page : une sélection ne survit pas à un changement de vue
+    # (ni au choix d'un commandant hors des tables, voir display_similar_commanders)
+    table_event = st.dataframe(
+        page_table, hide_index=True, use_container_width=True,
+        on_select="rerun", selection_mode="single-row",
+        key=f"{key_prefix}_table_{sort_by}_{name_query}_{''.join(filter_colors)}_{min_score}_{page_number}"
+            f"_{st.session_state.get('commander_table_generation', 0)}"
+    )
+
+    if table_event.selection.rows:
+        return commander_table['members'][page_rows[table_event.selection.rows[0]]]
+    return None
+
+@st.fragment
+def display_commander_section():
+    from commander_browser import SORT_BY_TOTAL, SORT_BY_COMMANDER
+    from deck_builder import build_multiple_decks
+
+    if st.session_state.commanders_data:
+        st.subheader("👑 Commandants disponibles selon vos préférences")
+
+        if st.session_state.commanders_strategy:
+            st.markdown(f"*{get_mana_symbol_html('C')} Le score de pertinence indique à quel point un commandant est pertinent pour la stratégie '{st.session_state.commanders_strategy.capitalize()}', basé sur :*", unsafe_allow_html=True)
+            st.markdown(f"  *- Un bonus basé sur la présence de mots-clés stratégiques dans le texte du commandant (par ex. +10 par mot-clé).*", unsafe_allow_html=True)
+            st.markdown(f"  *- Plus 1 point pour chaque carte de support pertinente dans votre inventaire (dans ses couleurs).*", unsafe_allow_html=True)
+        else:
+            st.markdown(f"*{get_mana_symbol_html('C')} Le score de pertinence générale indique le nombre total de cartes compatibles dans votre inventaire pour ce commandant.*", unsafe_allow_html=True)
+        st.markdown(f"  *- Plus la synergie avec les cartes compatibles (mots-clés, types de créature et mana produit partagés), exprimée en cartes équivalentes.*", unsafe_allow_html=True)
+
+        sort_options = ["Par score de pertinence total (Commandant + Cartes de support)", "Par score de pertinence du commandant uniquement"]
+        if not st.session_state.commanders_strategy:
+            sort_options = ["Par score de pertinence total (Commandant + Cartes de support)"]
+            if st.session_state.sort_option_name not in sort_options:
+                st.session_state.sort_option_name = sort_options[0]
+
+        st.session_state.sort_option_name = st.radio(
+            "📊 Comment souhaitez-vous trier les commandants ?",
+            sort_options,
+            index=sort_options.index(st.session_state.sort_option_name),
+            key="sort_option_radio_key"
+        )
+
+        if st.session_state.sort_option_name == "Par score de pertinence total (Commandant + Cartes de support)":
+            sort_by = SORT_BY_TOTAL
+            st.info("Commandants triés par score de pertinence total.")
+        else:
+            sort_by = SORT_BY_COMMANDER
+            st.info("Commandants triés par score de pertinence du commandant.")
+
+        st.markdown("---")
+        st.markdown("### Choisissez votre commandant :")
+        st.checkbox(f"🎯 Construire {BEST_OF_N_CANDIDATES} decks candidats et garder le meilleur (courbe de mana, catégories, stratégie, base de mana)",
+                    key="best_of_n_build")
+
+        commander_table = st.session_state.commander_table
+        clicked_members = [display_commander_table(commander_table, sort_by, "commander", "commandants")]
+        if st.session_state.commander_pairs_table and st.session_state.commander_pairs_table['names']:
+            with st.expander(f"👥 Paires de commandants (Partner, Friends forever, Choose a Background...) — {len(st.session_state.commander_pairs_table['names'])} paires"):
+                st.markdown("Deux commandants qui peuvent diriger le même deck : l'identité couleur est l'union des leurs.")
+                clicked_members.append(display_commander_table(st.session_state.commander_pairs_table, sort_by, "pair", "paires"))
+
+        st.markdown("---")
+
+        # Première sélection qui diffère du deck déjà construit (commandant seul ou paire)
+        commandant_clicked_members = next(
+            (members for members in clicked_members
+             if members and " + ".join(members) != st.session_state.last_selected_commander_name),
+            None
+        )
+        commandant_clicked_name = " + ".join(commandant_clicked_members) if commandant_clicked_members else None
+
+        if commandant_clicked_name and commandant_clicked_name != st.session_state.last_selected_commander_name:
+            start_deck_build(commandant_clicked_members)
+            st.rerun() # Affiche le suivi de la construction, hors de ce fragment
+        elif st.session_state.selected_commander_name and not st.session_state.deck_generated and not st.session_state.deck_job_id:
+            st.info(f"Commandant sélectionné : **{st.session_state.selected_commander_name}**. Cliquez sur 'Trouver les commandants' si vous voulez le reconstruire ou ajuster les préférences.")
+
+        with st.expander("🧩 Construire plusieurs decks à partir du même inventaire"):
+            st.markdown("Les cartes sont réparties en une seule passe : aucune carte n'est utilisée plus de fois que vous ne la possédez, et une carte disputée va au deck où elle a le plus de synergie.")
+            multi_deck_names = st.multiselect("Commandants à construire :", commander_table['names'], key="multi_deck_commanders")
+            if st.button("Construire ces decks", disabled=len(multi_deck_names) < 2):
+                progress_bar_multi_build = st.progress(0, text="Initialisation de la construction des decks...")
+                st.session_state.multi_decks = build_multiple_decks(
+                    multi_deck_names, st.session_state.inventaire, st.session_state.preferences, progress_bar_multi_build
+                )
+                progress_bar_multi_build.empty()
+            for multi_deck_name, multi_deck_details, *_ in st.session_state.multi_decks:
+                st.markdown(f"**{multi_deck_name}** — {len(multi_deck_details)} cartes")
+                st.text_area(f"Deck de {multi_deck_name} :", "\n".join(format_deck_list(multi_deck_details)), height=200, key=f"multi_deck_{multi_deck_name}")
+    elif st.session_state.commanders_searched and not st.session_state.commander_search_job_id:
+        st.error("❌ Aucun commandant valide trouvé dans votre inventaire correspondant à vos préférences.")
+        st.warning("Veuillez ajuster vos préférences de couleurs/stratégies ou ajouter d'autres commandants à votre inventaire.")
+
+@st.fragment
+def display_deck_preview():
+    st.subheader("📋 Aperçu du Deck Généré")
+    deck_display_list = format_deck_list(st.session_state.generated_deck_details)
+    st.text_area("Votre Deck :", "\n".join(deck_display_list), height=300)
+
+    copy_to_clipboard = get_clipboard_copy()
+    if copy_to_clipboard:
+        archidekt_output = "\n".join(deck_display_list)
+        if st.button("Copier le deck dans le presse-papiers pour Archidekt"):
+            copy_to_clipboard(archidekt_output)
+            st.success("🎉 Deck copié dans le presse-papiers au format Archidekt ! Collez-le directement. 🎉")
+    else:
+        st.warning("Pyperclip n'est pas disponible. Copiez le deck manuellement.")
+
+    if len(st.session_state.collections) > 1:
+        with st.expander("🤝 Provenance des cartes par propriétaire"):
+            cards_by_owner = {}
+            for card_info in st.session_state.generated_deck_details:
+                if card_info.get('owner'):
+                    cards_by_owner.setdefault(card_info['owner'], []).append(card_info['name'])
+            for owner, card_names in sorted(cards_by_owner.items()):
+                st.markdown(f"**{owner}** ({len(card_names)} cartes) : {', '.join(sorted(card_names))}")
+
+@st.fragment
+def display_deck_editor():
+    from deck_builder import rebuild_deck
+
+    deck_state = st.session_state.generated_deck_state
+    if not deck_state:
+        return
+    with st.expander("🔒 Verrouiller ou exclure des cartes puis reconstruire"):
+        st.markdown("Les cartes verrouillées restent (ou entrent) dans le deck, les cartes exclues en sortent : "
+                    "seules les places libérées sont recomplétées, à partir des cartes déjà analysées.")
+        cards = deck_state['pool']['cards']
+        deck_keys = set(deck_state['spell_keys']) | set(deck_state['land_keys'])
+        # Les cartes du deck d'abord, puis le reste du pool candidat
+        candidate_keys = sorted(cards, key=lambda key: (key not in deck_keys, cards[key]['name']))
+
+        def format_candidate(key):
+            in_deck_str = " ✅" if key in deck_keys else ""
+            return f"{cards[key]['name']} ({cards[key]['set_from_scryfall']}) {cards[key]['cn_from_scryfall']}{in_deck_str}"
+
+        pinned_keys = st.multiselect("🔒 Cartes verrouillées", candidate_keys, format_func=format_candidate, key="deck_pinned_keys")
+        excluded_keys = st.multiselect("🚫 Cartes exclues", candidate_keys, format_func=format_candidate, key="deck_excluded_keys")
+
+        if st.button("♻️ Reconstruire le deck"):
+            rebuild_start = time.perf_counter()
+            new_deck_state = rebuild_deck(deck_state, pinned_keys, excluded_keys)
+            rebuild_ms = (time.perf_counter() - rebuild_start) * 1000
+            store_generated_deck(new_deck_state)
+            changes = new_deck_state['last_changes']
+            st.session_state.deck_rebuild_message = (
+                f"Deck reconstruit en {rebuild_ms:.0f} ms : {len(changes['added'])} carte(s) ajoutée(s)"
+                f"{' (' + ', '.join(changes['added']) + ')' if changes['added'] else ''}, "
+                f"{len(changes['removed'])} retirée(s){' (' + ', '.join(changes['removed']) + ')' if changes['removed'] else ''}."
+            )
+            st.rerun() # Rafraîchit l'aperçu et le rapport, hors de ce fragment
+        if st.session_state.deck_rebuild_message:
+            st.success(st.session_state.deck_rebuild_message)
+
+@st.fragment
+def display_inventory_search():
+    from card_search import search_inventory
+
+    with st.expander("🔎 Rechercher dans l'inventaire"):
+        st.markdown(
+            "Syntaxe proche de Scryfall, termes combinés par ET (`-` devant un terme pour l'exclure) : "
+            "`t:creature`, `o:\"draw a card\"`, `cat:ramp`, `kw:flying`, `r:rare`, `cmc<=3`, "
+            "`id:WU` (identité incluse dans), `id>=G` (contient), `in:deck`. Un mot seul cherche dans le nom."
+        )
+        query = st.text_input("Requête", placeholder="Ex: cmc=2 id>=G cat:ramp -in:deck", key="inventory_search_query")
+        if not query.strip():
+            return
+
+        deck_state = st.session_state.get('generated_deck_state')
+        deck_keys = set()
+        if deck_state:
+            deck_keys = set(deck_state['pool']['commander_inventory_keys']) | set(deck_state['spell_keys']) | set(deck_state['land_keys'])
+        search_start = time.perf_counter()
+        try:
+            found_rows = search_inventory(st.session_state.inventaire, query, deck_keys)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            return
+        search_ms = (time.perf_counter() - search_start) * 1000
+
+        st.caption(f"{len(found_rows)} carte(s) trouvée(s) en {search_ms:.0f} ms"
+                   f"{f' (les {INVENTORY_SEARCH_RESULTS_LIMIT} premières affichées)' if len(found_rows) > INVENTORY_SEARCH_RESULTS_LIMIT else ''}.")
+        shown_rows = found_rows[:INVENTORY_SEARCH_RESULTS_LIMIT]
+        if shown_rows:
+            st.dataframe({
+                "Nom": [row['details'].get('name') for row in shown_rows],
+                "Type": [row['details'].get('type_line', '') for row in shown_rows],
+                "CMC": [row['details'].get('cmc', 0) for row in shown_rows],
+                "Couleurs": [''.join(COLOR_EMOJI_MAP[c] for c in MTG_COLOR_ORDER if c in row['colors']) or COLOR_EMOJI_MAP['C'] for row in shown_rows],
+                "Catégories": [", ".join(sorted(row['categories'])) for row in shown_rows],
+                "Exemplaires": [row['inventory_info'].get('quantity_owned', 1) for row in shown_rows],
+                "Dans le deck": ["✅" if row['cache_key'] in deck_keys else "" for row in shown_rows],
+            }, hide_index=True, use_container_width=True)
+
+@st.fragment
+def display_deck_report():
+    st.subheader("📊 Courbe de Mana (CMC) des Sorts")
+    display_cmc_chart(st.session_state.generated_mana_curve, st.session_state.selected_commander_name)
+
+    strategy = st.session_state.preferences.get('strategy')
+    report = build_deck_report(
+        st.session_state.generated_deck_hash,
+        st.session_state.generated_deck_details,
+        st.session_state.generated_mana_curve,
+        st.session_state.generated_deck_category_counts,
+        st.session_state.generated_synergy_cards_info,
+        strategy
+    )
+
+    st.subheader("📊 Statistiques du Deck")
+    st.write(f"Nombre total de cartes : **{report['deck_size']}**")
+    st.write(f"Nombre de terrains : **{report['land_count']}**")
+    if report['avg_cmc'] is not None:
+        st.write(f"Coût Converti de Mana moyen des sorts (CMC) : **{report['avg_cmc']:.2f}**")
+    quality = (st.session_state.generated_deck_state or {}).get('quality')
+    if quality:
+        spread = quality['spread']
+        st.write(f"Note de qualité : **{quality['score']:.3f}** — meilleur de {quality['candidate_count']} candidats "
+                 f"(min {spread['min']:.3f}, médiane {spread['median']:.3f}, max {spread['max']:.3f}, écart-type {spread['stdev']:.3f})")
+    
+    st.write("Répartition des types de cartes :")
+    for card_type, count in report['type_counts']:
+        st.write(f"- {card_type}: **{count}**")
+
+    # Répartition par catégorie de sort (rampe, pioche, etc.)
+    st.markdown("##### Répartition par catégorie de sort :")
+    if st.session_state.generated_deck_category_counts:
+        if report['category_lines']:
+            for category_label, count in report['category_lines']:
+                st.write(f"- {category_label}: **{count}**")
+        else:
+            st.info("Aucune catégorie de sort spécifique identifiée ou affichée pour le moment.")
+    else:
+        st.info("Les catégories de sorts n'ont pas encore été calculées.")
+
+    # Analyse de Synergie (texte)
+    st.markdown("##### Analyse de Synergie :")
+    if strategy and st.session_state.generated_synergy_cards_info:
+        strategy_name = strategy.capitalize()
+        st.markdown(f"Votre deck est construit autour de la stratégie **{strategy_name}**.")
+        
+        synergy_cards_for_strategy = report['synergy_cards_for_strategy']
+        if synergy_cards_for_strategy:
+            st.markdown(f"Quelques cartes qui soutiennent bien cette stratégie : **{', '.join(synergy_cards_for_strategy[:5])}{'...' if len(synergy_cards_for_strategy) > 5 else ''}**.")
+            st.markdown(f"Ces cartes ont été sélectionnées pour leurs capacités qui s'alignent avec les objectifs de la stratégie '{strategy_name}'.")
+        else:
+            st.info(f"Peu de cartes de votre inventaire ont été fortement classées pour la stratégie '{strategy_name}'.")
+    else:
+        st.info("Aucune stratégie spécifique n'a été choisie, ou aucune synergie clé n'a été identifiée pour le moment.")
+    
+    # Suggestions de Cartes "Manquantes"
+    st.markdown("##### Suggestions de Cartes Manquantes :")
+    if not report['suggestions'] and report['deck_size'] == TARGET_DECK_SIZE:
+        st.info("Votre deck semble avoir une bonne répartition des types de cartes clés.")
+    elif report['suggestions']:
+        st.markdown("Considérez l'ajout des types de cartes suivants :")
+        for suggestion in report['suggestions']:
+            st.write(suggestion)
+        st.markdown("Pensez à rechercher ces types de cartes dans votre inventaire ou à les acquérir pour améliorer la cohérence de votre deck.")
+    else:
+        st.info("Aucune suggestion spécifique n'est faite pour le moment, mais vous pouvez toujours affiner votre sélection.")
+    display_upgrade_suggestions()
+
+    # Légalité Commander (détails déjà présents dans le deck : aucune requête)
+    from deck_validator import validate_decklists, make_deck_state_decklist
+
+    st.markdown("##### Légalité en Commander :")
+    display_legality_result(validate_decklists([make_deck_state_decklist(st.session_state.generated_deck_state)])[0])
+
+@st.fragment
+def display_similar_commanders():
+    # Plus proches voisins du commandant du deck (profils précalculés par inventaire : chaque requête est immédiate)
+    from card_classifier import get_inventory_prefetch, get_inventory_commander_profiles, find_similar_commanders
+
+    st.subheader("🧭 Commandants similaires de votre collection")
+    job = get_inventory_prefetch(st.session_state.inventory_key)
+    profile_index = get_inventory_commander_profiles(
+        st.session_state.inventory_key, st.session_state.inventaire,
+        job['classified_rows'] if job is not None and job['status'] == 'done' else None
+    )
+    commander_members = st.session_state.selected_commander_name.split(" + ")
+    preferred_colors = st.session_state.preferences.get('colors')
+    within_colors = st.checkbox("Seulement dans les couleurs choisies", value=False, disabled=not preferred_colors,
+                                key="similar_commanders_within_colors")
+    similar_commanders = find_similar_commanders(profile_index, commander_members,
+                                                 colors=preferred_colors if within_colors else None)
+    if not similar_commanders:
+        st.info("Aucun autre commandant comparable dans votre collection.")
+        return
+
+    st.markdown("Proches par leurs catégories, leurs couleurs, leur coût et leurs mots-clés : "
+                "une alternative si ce commandant ne vous convient pas.")
+    st.dataframe({
+        "Commandant": [name for name, _, _ in similar_commanders],
+        "Couleurs": [''.join(COLOR_EMOJI_MAP[c] for c in MTG_COLOR_ORDER if c in details.get('color_identity', [])) or COLOR_EMOJI_MAP['C']
+                     for _, details, _ in similar_commanders],
+        "Type": [details.get('type_line', '') for _, details, _ in similar_commanders],
+        "Similarité": [f"{similarity:.0%}" for _, _, similarity in similar_commanders],
+    }, hide_index=True, use_container_width=True)
+    similar_name = st.selectbox("Construire le deck d'un commandant similaire :", [name for name, _, _ in similar_commanders],
+                                key="similar_commander_choice")
+    if st.button(f"🛠️ Construire le deck de {similar_name}", key="similar_commander_build"):
+        # Nouvelles clés des tables : la ligne qui y reste sélectionnée ne relance pas son propre deck
+        st.session_state.commander_table_generation = st.session_state.get('commander_table_generation', 0) + 1
+        start_deck_build([similar_name])
+        st.rerun() # Affiche le suivi de la construction, hors de ce fragment
+
+def display_upgrade_suggestions():
+    # Cartes à acquérir, lues dans l'index de la base de cartes complète (construit une fois par version de la base)
+    from upgrade_suggestions import load_upgrade_index, get_deck_upgrade_suggestions
+
+    with st.spinner("Indexation de la base de cartes..."):
+        upgrade_index = load_upgrade_index()
+    if upgrade_index is None:
+        st.caption("Importez les données en masse de Scryfall (`python card_database.py default-cards.json`) "
+                   "pour obtenir des cartes précises à acquérir.")
+        return
+    upgrade_suggestions = get_deck_upgrade_suggestions(upgrade_index, st.session_state.generated_deck_state, st.session_state.inventaire)
+    if not upgrade_suggestions:
+        return
+    st.markdown("Cartes absentes de votre inventaire, dans l'identité couleur du commandant (les plus jouées d'abord, "
+                "celles de votre stratégie en tête) :")
+    for suggestion in upgrade_suggestions:
+        cards_str = ", ".join(card['name'] + (f" ({card['price_usd']:.2f} $)" if card['price_usd'] is not None else "")
+                              for card in suggestion['cards']) or "aucune carte dans la base"
+        st.write(f"- **{suggestion['label']}** ({suggestion['count']}/{suggestion['target']}) : {cards_str}")
+
+def display_legality_result(legality):
+    if legality['legal']:
+        st.success(f"✅ Deck légal en Commander ({legality['deck_size']} cartes).")
+        return
+    st.warning(f"⚠️ {len(legality['violations'])} infraction(s) aux règles du format Commander :")
+    st.dataframe({
+        "Carte": [violation['card'] or "(deck)" for violation in legality['violations']],
+        "Infraction": [violation['message'] for violation in legality['violations']],
+    }, hide_index=True, use_container_width=True)
+
+def display_decklist_validator():
+    from deck_validator import parse_decklist_text, validate_decklists
+
+    with st.expander("✅ Vérifier la légalité d'une decklist"):
+        st.markdown("Une carte par ligne (`1 Sol Ring` ou `1 Sol Ring (C13) 1`) ; marquez le commandant avec `[Commander]`.")
+        decklist_text = st.text_area("Decklist", height=200, key="decklist_validator_text")
+        if not decklist_text.strip():
+            return
+        decklist, unparsed_lines = parse_decklist_text(decklist_text)
+        for line in unparsed_lines[:5]:
+            st.caption(f"Ligne ignorée (format non reconnu) : '{line}'")
+        if not decklist['commanders']:
+            st.error("❌ Aucun commandant : ajoutez `[Commander]` à la fin de sa ligne.")
+            return
+        with st.spinner("Vérification de la decklist..."):
+            display_legality_result(validate_decklists([decklist])[0])
+
+
+@st.cache_resource
+def get_metrics_server():
+    """Serveur des mesures (/metrics, /metrics.json), démarré une seule fois par processus."""
+    return start_metrics_server(METRICS_HOST, METRICS_PORT)
+
 def app():
     st.set_page_config(page_title="AutoDeck Commander MTG", page_icon="✨", layout="wide")
+    get_metrics_server()
+    start_clipboard_detection()
     st.title("✨ AutoDeck Commander MTG ✨")
     st.markdown("---")
 
@@ -120,6 +846,18 @@ def app():
         st.session_state.preferences = {}
     if 'commanders_data' not in st.session_state:
         st.session_state.commanders_data = None
+    if 'commander_table' not in st.session_state:
+        st.session_state.commander_table = None
+    if 'commander_pairs_table' not in st.session_state:
+        st.session_state.commander_pairs_table = None
+    if 'commanders_searched' not in st.session_state:
+        st.session_state.commanders_searched = False
+    if 'commanders_strategy' not in st.session_state:
+        st.session_state.commanders_strategy = None
+    if 'commander_analysis' not in st.session_state:
+        st.session_state.commander_analysis = None
+    if 'commanders_preferences' not in st.session_state:
+        st.session_state.commanders_preferences = None
     if 'sort_option_name' not in st.session_state:
         st.session_state.sort_option_name = "Par score de pertinence total (Commandant + Cartes de support)"
     if 'selected_commander_index' not in st.session_state:
@@ -130,6 +868,12 @@ def app():
         st.session_state.inventaire_loaded = False
     if 'inventaire' not in st.session_state:
         st.session_state.inventaire = None
+    if 'inventory_key' not in st.session_state:
+        st.session_state.inventory_key = None
+    if 'inventory_upload_signature' not in st.session_state:
+        st.session_state.inventory_upload_signature = None
+    if 'collections' not in st.session_state:
+        st.session_state.collections = {}
     if 'generated_deck_details' not in st.session_state:
         st.session_state.generated_deck_details = None
     if 'generated_mana_curve' not in st.session_state:
@@ -142,6 +886,18 @@ def app():
         st.session_state.generated_deck_category_counts = Counter()
     if 'generated_synergy_cards_info' not in st.session_state:
         st.session_state.generated_synergy_cards_info = []
+    if 'generated_deck_state' not in st.session_state:
+        st.session_state.generated_deck_state = None
+    if 'deck_rebuild_message' not in st.session_state:
+        st.session_state.deck_rebuild_message = None
+    if 'generated_deck_hash' not in st.session_state:
+        st.session_state.generated_deck_hash = None
+    if 'multi_decks' not in st.session_state:
+        st.session_state.multi_decks = []
+    if 'commander_search_job_id' not in st.session_state:
+        st.session_state.commander_search_job_id = None
+    if 'deck_job_id' not in st.session_state:
+        st.session_state.deck_job_id = None
 
 
     main_choice = st.sidebar.radio("Que voulez-vous faire ?", ("Construire un deck", "Vider le cache Scryfall"), key="main_choice_radio")
@@ -150,7 +906,7 @@ def app():
         st.header("⚙️ Définissez vos préférences de deck")
         
         # --- Section de téléchargement de l'inventaire ---
-        st.markdown("📤 **Téléchargez votre fichier d'inventaire (.txt)**")
+        st.markdown("📤 **Téléchargez votre fichier d'inventaire (.txt)** — un fichier par collection pour mettre en commun les cartes d'un groupe de jeu")
         st.markdown(
             """
             Le fichier doit être un simple fichier texte (.txt) où chaque ligne représente une carte selon la syntaxe suivante :
@@ -170,365 +926,63 @@ def app():
             """
         )
 
-        uploaded_file = st.file_uploader("Choisissez un fichier .txt", type="txt", key="file_uploader")
+        uploaded_files = st.file_uploader("Choisissez un ou plusieurs fichiers .txt", type="txt", accept_multiple_files=True, key="file_uploader")
 
-        if uploaded_file is not None:
-            st.session_state.inventaire = get_inventory(uploaded_file)
+        if uploaded_files:
+            # L'inventaire et sa clé ne sont calculés qu'au téléversement, pas à chaque réexécution
+            upload_signature = tuple(uploaded_file.file_id for uploaded_file in uploaded_files)
+            if not st.session_state.inventaire_loaded or st.session_state.inventory_upload_signature != upload_signature:
+                from card_classifier import compute_inventory_key
+                st.session_state.inventaire, st.session_state.collections = get_inventory(uploaded_files)
+                st.session_state.inventory_key = compute_inventory_key(st.session_state.inventaire)
+                st.session_state.inventory_upload_signature = upload_signature
             st.session_state.inventaire_loaded = True
+            # Résolution et classification en arrière-plan pendant le choix des préférences (relancée si évincée)
+            from card_classifier import start_inventory_prefetch
+            start_inventory_prefetch(st.session_state.inventaire, st.session_state.inventory_key)
+            if len(st.session_state.collections) > 1:
+                for owner, collection in st.session_state.collections.items():
+                    st.write(f"- Collection **{owner}** : {sum(data['quantity_owned'] for data in collection.values())} cartes")
             st.info(f"Inventaire chargé : **{sum(data['quantity_owned'] for data in st.session_state.inventaire.values())}** cartes uniques.")
             st.markdown("*(Le builder considérera 1 exemplaire par carte unique (nom+set+num), sauf pour les terrains de base qui sont illimités.)*")
         else:
             st.warning("Veuillez téléverser votre fichier d'inventaire pour commencer.")
             st.session_state.inventaire_loaded = False
+            st.session_state.inventory_key = None
+            st.session_state.inventory_upload_signature = None
             st.session_state.inventaire = {}
+            st.session_state.collections = {}
 
         if st.session_state.inventaire_loaded:
+            display_prefetch_status()
+            display_collection_dashboard()
             st.markdown("---")
-            st.markdown("🎨 **Préférez-vous certaines couleurs ?** (Cochez pour sélectionner)")
-            selected_colors_list = []
-            
-            all_color_symbols_to_display = MTG_COLOR_ORDER + ['C']
-            
-            cols_color = st.columns(len(all_color_symbols_to_display))
-            for i, color_symbol in enumerate(all_color_symbols_to_display):
-                with cols_color[i]:
-                    checkbox_state = st.session_state.selected_colors_checkbox.get(color_symbol, False)
-                    
-                    st.markdown(MANA_SYMBOL_HTML_MAP.get(color_symbol, f"({color_symbol})"), unsafe_allow_html=True)
-                    label = f"{COLOR_MAP.get(color_symbol, 'Incolore')}"
-                    
-                    if st.checkbox(label, value=checkbox_state, key=f"color_checkbox_{color_symbol}"):
-                        selected_colors_list.append(color_symbol)
-                        st.session_state.selected_colors_checkbox[color_symbol] = True
-                    else:
-                        st.session_state.selected_colors_checkbox[color_symbol] = False
-            
-            if 'C' in selected_colors_list:
-                st.session_state.preferences['colors'] = ['C']
-                st.info("🌈 Préférence définie sur **Incolore** uniquement (précise si d'autres couleurs étaient sélectionnées).")
-            else:
-                st.session_state.preferences['colors'] = selected_colors_list
-                if selected_colors_list:
-                    st.info(f"🌈 Couleurs préférées sélectionnées : **{', '.join([COLOR_MAP[c] for c in selected_colors_list])}**")
-                else:
-                    st.info("🎨 Aucune couleur préférée sélectionnée. Le deck utilisera toutes les couleurs disponibles du commandant.")
-
-
-            st.subheader("🎯 Choisissez une stratégie pour votre deck")
-            strategies_dict = {
-                'Aggro': 'aggro', 'Contrôle': 'control', 'Combo': 'combo', 'Ramp': 'ramp', 
-                'Voltron': 'voltron', 'Token': 'token', 'Stax': 'stax', 'Mill': 'mill', 'Discard': 'discard',
-                'Aristocrats': 'aristocrats', 'Reanimator': 'reanimator', 'Spellslinger': 'spellslinger', 
-                'Enchantments Matter': 'enchantments_matter', 'Artifacts Matter': 'artifacts_matter', '+1/+1 Counters': 'counters_matter',
-                'Superfriends': 'superfriends', 'Tribal': 'tribal', 'Group Hug': 'group_hug', 'Group Slug': 'group_slug',
-                'Pillow Fort': 'pillow_fort', 'Theft': 'theft'
-            }
-            strategy_display_names = ["Aucune préférence (Deck 'amusant mais valide')"] + list(strategies_dict.keys())
-            
-            strategy_selected_name = st.selectbox("Sélectionnez une stratégie :", strategy_display_names, 
-                                                  index=strategy_display_names.index(st.session_state.preferences.get('strategy_display_name', strategy_display_names[0])),
-                                                  key="strategy_selectbox_key")
-
-            chosen_strategy_key = None
-            if strategy_selected_name != "Aucune préférence (Deck 'amusant mais valide')":
-                chosen_strategy_key = strategies_dict[strategy_selected_name]
-                st.session_state.preferences['strategy'] = chosen_strategy_key
-                st.session_state.preferences['strategy_display_name'] = strategy_selected_name
-                
-                st.info(f"✨ Stratégie préférée : **{chosen_strategy_key.capitalize()}**")
-                if chosen_strategy_key in STRATEGY_DESCRIPTIONS:
-                    st.markdown(f"*{STRATEGY_DESCRIPTIONS[chosen_strategy_key]}*")
-
-            else:
-                st.session_state.preferences['strategy'] = None
-                st.session_state.preferences['strategy_display_name'] = strategy_selected_name
-                st.info("🎲 Aucune stratégie spécifique choisie. Tentative de construction d'un deck 'amusant mais valide'.")
-            
-            def on_find_commanders_click():
-                # L'inventaire est déjà chargé si inventaire_loaded est True
-                # st.session_state.inventaire = get_inventory() # Pas besoin de re-l'appeler ici
-
-                st.session_state.deck_generated = False
-                st.session_state.selected_commander_name = None
-                st.session_state.last_selected_commander_name = None
-                st.session_state.commanders_data = None
-                st.session_state.generated_deck_details = None
-                st.session_state.generated_mana_curve = None
-                st.session_state.generated_deck_category_counts = Counter()
-                st.session_state.generated_synergy_cards_info = []
-
-                # Utiliser la barre de progression globale
-                progress_bar_global = st.progress(0, text="Initialisation de la recherche de commandants...")
-                
-                # Étape 1: Recherche et évaluation des commandants (cette fonction contient ses propres st.spinner/progress)
-                commanders_data_raw = identify_commanders_in_inventory(st.session_state.inventaire, st.session_state.preferences)
-                st.session_state.commanders_data = commanders_data_raw
-
-                progress_bar_global.progress(100, text="Commandants trouvés et évalués!") 
-                
-                if not st.session_state.commanders_data:
-                    st.error("❌ Aucun commandant valide trouvé dans votre inventaire correspondant à vos préférences.")
-                    st.warning("Veuillez ajuster vos préférences de couleurs/stratégies ou ajouter d'autres commandants à votre inventaire.")
-                    progress_bar_global.empty()
-                else:
-                    st.info("Commandants trouvés et évalués. Faites votre choix ci-dessous.")
-                    progress_bar_global.empty()
-            
-                st.session_state.deck_generated = False
-                st.session_state.selected_commander_name = None
-                st.session_state.last_selected_commander_name = None
-
-
-            if st.button("Trouver les commandants"):
-                on_find_commanders_click()
-
-            if st.session_state.commanders_data:
-                st.subheader("👑 Commandants disponibles selon vos préférences")
-                
-                if st.session_state.preferences.get('strategy'):
-                    st.markdown(f"*{MANA_SYMBOL_HTML_MAP['C']} Le score de pertinence indique à quel point un commandant est pertinent pour la stratégie '{st.session_state.preferences['strategy'].capitalize()}', basé sur :*", unsafe_allow_html=True)
-                    st.markdown(f"  *- Un bonus basé sur la présence de mots-clés stratégiques dans le texte du commandant (par ex. +10 par mot-clé).*", unsafe_allow_html=True)
-                    st.markdown(f"  *- Plus 1 point pour chaque carte de support pertinente dans votre inventaire (dans ses couleurs).*", unsafe_allow_html=True)
-                else:
-                    st.markdown(f"*{MANA_SYMBOL_HTML_MAP['C']} Le score de pertinence générale indique le nombre total de cartes compatibles dans votre inventaire pour ce commandant.*", unsafe_allow_html=True)
-
-                sort_options = ["Par score de pertinence total (Commandant + Cartes de support)", "Par score de pertinence du commandant uniquement"]
-                if not st.session_state.preferences.get('strategy'):
-                    sort_options = ["Par score de pertinence total (Commandant + Cartes de support)"]
-                    if st.session_state.sort_option_name not in sort_options:
-                        st.session_state.sort_option_name = sort_options[0]
-
-                st.session_state.sort_option_name = st.radio(
-                    "📊 Comment souhaitez-vous trier les commandants ?",
-                    sort_options,
-                    index=sort_options.index(st.session_state.sort_option_name),
-                    key="sort_option_radio_key"
-                )
-                
-                commanders_data_to_display = list(st.session_state.commanders_data)
-                if st.session_state.sort_option_name == "Par score de pertinence total (Commandant + Cartes de support)":
-                    commanders_data_to_display.sort(key=lambda x: (-x[3], x[0]))
-                    st.info("Commandants triés par score de pertinence total.")
-                else:
-                    commanders_data_to_display.sort(key=lambda x: (-x[4], x[0]))
-                    st.info("Commandants triés par score de pertinence du commandant.")
-                
-                st.markdown("---")
-                st.markdown("### Choisissez votre commandant :")
-                st.markdown("---")
-
-                col_widths = [0.05, 0.35, 0.20, 0.25, 0.15]
-                
-                cols_header = st.columns(col_widths)
-                cols_header[0].markdown("**#**")
-                cols_header[1].markdown("**Nom**")
-                cols_header[2].markdown("**Couleurs**")
-                cols_header[3].markdown("**Score**")
-                cols_header[4].markdown(" ")
-
-                st.markdown("---")
-
-                commandant_clicked_name = None 
-                for i, (cmd_name, cmd_details, relevance_str, score_total, score_cmd_bonus, score_support_cards) in enumerate(commanders_data_to_display):
-                    cmd_ci_set = get_color_identity(cmd_details)
-                    sorted_ci_symbols = [c for c in MTG_COLOR_ORDER if c in cmd_ci_set]
-                    formatted_ci_html = ' '.join([MANA_SYMBOL_HTML_MAP.get(s, f"({s})") for s in sorted_ci_symbols])
-                    if not formatted_ci_html: formatted_ci_html = MANA_SYMBOL_HTML_MAP['C']
-                    
-                    score_breakdown_str = ""
-                    if st.session_state.preferences.get('strategy'):
-                        score_breakdown_str = (
-                            f"**T:** {score_total}<br>"
-                            f"**C:** {score_cmd_bonus} | **S:** {score_support_cards}"
-                        )
-                    else:
-                        score_breakdown_str = (
-                            f"**T:** {score_total}<br>"
-                            f"**S:** {score_support_cards}"
-                        )
-
-                    cols = st.columns(col_widths)
-                    cols[0].markdown(f"**{i+1}.**")
-                    cols[1].markdown(f"**{cmd_name}**")
-                    cols[2].markdown(formatted_ci_html, unsafe_allow_html=True)
-                    cols[3].markdown(score_breakdown_str, unsafe_allow_html=True)
-                    
-                    select_button_key = f"select_cmd_{cmd_name}_{i}"
-                    if cols[4].button("Choisir", key=select_button_key):
-                        commandant_clicked_name = cmd_name
-                
-                st.markdown("---")
-
-                if commandant_clicked_name and commandant_clicked_name != st.session_state.last_selected_commander_name:
-                    st.session_state.selected_commander_name = commandant_clicked_name
-                    st.session_state.last_selected_commander_name = commandant_clicked_name
-                    st.session_state.deck_generated = True
-
-                    st.info(f"Construction du deck pour : **{st.session_state.selected_commander_name}**...")
-                    
-                    progress_bar_global_deck_build = st.progress(0, text="Initialisation de la construction du deck...")
-                    
-                    deck_full_details, mana_curve_spells_cmc, deck_category_counts, synergy_cards_info = build_commander_deck(
-                        st.session_state.selected_commander_name, 
-                        st.session_state.inventaire, 
-                        st.session_state.preferences,
-                        progress_bar_global_deck_build
-                    )
-
-                    if deck_full_details:
-                        st.session_state.generated_deck_details = deck_full_details
-                        st.session_state.generated_mana_curve = mana_curve_spells_cmc
-                        st.session_state.generated_deck_category_counts = deck_category_counts
-                        st.session_state.generated_synergy_cards_info = synergy_cards_info
-                    else:
-                        st.session_state.deck_generated = False
-                elif st.session_state.selected_commander_name and not st.session_state.deck_generated:
-                    st.info(f"Commandant sélectionné : **{st.session_state.selected_commander_name}**. Cliquez sur 'Trouver les commandants' si vous voulez le reconstruire ou ajuster les préférences.")
+            display_preferences_section()
+            display_job_status('commander_search_job_id', "Recherche des commandants", on_commander_search_done)
+            display_commander_section()
+            display_job_status('deck_job_id', f"Construction du deck de {st.session_state.get('selected_commander_name')}", on_deck_build_done)
 
             if st.session_state.deck_generated and st.session_state.generated_deck_details:
-                st.subheader("📋 Aperçu du Deck Généré")
-                deck_display_list = []
-                for card_info in sorted(st.session_state.generated_deck_details, key=lambda x: x['name']):
-                    foil_str = " *F*" if card_info['foil'] else ""
-                    deck_display_list.append(f"1 {card_info['name']} ({card_info['set']}) {card_info['collector_number']}{foil_str}")
-                st.text_area("Votre Deck :", "\n".join(deck_display_list), height=300)
-                
-                if CLIPBOARD_AVAILABLE:
-                    archidekt_output = "\n".join(deck_display_list)
-                    if st.button("Copier le deck dans le presse-papiers pour Archidekt"):
-                        pyperclip.copy(archidekt_output)
-                        st.success("🎉 Deck copié dans le presse-papiers au format Archidekt ! Collez-le directement. 🎉")
-                else:
-                    st.warning("Pyperclip n'est pas disponible. Copiez le deck manuellement.")
-
-                st.subheader("📊 Courbe de Mana (CMC) des Sorts")
-                display_cmc_chart(st.session_state.generated_mana_curve, st.session_state.selected_commander_name)
-
-                st.subheader("📊 Statistiques du Deck")
-                actual_land_count_in_final_deck = 0
-                type_counts_final_deck = Counter()
-
-                for card_info in st.session_state.generated_deck_details:
-                    is_land = False
-                    if card_info['name'] in [f"{COLOR_MAP.get(c, 'Colorless')} Basic Land" for c in ['W','U','B','R','G']] or card_info['name'] == 'Wastes':
-                        is_land = True
-                        type_counts_final_deck['Basic Land'] += 1
-                    else:
-                        details_for_check = get_card_details_scryfall(card_info['name'])
-                        if details_for_check and "Land" in details_for_check.get('type_line', ''):
-                            is_land = True
-                            types = details_for_check['type_line'].split(' — ')[0].split(' ')
-                            for t in types:
-                                type_counts_final_deck[t] += 1
-                        
-                        if details_for_check and 'type_line' in details_for_check:
-                            types = details_for_check['type_line'].split(' — ')[0].split(' ')
-                            for t in types:
-                                if t != "Land":
-                                    type_counts_final_deck[t] += 1
-
-                    if is_land:
-                        actual_land_count_in_final_deck += 1
-                
-                st.write(f"Nombre total de cartes : **{len(st.session_state.generated_deck_details)}**")
-                st.write(f"Nombre de terrains : **{actual_land_count_in_final_deck}**")
-
-                total_cmc_spells = sum(st.session_state.generated_mana_curve)
-                if st.session_state.generated_mana_curve:
-                    avg_cmc = total_cmc_spells / len(st.session_state.generated_mana_curve)
-                    st.write(f"Coût Converti de Mana moyen des sorts (CMC) : **{avg_cmc:.2f}**")
-                
-                st.write("Répartition des types de cartes :")
-                for card_type, count in type_counts_final_deck.most_common():
-                    st.write(f"- {card_type}: **{count}**")
-
-                # Répartition par catégorie de sort (rampe, pioche, etc.)
-                st.markdown("##### Répartition par catégorie de sort :")
-                if st.session_state.generated_deck_category_counts:
-                    # Filtrer les catégories pertinentes pour l'affichage
-                    # S'assurer que 'threat' et 'utility' sont inclus pour les decks généraux
-                    relevant_categories_for_display = [
-                        'ramp', 'draw', 'spot_removal', 'board_wipe', 'threat', 'utility', 'flex_slots',
-                        # Ajouter les catégories de stratégie si elles sont non-génériques
-                        'token', 'voltron', 'stax', 'mill', 'discard', 'aristocrats', 'reanimator',
-                        'spellslinger', 'enchantments_matter', 'artifacts_matter', 'counters_matter',
-                        'superfriends', 'tribal', 'group_hug', 'group_slug', 'pillow_fort', 'theft'
-                    ]
-                    
-                    chosen_strategy = st.session_state.preferences.get('strategy')
-                    
-                    displayed_categories = []
-                    for cat in relevant_categories_for_display:
-                        if st.session_state.generated_deck_category_counts.get(cat, 0) > 0:
-                            displayed_categories.append(f"- {cat.replace('_', ' ').title()}: **{st.session_state.generated_deck_category_counts[cat]}**")
-                    
-                    if displayed_categories:
-                        for line in displayed_categories:
-                            st.write(line)
-                    else:
-                        st.info("Aucune catégorie de sort spécifique identifiée ou affichée pour le moment.")
-                else:
-                    st.info("Les catégories de sorts n'ont pas encore été calculées.")
-
-                # Analyse de Synergie (texte)
-                st.markdown("##### Analyse de Synergie :")
-                if st.session_state.preferences.get('strategy') and st.session_state.generated_synergy_cards_info:
-                    strategy_name = st.session_state.preferences['strategy'].capitalize()
-                    st.markdown(f"Votre deck est construit autour de la stratégie **{strategy_name}**.")
-                    
-                    synergy_cards_for_strategy = [c['name'] for c in st.session_state.generated_synergy_cards_info if c['category'] == st.session_state.preferences['strategy']]
-                    
-                    if synergy_cards_for_strategy:
-                        st.markdown(f"Quelques cartes qui soutiennent bien cette stratégie : **{', '.join(synergy_cards_for_strategy[:5])}{'...' if len(synergy_cards_for_strategy) > 5 else ''}**.")
-                        st.markdown(f"Ces cartes ont été sélectionnées pour leurs capacités qui s'alignent avec les objectifs de la stratégie '{strategy_name}'.")
-                    else:
-                        st.info(f"Peu de cartes de votre inventaire ont été fortement classées pour la stratégie '{strategy_name}'.")
-                else:
-                    st.info("Aucune stratégie spécifique n'a été choisie, ou aucune synergie clé n'a été identifiée pour le moment.")
-                
-                # Suggestions de Cartes "Manquantes"
-                st.markdown("##### Suggestions de Cartes Manquantes :")
-                current_deck_size = len(st.session_state.generated_deck_details)
-                
-                suggestions_made = []
-                
-                if current_deck_size < TARGET_DECK_SIZE:
-                    suggestions_made.append(f"- **Il manque {TARGET_DECK_SIZE - current_deck_size} cartes pour atteindre la taille standard de 100 cartes pour un deck Commander.**")
-
-                current_lands_count = st.session_state.generated_deck_category_counts.get("Basic Land", 0) + st.session_state.generated_deck_category_counts.get("Terrain non-base", 0)
-                if current_lands_count < TARGET_LAND_COUNT:
-                    suggestions_made.append(f"- **Terrains** (il est recommandé d'avoir environ {TARGET_LAND_COUNT} terrains).")
-
-                if st.session_state.generated_deck_category_counts.get('ramp', 0) < CARD_CATEGORIES_RATIOS['ramp']:
-                    suggestions_made.append(f"- **Rampe de mana** (objectif: {CARD_CATEGORIES_RATIOS['ramp']} cartes).")
-                
-                if st.session_state.generated_deck_category_counts.get('draw', 0) < CARD_CATEGORIES_RATIOS['draw']:
-                    suggestions_made.append(f"- **Pioche de cartes** (objectif: {CARD_CATEGORIES_RATIOS['draw']} cartes).")
-
-                total_removal = st.session_state.generated_deck_category_counts.get('spot_removal', 0) + st.session_state.generated_deck_category_counts.get('board_wipe', 0)
-                if total_removal < (CARD_CATEGORIES_RATIOS['spot_removal'] + CARD_CATEGORIES_RATIOS['board_wipe']):
-                    suggestions_made.append(f"- **Gestion des menaces** (objectif: {CARD_CATEGORIES_RATIOS['spot_removal']} ciblées, {CARD_CATEGORIES_RATIOS['board_wipe']} de masse).")
-                
-                if not suggestions_made and current_deck_size == TARGET_DECK_SIZE:
-                    st.info("Votre deck semble avoir une bonne répartition des types de cartes clés.")
-                elif suggestions_made:
-                    st.markdown("Considérez l'ajout des types de cartes suivants :")
-                    for suggestion in suggestions_made:
-                        st.write(suggestion)
-                    st.markdown("Pensez à rechercher ces types de cartes dans votre inventaire ou à les acquérir pour améliorer la cohérence de votre deck.")
-                else:
-                    st.info("Aucune suggestion spécifique n'est faite pour le moment, mais vous pouvez toujours affiner votre sélection.")
+                display_deck_preview()
+                display_deck_editor()
+                display_deck_report()
+                display_similar_commanders()
+
+            display_inventory_search()
+            display_decklist_validator()
 
 
     elif main_choice == "Vider le cache Scryfall":
         st.header("Vider le cache Scryfall")
-        st.warning("Cela supprimera toutes les données de cartes mises en cache et forcera l'application à les re-télécharger depuis Scryfall.")
+        st.warning("Cela supprimera toutes les données de cartes mises en cache et forcera l'application à les re-télécharger depuis Scryfall. "
+                   "Les cartes importées en masse dans la base (`python card_database.py default-cards.json`) sont conservées.")
         if st.button("Confirmer la suppression du cache"):
             clear_cache_main()
     
     st.sidebar.markdown("---")
     st.sidebar.markdown("[Scryfall](https://scryfall.com/) (ouvrir dans une nouvelle fenêtre)")
     st.sidebar.markdown("[Archidekt](https://archidekt.com/) (ouvrir dans une nouvelle fenêtre)")
+    warm_up_app_modules() # Après le premier affichage : hors du chemin critique du démarrage
 
 if __name__ == "__main__":
     app()
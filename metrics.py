@@ -0,0 +1,170 @@
+# metrics.py
+
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Compteurs et histogrammes du processus, exposés au format texte Prometheus (/metrics)
+# et en instantané JSON (/metrics.json) par un petit serveur HTTP local.
+# Chaque mesure coûte un verrou et une addition : on instrumente par requête, par lot ou par phase,
+# jamais dans les boucles par carte.
+
+METRIC_PREFIX = "autodeck_"
+
+# Nom -> (type, description)
+METRIC_DEFINITIONS = {
+    'cache_calls_total': ('counter', "Appels des fonctions mises en cache par st.cache_data"),
+    'cache_misses_total': ('counter', "Exécutions effectives (défauts de cache) des fonctions mises en cache"),
+    'card_database_hits_total': ('counter', "Cartes lues dans la base binaire sans requête Scryfall"),
+    'scryfall_requests_total': ('counter', "Requêtes HTTP envoyées à Scryfall (une par tentative)"),
+    'scryfall_retries_total': ('counter', "Nouvelles tentatives après une erreur transitoire Scryfall"),
+    'scryfall_coalesced_total': ('counter', "Cartes demandées pendant qu'une requête Scryfall identique était déjà en cours (partagée)"),
+    'scryfall_request_seconds': ('histogram', "Durée des requêtes HTTP Scryfall"),
+    'build_phase_seconds': ('histogram', "Durée des phases de recherche et de construction de deck"),
+    'build_jobs_total': ('counter', "Travaux en arrière-plan terminés, par type et par état (done, cancelled, error)"),
+    'api_requests_total': ('counter', "Requêtes traitées par l'API HTTP locale (503 = refusées, pool saturé)"),
+    'api_request_seconds': ('histogram', "Durée de traitement des requêtes de l'API HTTP locale"),
+}
+
+# Bornes des histogrammes (secondes)
+HISTOGRAM_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_metrics_lock = threading.Lock()
+_counters = {} # (nom, étiquettes triées) -> valeur
+_histograms = {} # (nom, étiquettes triées) -> [effectifs par borne (+Inf en dernier), somme, nombre]
+
+def _get_series_key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def increment(name, value=1, **labels):
+    """Incrémente le compteur `name` (avec ses étiquettes)."""
+    series_key = _get_series_key(name, labels)
+    with _metrics_lock:
+        _counters[series_key] = _counters.get(series_key, 0) + value
+
+def observe(name, value, **labels):
+    """Ajoute une observation à l'histogramme `name`."""
+    series_key = _get_series_key(name, labels)
+    bucket_index = bisect_left(HISTOGRAM_BUCKETS, value)
+    with _metrics_lock:
+        histogram = _histograms.get(series_key)
+        if histogram is None:
+            histogram = _histograms[series_key] = [[0] * (len(HISTOGRAM_BUCKETS) + 1), 0.0, 0]
+        histogram[0][bucket_index] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+@contextmanager
+def timed(name, **labels):
+    """Mesure la durée du bloc dans l'histogramme `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+def reset_metrics():
+    """Remet toutes les mesures à zéro."""
+    with _metrics_lock:
+        _counters.clear()
+        _histograms.clear()
+
+def get_metrics_snapshot():
+    """
+    Instantané des mesures : {'counters': [...], 'histograms': [...], 'cache_hit_rates': {fonction: taux}}.
+    Les histogrammes donnent les effectifs cumulés par borne, comme Prometheus.
+    """
+    with _metrics_lock:
+        counters = dict(_counters)
+        histograms = {key: (list(buckets), total, count) for key, (buckets, total, count) in _histograms.items()}
+
+    snapshot = {'counters': [], 'histograms': [], 'cache_hit_rates': {}}
+    for (name, labels), value in sorted(counters.items()):
+        snapshot['counters'].append({'name': name, 'labels': dict(labels), 'value': value})
+    for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+        cumulative_counts = []
+        running_count = 0
+        for bucket_count in buckets:
+            running_count += bucket_count
+            cumulative_counts.append(running_count)
+        snapshot['histograms'].append({
+            'name': name, 'labels': dict(labels), 'sum': total, 'count': count,
+            'buckets': dict(zip([str(bound) for bound in HISTOGRAM_BUCKETS] + ['+Inf'], cumulative_counts)),
+        })
+
+    # Taux de succès du cache : les appels sont comptés par l'appelant, les défauts par la fonction en cache
+    for (name, labels), calls in counters.items():
+        if name == 'cache_calls_total' and calls:
+            misses = counters.get(('cache_misses_total', labels), 0)
+            snapshot['cache_hit_rates'][dict(labels).get('function', '')] = max(0.0, (calls - misses) / calls)
+    return snapshot
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped_labels = (f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+                      for key, value in labels.items())
+    return "{" + ",".join(escaped_labels) + "}"
+
+def render_prometheus_metrics():
+    """Mesures au format d'exposition texte de Prometheus."""
+    snapshot = get_metrics_snapshot()
+    lines = []
+    described_names = set()
+
+    def describe(name):
+        if name not in described_names:
+            described_names.add(name)
+            metric_type, description = METRIC_DEFINITIONS.get(name, ('untyped', name))
+            lines.append(f"# HELP {METRIC_PREFIX}{name} {description}")
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} {metric_type}")
+
+    for counter in snapshot['counters']:
+        describe(counter['name'])
+        lines.append(f"{METRIC_PREFIX}{counter['name']}{_format_labels(counter['labels'])} {counter['value']}")
+    for histogram in snapshot['histograms']:
+        describe(histogram['name'])
+        metric_name = f"{METRIC_PREFIX}{histogram['name']}"
+        for bound, cumulative_count in histogram['buckets'].items():
+            lines.append(f"{metric_name}_bucket{_format_labels({**histogram['labels'], 'le': bound})} {cumulative_count}")
+        lines.append(f"{metric_name}_sum{_format_labels(histogram['labels'])} {histogram['sum']}")
+        lines.append(f"{metric_name}_count{_format_labels(histogram['labels'])} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+# --- Serveur HTTP local ---
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body, content_type = render_prometheus_metrics().encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path == '/metrics.json':
+            body, content_type = json.dumps(get_metrics_snapshot()).encode('utf-8'), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Pas de journal par requête de collecte
+
+def start_metrics_server(host, port):
+    """
+    Démarre le serveur des mesures dans un thread (/metrics et /metrics.json).
+    Retourne le serveur, ou None si le port est 0 ou déjà utilisé (ex: un autre processus l'expose déjà).
+    """
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    except OSError:
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-server").start()
+    return server
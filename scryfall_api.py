@@ -1,9 +1,71 @@
 # scryfall_api.py
 
+import json
+import os
+import random
+import threading
 import requests
 import time
+from contextlib import contextmanager
 import streamlit as st
-from config import SCRYFALL_RATE_LIMIT_DELAY, SCRYFALL_BATCH_SIZE # SCRYFALL_CACHE_FILE retiré
+from card_database import (build_card_database, close_card_database, open_card_database, read_all_cards,
+                           get_card_database_flags, get_bulk_data_keys, lookup_cards_by_keys, get_card_by_print,
+                           get_card_by_name)
+from metrics import increment, observe
+from config import (SCRYFALL_API_URL, MTG_COLOR_ORDER, SCRYFALL_RATE_LIMIT_DELAY, SCRYFALL_BATCH_SIZE, SCRYFALL_CACHE_FILE, SCRYFALL_REQUEST_TIMEOUT,
+                    SCRYFALL_MAX_RETRIES, SCRYFALL_BACKOFF_BASE, SCRYFALL_BACKOFF_MAX, CARD_DATABASE_COMPACT_THRESHOLD)
+
+SCRYFALL_NAMED_URL = f"{SCRYFALL_API_URL}/cards/named"
+SCRYFALL_COLLECTION_URL = f"{SCRYFALL_API_URL}/cards/collection"
+
+COLOR_MASK_BITS = {c: 1 << i for i, c in enumerate(MTG_COLOR_ORDER)}
+
+# Codes HTTP considérés comme transitoires : on réessaie plutôt que de déclarer les cartes manquantes
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Codes d'un lot rejeté à cause de son contenu (identifiant mal formé) : seuls ceux-ci justifient de couper le lot
+MALFORMED_BATCH_STATUS_CODES = {400, 422}
+
+
+class ScryfallIncompleteFetchError(Exception):
+    """
+    Levée par les fonctions en cache lorsque des erreurs transitoires persistent après toutes les tentatives.
+    Une exception n'étant jamais mise en cache par Streamlit, le prochain appel réessaiera les cartes en échec
+    (les cartes déjà résolues sont reprises depuis les points de reprise).
+    """
+    def __init__(self, found_cards_details, missing_cards):
+        super().__init__(f"{len(missing_cards)} cartes n'ont pas pu être récupérées (erreurs transitoires).")
+        self.found_cards_details = found_cards_details
+        self.missing_cards = missing_cards
+
+
+class ScryfallRequestCancelledError(Exception):
+    """Levée à la place d'une requête Scryfall lorsque le travail qui l'a demandée a été annulé (voir build_jobs)."""
+
+
+# Événement d'annulation du travail en arrière-plan exécuté par ce thread (voir cancel_scryfall_requests_on)
+_request_context = threading.local()
+
+@contextmanager
+def cancel_scryfall_requests_on(cancel_event):
+    """
+    Dans ce bloc et ce thread, plus aucune requête Scryfall n'est envoyée une fois `cancel_event` levé :
+    la requête suivante (ou l'attente avant une nouvelle tentative) lève ScryfallRequestCancelledError.
+    Les lots déjà résolus restent dans les points de reprise.
+    """
+    _request_context.cancel_event = cancel_event
+    try:
+        yield
+    finally:
+        _request_context.cancel_event = None
+
+def _wait_before_request(delay):
+    """Attend `delay` secondes, en s'interrompant si le travail du thread courant est annulé."""
+    cancel_event = getattr(_request_context, 'cancel_event', None)
+    if cancel_event is None:
+        time.sleep(delay)
+    elif cancel_event.wait(delay):
+        raise ScryfallRequestCancelledError()
+
 
 # _get_cache_key est ici car il est fondamental pour la génération de clés
 def _get_cache_key(card_identifier):
@@ -17,78 +79,405 @@ def _get_cache_key(card_identifier):
     collector_number = card_identifier.get('collector_number', 'N/A')
     return f"{name} ({set_code}) {collector_number}"
 
-# load_cache et save_cache sont gérés par Streamlit
-# clear_cache est déplacé dans main.py
+# --- Points de reprise des requêtes collection ---
+# Chaque lot résolu est ajouté au fichier SCRYFALL_CACHE_FILE (JSON Lines) : un téléchargement de 20k cartes
+# interrompu reprend là où il s'était arrêté au lieu de tout recommencer.
+# Au-delà de CARD_DATABASE_COMPACT_THRESHOLD cartes, elles sont intégrées à la base binaire (card_database.py)
+# et le fichier est vidé : le démarrage d'un processus ne relit donc jamais qu'un petit fichier.
+# clear_cache_main (main.py) supprime les fichiers et appelle clear_resolved_cards_store.
+
+_resolved_cards_store = None # {cache_key: card_data ou None si Scryfall a répondu 'not_found'}
+_resolved_cards_lock = threading.Lock()
+
+def _load_resolved_cards_store():
+    """Charge (une seule fois par processus) les cartes déjà résolues depuis le fichier de points de reprise."""
+    global _resolved_cards_store
+    with _resolved_cards_lock:
+        if _resolved_cards_store is None:
+            _resolved_cards_store = {}
+            if os.path.exists(SCRYFALL_CACHE_FILE):
+                with open(SCRYFALL_CACHE_FILE, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue # Ligne tronquée par une interruption pendant l'écriture
+                        _resolved_cards_store[entry['key']] = entry['card']
+        return _resolved_cards_store
+
+def _checkpoint_resolved_cards(resolved_entries):
+    """Ajoute au fichier de points de reprise les cartes résolues par un lot ({cache_key: card_data ou None})."""
+    if not resolved_entries:
+        return
+    store = _load_resolved_cards_store()
+    with _resolved_cards_lock:
+        store.update(resolved_entries)
+        try:
+            with open(SCRYFALL_CACHE_FILE, "a", encoding="utf-8") as f:
+                for key, card_data in resolved_entries.items():
+                    f.write(json.dumps({'key': key, 'card': card_data}) + "\n")
+        except OSError:
+            pass # Le point de reprise est une optimisation : on garde les résultats en mémoire
+
+def clear_resolved_cards_store():
+    """Oublie les cartes résolues conservées en mémoire (les fichiers sont supprimés par l'appelant)."""
+    global _resolved_cards_store
+    with _resolved_cards_lock:
+        _resolved_cards_store = None
+    close_card_database()
+
+def compact_resolved_cards_store():
+    """
+    Intègre les cartes des points de reprise à la base binaire, puis vide le fichier de points de reprise.
+    Retourne le nombre de cartes de la base.
+    Entre processus, une carte ajoutée pendant l'intégration peut être perdue : elle sera simplement redemandée.
+    """
+    global _resolved_cards_store
+    store = _load_resolved_cards_store()
+    with _resolved_cards_lock:
+        cards_by_key = read_all_cards()
+        cards_by_key.update(store)
+        card_count = build_card_database(cards_by_key, database_flags=get_card_database_flags(), # Garde l'import en masse
+                                         bulk_data_keys=get_bulk_data_keys())
+        try:
+            open(SCRYFALL_CACHE_FILE, "w", encoding="utf-8").close()
+        except OSError:
+            pass
+        _resolved_cards_store = {}
+    return card_count
+
+# --- Requêtes HTTP avec nouvelles tentatives ---
+
+def _get_retry_delay(attempt, response=None):
+    """
+    Délai avant la prochaine tentative : respecte l'en-tête Retry-After d'une réponse 429,
+    sinon backoff exponentiel plafonné avec jitter ("full jitter").
+    """
+    if response is not None and response.status_code == 429:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return min(float(retry_after), SCRYFALL_BACKOFF_MAX)
+            except ValueError:
+                pass
+    return random.uniform(0, min(SCRYFALL_BACKOFF_MAX, SCRYFALL_BACKOFF_BASE * (2 ** attempt)))
+
+def _request_with_retry(method, url, **kwargs):
+    """
+    Envoie une requête HTTP en réessayant les erreurs transitoires (connexion, timeout, 429, 5xx).
+    Retourne la réponse (éventuellement en erreur 4xx non transitoire, à traiter par l'appelant).
+    Lève requests.exceptions.RequestException si les erreurs persistent après SCRYFALL_MAX_RETRIES tentatives,
+    ScryfallRequestCancelledError si le travail du thread courant a été annulé (voir cancel_scryfall_requests_on).
+    """
+    kwargs.setdefault('timeout', SCRYFALL_REQUEST_TIMEOUT)
+    endpoint = url.rstrip('/').rsplit('/', 1)[-1] # 'named' ou 'collection'
+    for attempt in range(SCRYFALL_MAX_RETRIES + 1):
+        _wait_before_request(0)
+        start = time.perf_counter()
+        try:
+            response = requests.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            observe('scryfall_request_seconds', time.perf_counter() - start, endpoint=endpoint)
+            increment('scryfall_requests_total', endpoint=endpoint, status='error')
+            if attempt == SCRYFALL_MAX_RETRIES:
+                raise
+            increment('scryfall_retries_total', endpoint=endpoint)
+            _wait_before_request(_get_retry_delay(attempt))
+            continue
+        observe('scryfall_request_seconds', time.perf_counter() - start, endpoint=endpoint)
+        increment('scryfall_requests_total', endpoint=endpoint, status=str(response.status_code))
+
+        if response.status_code in RETRYABLE_STATUS_CODES and attempt < SCRYFALL_MAX_RETRIES:
+            increment('scryfall_retries_total', endpoint=endpoint)
+            _wait_before_request(_get_retry_delay(attempt, response))
+            continue
+        return response
+
+# --- Requêtes en vol partagées (single-flight) ---
+# st.cache_data ne déduplique qu'une fois l'appel terminé : deux sessions (ou deux chemins d'une même exécution)
+# qui demandent la même carte au même moment enverraient chacune leur requête. Chaque carte demandée a donc
+# un "vol" partagé tant qu'elle n'est pas résolue : les appels concurrents l'attendent au lieu de la redemander.
+# Les cartes à demander par /cards/collection passent par une file commune : le thread qui envoie un lot y prend
+# jusqu'à SCRYFALL_BATCH_SIZE cartes, quelle que soit la session qui les a demandées, si bien que des lots qui
+# se chevauchent ou arrivent ensemble partent en une seule requête. Un thread annulé remet son lot dans la file.
+
+_flights = {
+    'condition': threading.Condition(),
+    'named': {}, # nom -> vol
+    'collection': {}, # clé d'inventaire -> vol
+    'pending': {}, # clé d'inventaire -> identifiant, cartes de la file pas encore envoyées (dans l'ordre d'arrivée)
+}
+
+def _make_flight():
+    return {'done': False, 'status': None, 'result': None, 'error': None}
+
+def _wait_for_flights(flights, pending_ready=False):
+    """
+    Attend qu'un vol de `flights` se termine (ou, si `pending_ready`, que la file contienne des cartes à envoyer).
+    Doit être appelée avec la condition acquise ; s'interrompt si le travail du thread courant est annulé.
+    """
+    condition = _flights['condition']
+    cancel_event = getattr(_request_context, 'cancel_event', None)
+    is_ready = lambda: any(flight['done'] for flight in flights) or (pending_ready and bool(_flights['pending']))
+    while not is_ready():
+        condition.wait(0.1 if cancel_event is not None else None)
+        if cancel_event is not None and cancel_event.is_set():
+            raise ScryfallRequestCancelledError()
+
+def _run_single_flight(card_name, function):
+    """Exécute `function()` pour `card_name`, ou attend et partage le résultat d'un appel déjà en cours."""
+    condition = _flights['condition']
+    with condition:
+        flight = _flights['named'].get(card_name)
+        is_leader = flight is None
+        if is_leader:
+            flight = _flights['named'][card_name] = _make_flight()
+        else:
+            increment('scryfall_coalesced_total', endpoint='named')
+            _wait_for_flights([flight])
+    if not is_leader:
+        if isinstance(flight['error'], ScryfallRequestCancelledError):
+            return _run_single_flight(card_name, function) # Seul le travail qui l'envoyait a été annulé
+        if flight['error'] is not None:
+            raise flight['error']
+        return flight['result']
+
+    try:
+        flight['result'] = function()
+        return flight['result']
+    except BaseException as e:
+        flight['error'] = e
+        raise
+    finally:
+        with condition:
+            del _flights['named'][card_name]
+            flight['done'] = True
+            condition.notify_all()
+
+def _join_collection_flights(card_identifiers):
+    """
+    Vols des cartes à demander par /cards/collection : ceux déjà en cours sont partagés, les autres sont créés
+    et leurs identifiants ajoutés à la file commune. Retourne {clé d'inventaire: vol}.
+    """
+    flights_by_key = {}
+    with _flights['condition']:
+        for ident in card_identifiers:
+            key = _get_cache_key(ident)
+            flight = _flights['collection'].get(key)
+            if flight is None:
+                flight = _flights['collection'][key] = _make_flight()
+                _flights['pending'][key] = ident
+            elif key not in flights_by_key:
+                increment('scryfall_coalesced_total', endpoint='collection')
+            flights_by_key[key] = flight
+        _flights['condition'].notify_all()
+    return flights_by_key
+
+def _take_pending_batch():
+    """Retire de la file commune un lot d'au plus SCRYFALL_BATCH_SIZE identifiants (les plus anciens d'abord)."""
+    pending = _flights['pending']
+    batch_keys = list(pending)[:SCRYFALL_BATCH_SIZE]
+    return [pending.pop(key) for key in batch_keys]
+
+def _fetch_pending_batch(batch):
+    """Envoie un lot pris dans la file et termine les vols de ses cartes ; en cas d'annulation, le lot retourne dans la file."""
+    found_cards_details, missing_cards, failed_cards = {}, [], []
+    condition = _flights['condition']
+    try:
+        _fetch_collection_batch(batch, found_cards_details, missing_cards, failed_cards)
+    except BaseException:
+        with condition:
+            for ident in batch:
+                _flights['pending'][_get_cache_key(ident)] = ident
+            condition.notify_all()
+        raise
+    missing_keys, failed_keys = set(missing_cards), set(failed_cards)
+    with condition:
+        for ident in batch:
+            key = _get_cache_key(ident)
+            flight = _flights['collection'].pop(key)
+            if key in found_cards_details:
+                flight['status'], flight['result'] = 'found', found_cards_details[key]
+            elif key in missing_keys:
+                flight['status'] = 'missing'
+            elif key in failed_keys:
+                flight['status'] = 'failed'
+            # Sinon : Scryfall a répondu sans que l'impression corresponde à la carte demandée (statut None)
+            flight['done'] = True
+        condition.notify_all()
 
 @st.cache_data(ttl=3600*24)
+def _get_card_details_scryfall_cached(card_name):
+    increment('cache_misses_total', function='get_card_details_scryfall')
+    try:
+        response = _request_with_retry("GET", SCRYFALL_NAMED_URL, params={"exact": card_name})
+    except requests.exceptions.RequestException:
+        raise ScryfallIncompleteFetchError({}, [card_name])
+    time.sleep(SCRYFALL_RATE_LIMIT_DELAY)
+    if response.status_code in RETRYABLE_STATUS_CODES:
+        raise ScryfallIncompleteFetchError({}, [card_name])
+    if not response.ok:
+        return None # 404 : la carte n'existe pas, résultat stable que l'on peut mettre en cache
+    return response.json()
+
 def get_card_details_scryfall(card_name):
     """
     Récupère les détails d'une carte depuis l'API Scryfall par son NOM.
-    Utilise le cache de Streamlit.
+    Utilise le cache de Streamlit (les échecs transitoires ne sont pas mis en cache).
     NOTE: Cette fonction ne garantit pas la version exacte si plusieurs impressions existent.
     Elle est utilisée pour le commandant et pour les statistiques finales qui n'ont que le nom.
+    Une carte déjà présente dans la base binaire est lue directement, sans requête.
     """
-    base_url = "https://api.scryfall.com/cards/named"
-    params = {"exact": card_name}
-    
-    try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        card_data = response.json()
-        time.sleep(SCRYFALL_RATE_LIMIT_DELAY)
+    card_data = get_card_by_name(card_name)
+    if card_data is not None:
+        increment('card_database_hits_total')
         return card_data
-    except requests.exceptions.RequestException:
+    increment('cache_calls_total', function='get_card_details_scryfall')
+    try:
+        return _run_single_flight(card_name, lambda: _get_card_details_scryfall_cached(card_name))
+    except ScryfallIncompleteFetchError:
         return None
 
-@st.cache_data(ttl=3600*24)
-def get_card_details_batch_scryfall(card_identifiers):
+def _fetch_collection_batch(batch, found_cards_details, missing_cards, failed_cards):
     """
-    Récupère les détails de plusieurs cartes en utilisant l'endpoint /cards/collection.
-    Prend une liste de dictionnaires d'identifiants.
-    Utilise le cache de Streamlit.
+    Résout un lot d'identifiants via /cards/collection.
+    Un lot rejeté (400 ou 422) à cause d'un identifiant mal formé est coupé en deux jusqu'à isoler l'entrée fautive.
+    Les identifiants encore en échec transitoire après les nouvelles tentatives, ou refusés par une autre erreur,
+    vont dans failed_cards ; seules les réponses 200 sont enregistrées dans les points de reprise.
+    """
+    try:
+        response = _request_with_retry("POST", SCRYFALL_COLLECTION_URL, json={"identifiers": batch})
+    except requests.exceptions.RequestException:
+        failed_cards.extend(_get_cache_key(ident) for ident in batch)
+        return
+    time.sleep(SCRYFALL_RATE_LIMIT_DELAY)
+
+    if response.status_code in MALFORMED_BATCH_STATUS_CODES:
+        if len(batch) == 1:
+            # Identifiant fautif isolé : manquant pour cette résolution, mais pas mis en point de reprise,
+            # car seul un 200 de Scryfall établit durablement qu'une carte n'existe pas
+            missing_cards.append(_get_cache_key(batch[0]))
+            return
+        middle = len(batch) // 2
+        _fetch_collection_batch(batch[:middle], found_cards_details, missing_cards, failed_cards)
+        _fetch_collection_batch(batch[middle:], found_cards_details, missing_cards, failed_cards)
+        return
+    if not response.ok:
+        # Erreur transitoire persistante ou refus global (401, 403, 404...) : tout le lot est en échec, sans point de reprise
+        failed_cards.extend(_get_cache_key(ident) for ident in batch)
+        return
+
+    response_data = response.json()
+
+    # Associe chaque carte retournée à l'identifiant demandé (le set + numéro de collection est unique),
+    # pour que la clé corresponde à celle de l'inventaire même si Scryfall renvoie un nom plus complet.
+    requested_keys_by_print = {(str(ident.get('set', '')).upper(), str(ident.get('collector_number', ''))): _get_cache_key(ident)
+                               for ident in batch}
+    resolved_entries = {}
+    for card_data in response_data.get('data', []):
+        card_name = card_data.get('name')
+        set_code = card_data.get('set', '').upper()
+        collector_number = card_data.get('collector_number')
+        precise_cache_key = requested_keys_by_print.get((set_code, collector_number),
+                                                        f"{card_name} ({set_code}) {collector_number}")
+        found_cards_details[precise_cache_key] = card_data
+        resolved_entries[precise_cache_key] = card_data
+
+    for missing_ident in response_data.get('not_found', []):
+        missing_key = _get_cache_key(missing_ident)
+        missing_cards.append(missing_key)
+        resolved_entries[missing_key] = None
+
+    _checkpoint_resolved_cards(resolved_entries)
+
+def fetch_card_collection(card_identifiers, progress_callback=None):
+    """
+    Résout une liste de dictionnaires d'identifiants, en reprenant les cartes déjà résolues
+    depuis les points de reprise et en ne requêtant que les autres, par lots de SCRYFALL_BATCH_SIZE.
+    `progress_callback(resolved_count, total_count)` est appelé après chaque lot si fourni.
+    Retourne (found_cards_details, missing_cards, failed_cards), failed_cards listant les échecs transitoires.
     """
     found_cards_details = {}
     missing_cards = []
-    identifiers_to_fetch = card_identifiers 
+    failed_cards = []
 
-    if not identifiers_to_fetch:
-        return found_cards_details, missing_cards
+    # Cartes déjà résolues : points de reprise, puis base binaire (par clé en une recherche, puis par impression)
+    store = _load_resolved_cards_store()
+    database = open_card_database()
+    card_keys = [_get_cache_key(ident) for ident in card_identifiers]
+    database_cards = lookup_cards_by_keys([key for key in card_keys if key not in store], database)
+    identifiers_to_fetch = []
+    database_hit_count = len(database_cards)
+    for ident, key in zip(card_identifiers, card_keys):
+        if key in store:
+            card_data = store[key]
+        elif key in database_cards:
+            card_data = database_cards[key]
+        else:
+            card_data = get_card_by_print(ident.get('set', ''), ident.get('collector_number', ''), database) if database else None
+            if card_data is None:
+                identifiers_to_fetch.append(ident)
+                continue
+            database_hit_count += 1
+        if card_data is None:
+            missing_cards.append(key)
+        else:
+            found_cards_details[key] = card_data
+    if database_hit_count:
+        increment('card_database_hits_total', database_hit_count)
 
-    base_url = "https://api.scryfall.com/cards/collection"
-    
-    for i in range(0, len(identifiers_to_fetch), SCRYFALL_BATCH_SIZE):
-        batch = identifiers_to_fetch[i : i + SCRYFALL_BATCH_SIZE]
-        try:
-            response = requests.post(base_url, json={"identifiers": batch})
-            response.raise_for_status()
-            
-            response_data = response.json()
-            
-            for card_data in response_data.get('data', []):
-                card_name = card_data.get('name')
-                set_code = card_data.get('set')
-                collector_number = card_data.get('collector_number')
-                precise_cache_key = f"{card_name} ({set_code.upper()}) {collector_number}"
-                
-                found_cards_details[precise_cache_key] = card_data
-            
-            for missing_ident in response_data.get('not_found', []):
-                missing_name = missing_ident.get('name', 'N/A')
-                missing_set = missing_ident.get('set', 'N/A')
-                missing_cn = missing_ident.get('collector_number', 'N/A')
-                missing_cards.append(f"{missing_name} ({missing_set}) {missing_cn}")
-
-            time.sleep(SCRYFALL_RATE_LIMIT_DELAY)
-
-        except requests.exceptions.RequestException as e:
-            for ident in batch:
-                missing_name = ident.get('name', 'N/A')
-                missing_set = ident.get('set', 'N/A')
-                missing_cn = ident.get('collector_number', 'N/A')
-                missing_cards.append(f"{missing_name} ({missing_set}) {missing_cn}")
-    
+    # Les autres passent par la file commune (voir _join_collection_flights) : ce thread envoie des lots tant
+    # qu'elle n'est pas vide, puis attend les cartes que d'autres threads sont en train de résoudre.
+    total_count = len(card_identifiers)
+    flights_by_key = _join_collection_flights(identifiers_to_fetch)
+    unfinished_flights = list(flights_by_key.values())
+    while unfinished_flights:
+        if progress_callback:
+            progress_callback(total_count - len(unfinished_flights), total_count)
+        with _flights['condition']:
+            _wait_for_flights(unfinished_flights, pending_ready=True)
+            batch = _take_pending_batch()
+        if batch:
+            _fetch_pending_batch(batch)
+        unfinished_flights = [flight for flight in unfinished_flights if not flight['done']]
+    for key, flight in flights_by_key.items():
+        if flight['status'] == 'found':
+            found_cards_details[key] = flight['result']
+        elif flight['status'] == 'missing':
+            missing_cards.append(key)
+        elif flight['status'] == 'failed':
+            failed_cards.append(key)
+    if progress_callback:
+        progress_callback(total_count, total_count)
+
+    if identifiers_to_fetch and len(store) >= CARD_DATABASE_COMPACT_THRESHOLD:
+        compact_resolved_cards_store()
+
+    return found_cards_details, missing_cards, failed_cards
+
+@st.cache_data(ttl=3600*24)
+def _get_card_details_batch_scryfall_cached(card_identifiers):
+    increment('cache_misses_total', function='get_card_details_batch_scryfall')
+    found_cards_details, missing_cards, failed_cards = fetch_card_collection(card_identifiers)
+    if failed_cards:
+        raise ScryfallIncompleteFetchError(found_cards_details, missing_cards + failed_cards)
     return found_cards_details, missing_cards
 
+def get_card_details_batch_scryfall(card_identifiers):
+    """
+    Récupère les détails de plusieurs cartes en utilisant l'endpoint /cards/collection.
+    Prend une liste de dictionnaires d'identifiants.
+    Utilise le cache de Streamlit ; un résultat incomplet (erreurs transitoires persistantes) n'est pas
+    mis en cache, et le prochain appel ne requêtera que les cartes encore en échec.
+    """
+    if not card_identifiers:
+        return {}, []
+    increment('cache_calls_total', function='get_card_details_batch_scryfall')
+    try:
+        return _get_card_details_batch_scryfall_cached(card_identifiers)
+    except ScryfallIncompleteFetchError as e:
+        return e.found_cards_details, e.missing_cards
+
 
 def get_color_identity(card_data):
     """Extrait l'identité couleur d'une carte à partir de ses données Scryfall."""
@@ -96,6 +485,28 @@ def get_color_identity(card_data):
         return set(card_data['color_identity'])
     return set()
 
+def colors_to_mask(colors):
+    """Convertit un ensemble de couleurs ('W', 'U', ...) en masque de bits (W=1, U=2, B=4, R=8, G=16)."""
+    return sum(COLOR_MASK_BITS.get(c, 0) for c in set(colors))
+
+def get_color_mask(card_data):
+    """Retourne l'identité couleur d'une carte sous forme de masque de bits (0 = incolore)."""
+    return colors_to_mask(get_color_identity(card_data))
+
+def get_creature_subtypes(card_data):
+    """
+    Extrait les sous-types de créature de la ligne de type (toutes faces confondues).
+    Ex: 'Legendary Creature — Elf Druid' -> ['Elf', 'Druid'].
+    """
+    subtypes = []
+    for face_type_line in card_data.get('type_line', '').split(' // '):
+        if ' — ' not in face_type_line:
+            continue
+        main_types, face_subtypes = face_type_line.split(' — ', 1)
+        if 'Creature' in main_types or 'Kindred' in main_types or 'Tribal' in main_types:
+            subtypes.extend(t for t in face_subtypes.split() if t not in subtypes)
+    return subtypes
+
 def is_basic_land(card_data):
     """Vérifie si une carte est un terrain de base."""
     return card_data and 'type_line' in card_data and "Basic Land" in card_data['type_line']
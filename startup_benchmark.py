@@ -0,0 +1,149 @@
+# startup_benchmark.py
+
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# Mesure du démarrage à froid : chaque répétition lance un processus neuf (comme un worker Streamlit qui démarre),
+# importe Streamlit puis exécute main.py une première fois sans navigateur (AppTest), jusqu'au premier rendu.
+# Un hook d'audit note les modules importés sur le chemin critique (hors threads d'arrière-plan) : les modules
+# lourds (numpy, requests, pyperclip, matplotlib) et ceux de l'application doivent en être absents.
+#
+#   python startup_benchmark.py --repeats 5 --json apres.json
+#   python startup_benchmark.py --script /tmp/main_avant.py --json avant.json
+
+APP_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+MAIN_SCRIPT_PATH = os.path.join(APP_DIRECTORY, 'main.py')
+HEAVY_MODULES = ('numpy', 'requests', 'pyperclip', 'matplotlib',
+                 'scryfall_api', 'card_classifier', 'commander_browser', 'card_search', 'deck_builder', 'build_jobs',
+                 'deck_validator', 'upgrade_suggestions', 'collection_analytics')
+# Threads d'arrière-plan lancés par main.py : leurs imports ne retardent pas le premier rendu
+BACKGROUND_THREAD_NAMES = ('app-modules-warm-up', 'clipboard-detection')
+
+def _run_startup_process(script_path, working_directory, result_queue):
+    """Processus d'une répétition : mesure l'import de Streamlit, le premier rendu et une réexécution."""
+    process_start = time.time()
+    critical_path_modules = set()
+
+    def record_import(event, args):
+        if event == 'import' and threading.current_thread().name not in BACKGROUND_THREAD_NAMES:
+            critical_path_modules.add(args[0].split('.')[0])
+
+    os.chdir(working_directory)
+    os.environ.setdefault('STREAMLIT_LOGGER_LEVEL', 'error') # Sans les avertissements propres à AppTest
+    sys.path.insert(0, APP_DIRECTORY)
+    sys.addaudithook(record_import)
+    import config
+    config.MANA_SYMBOLS_PATH = os.path.join(APP_DIRECTORY, config.MANA_SYMBOLS_PATH)
+    config.METRICS_PORT = 0
+    streamlit_import_start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    streamlit_import_seconds = time.perf_counter() - streamlit_import_start
+    critical_path_modules.clear() # Seuls les imports faits par le script comptent
+
+    app_test = AppTest.from_file(script_path, default_timeout=120)
+    first_render_start = time.perf_counter()
+    app_test.run()
+    first_render_seconds = time.perf_counter() - first_render_start
+    first_render_at = time.time()
+    first_render_modules = sorted(critical_path_modules & set(HEAVY_MODULES))
+
+    # Modules différés prêts (thread de préchauffage terminé), s'il y en a un
+    deferred_ready_seconds = None
+    warm_up_thread = next((thread for thread in threading.enumerate() if thread.name == 'app-modules-warm-up'), None)
+    if warm_up_thread is not None:
+        warm_up_thread.join()
+        deferred_ready_seconds = time.time() - process_start
+
+    rerun_start = time.perf_counter()
+    app_test.run()
+    rerun_seconds = time.perf_counter() - rerun_start
+    result_queue.put({
+        'process_start': process_start,
+        'first_render_at': first_render_at,
+        'streamlit_import_seconds': streamlit_import_seconds,
+        'first_render_seconds': first_render_seconds,
+        'deferred_ready_seconds': deferred_ready_seconds,
+        'rerun_seconds': rerun_seconds,
+        'critical_path_modules': first_render_modules,
+        'errors': [str(exception.value) for exception in app_test.exception],
+    })
+
+def run_startup_benchmark(repeats=5, script_path=MAIN_SCRIPT_PATH, timeout=300):
+    """
+    Lance `repeats` démarrages à froid de `script_path`, un processus neuf chacun.
+    Retourne le rapport (dictionnaire sérialisable en JSON) avec les médianes de chaque mesure.
+    """
+    context = multiprocessing.get_context('spawn')
+    runs = []
+    with tempfile.TemporaryDirectory(prefix="autodeck_startup_") as working_directory:
+        for _ in range(repeats):
+            result_queue = context.Queue()
+            process = context.Process(target=_run_startup_process, name="startup-benchmark",
+                                      args=(script_path, working_directory, result_queue))
+            spawned_at = time.time()
+            process.start()
+            try:
+                run = result_queue.get(timeout=timeout)
+                process.join()
+            finally:
+                if process.is_alive():
+                    process.terminate()
+            run['time_to_first_render_seconds'] = run['first_render_at'] - spawned_at
+            run['interpreter_start_seconds'] = run['process_start'] - spawned_at
+            runs.append(run)
+
+    def median_of(name):
+        values = [run[name] for run in runs if run[name] is not None]
+        return statistics.median(values) if values else None
+
+    measures = ('time_to_first_render_seconds', 'interpreter_start_seconds', 'streamlit_import_seconds',
+                'first_render_seconds', 'deferred_ready_seconds', 'rerun_seconds')
+    return {
+        'parameters': {'repeats': repeats, 'script_path': script_path},
+        'medians': {name: median_of(name) for name in measures},
+        'critical_path_modules': sorted({module for run in runs for module in run['critical_path_modules']}),
+        'errors': sorted({error for run in runs for error in run['errors']}),
+        'runs': runs,
+    }
+
+def format_report(report):
+    """Rapport lisible de la mesure du démarrage."""
+    medians = report['medians']
+    labels = {
+        'time_to_first_render_seconds': "Lancement du processus -> premier rendu",
+        'interpreter_start_seconds': "  dont démarrage de l'interpréteur",
+        'streamlit_import_seconds': "  dont import de Streamlit",
+        'first_render_seconds': "  dont première exécution de main.py",
+        'deferred_ready_seconds': "Modules différés prêts (depuis le démarrage)",
+        'rerun_seconds': "Réexécution suivante",
+    }
+    lines = [f"Démarrages à froid : {report['parameters']['repeats']} ({report['parameters']['script_path']}), médianes :"]
+    for name, label in labels.items():
+        value = medians[name]
+        lines.append(f"{label:<46} {'-' if value is None else f'{value:.3f} s':>9}")
+    lines.append("")
+    lines.append("Modules lourds importés avant le premier rendu : " + (", ".join(report['critical_path_modules']) or "aucun"))
+    for error in report['errors']:
+        lines.append(f"Erreur : {error}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mesure du démarrage à froid de l'application (temps jusqu'au premier rendu).")
+    parser.add_argument('--repeats', type=int, default=5, help="Nombre de démarrages (un processus neuf chacun)")
+    parser.add_argument('--script', dest='script_path', default=MAIN_SCRIPT_PATH, help="Script mesuré (par défaut main.py)")
+    parser.add_argument('--timeout', type=float, default=300, help="Délai maximal (s) d'un démarrage")
+    parser.add_argument('--json', dest='json_path', help="Écrit aussi le rapport en JSON (pour comparer deux versions)")
+    args = parser.parse_args()
+
+    startup_report = run_startup_benchmark(args.repeats, os.path.abspath(args.script_path), args.timeout)
+    print(format_report(startup_report))
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(startup_report, f, indent=2)
@@ -0,0 +1,55 @@
+# ui_assets.py
+
+import base64
+import os
+import threading
+from functools import lru_cache
+
+from config import MANA_SYMBOLS_PATH
+
+# Ressources statiques de l'interface, préparées une fois par processus : main.py est réexécuté à chaque
+# interaction, pas ce module. Rien n'est fait à l'import : les symboles sont encodés à leur premier affichage
+# et le presse-papiers est détecté dans un thread (voir start_clipboard_detection).
+
+@lru_cache(maxsize=None)
+def get_mana_symbol_html(symbol, size_px=20):
+    """Balise <img> du symbole de mana `symbol` (SVG encodé en base64), ou '(symbole)' si le fichier manque."""
+    filepath = os.path.join(MANA_SYMBOLS_PATH, f"{symbol.upper()}.svg")
+    try:
+        with open(filepath, "rb") as f:
+            svg_content = f.read()
+    except OSError:
+        return f"({symbol})" # Fallback si le fichier n'est pas trouvé
+    encoded_svg = base64.b64encode(svg_content).decode('utf-8')
+    return f'<img src="data:image/svg+xml;base64,{encoded_svg}" width="{size_px}" height="{size_px}" style="vertical-align: middle; margin: 0 1px;">'
+
+# --- Presse-papiers ---
+# pyperclip cherche un mécanisme de copie (xclip, xsel, wl-copy... via des processus externes) : la détection
+# se fait une fois, en arrière-plan, sans écrire dans le presse-papiers de l'utilisateur.
+
+_clipboard = {'lock': threading.Lock(), 'started': False, 'detected_event': threading.Event(), 'copy': None}
+
+def _detect_clipboard():
+    try:
+        import pyperclip # Import paresseux : inutile tant qu'aucun deck n'est affiché
+        copy_function, _ = pyperclip.determine_clipboard()
+        # Sans mécanisme disponible, pyperclip retourne un objet évalué à False
+        _clipboard['copy'] = copy_function if copy_function else None
+    except Exception:
+        _clipboard['copy'] = None
+    finally:
+        _clipboard['detected_event'].set()
+
+def start_clipboard_detection():
+    """Lance la détection du presse-papiers dans un thread, une seule fois par processus."""
+    with _clipboard['lock']:
+        if _clipboard['started']:
+            return
+        _clipboard['started'] = True
+    threading.Thread(target=_detect_clipboard, daemon=True, name="clipboard-detection").start()
+
+def get_clipboard_copy():
+    """Fonction de copie dans le presse-papiers, ou None s'il n'est pas disponible (ex: serveur sans affichage)."""
+    start_clipboard_detection()
+    _clipboard['detected_event'].wait()
+    return _clipboard['copy']
@@ -0,0 +1,143 @@
+# upgrade_suggestions.py
+
+import heapq
+
+import numpy as np
+import streamlit as st
+
+from card_database import (open_card_database, get_card_database_version, get_card_database_flags, read_string_column,
+                           COMMANDER_LEGALITIES, FLAG_FOUND, DATABASE_FLAG_BULK_DATA)
+from card_classifier import classify_card
+from scryfall_api import colors_to_mask
+from config import CATEGORY_KEYWORDS, CARD_CATEGORIES_RATIOS, UPGRADE_SUGGESTIONS_PER_CATEGORY
+
+# Suggestions d'achat : pour chaque catégorie sous-représentée d'un deck, les meilleures cartes absentes de
+# l'inventaire, dans l'identité couleur du commandant et, si possible, dans sa stratégie.
+# Elles viennent d'un index sur toute la base de cartes (card_database.py, alimentée par les données en masse
+# Scryfall), construit une fois par version du fichier : une carte par nom, légale en Commander, hors terrains.
+# Sans import en masse, la base ne contient que les cartes des inventaires déjà résolus : il n'y a rien à suggérer.
+# Les cartes y sont numérotées par popularité (rang EDHREC) ; chaque partition (masque d'identité exact,
+# catégorie, stratégie ou None) est la liste croissante de ces numéros, donc déjà triée. Une suggestion fusionne
+# les listes des sous-masques de l'identité du commandant (au plus 32) au lieu de parcourir toute la base.
+
+UPGRADE_CATEGORIES = ['ramp', 'draw', 'spot_removal', 'board_wipe', 'threat']
+STRATEGY_CATEGORIES = frozenset(category for category in CATEGORY_KEYWORDS if category not in CARD_CATEGORIES_RATIOS)
+UPGRADE_CATEGORY_LABELS = {
+    'ramp': "Rampe de mana", 'draw': "Pioche de cartes", 'spot_removal': "Gestion ciblée",
+    'board_wipe': "Gestion de masse", 'threat': "Menaces",
+}
+
+def build_upgrade_index(database):
+    """
+    Construit l'index des suggestions à partir de la base ouverte (voir open_card_database) :
+    'names', 'type_lines', 'prices' et 'edhrec_ranks' (une entrée par nom, de la plus populaire à la moins populaire)
+    et 'partitions' ({(masque, catégorie, stratégie ou None): numéros d'entrées croissants}).
+    """
+    columns = database['columns']
+    legal = ((columns['flags'] & FLAG_FOUND) != 0) & (columns['commander_legality'] == COMMANDER_LEGALITIES.index('legal'))
+    record_indices = np.flatnonzero(legal)
+    # Une impression par nom : les noms identiques partagent leur position dans la table de chaînes
+    _, first_positions = np.unique(columns['name_offset'][record_indices], return_index=True)
+    record_indices = record_indices[first_positions]
+    edhrec_ranks = columns['edhrec_rank'][record_indices].astype(np.int64)
+    edhrec_ranks[edhrec_ranks < 0] = np.iinfo(np.int32).max # Sans rang : après les cartes classées
+    record_indices = record_indices[np.argsort(edhrec_ranks, kind='stable')]
+
+    type_lines = read_string_column('type_line', record_indices, database)
+    oracle_texts = read_string_column('oracle_text', record_indices, database)
+    names = read_string_column('name', record_indices, database)
+    color_masks = (columns['color_identity'][record_indices] & 0b11111).tolist()
+    prices = columns['price_usd'][record_indices].tolist()
+    ranks = columns['edhrec_rank'][record_indices].tolist()
+
+    index = {'names': [], 'type_lines': [], 'prices': [], 'edhrec_ranks': [], 'partitions': {}}
+    partitions = index['partitions']
+    for position, type_line in enumerate(type_lines):
+        if 'Land' in type_line.split(' — ')[0]:
+            continue # Les suggestions portent sur les sorts ; les terrains restent dans les conseils généraux
+        categories = classify_card({'type_line': type_line, 'oracle_text': oracle_texts[position]})
+        upgrade_categories = [category for category in categories if category in UPGRADE_CATEGORIES]
+        if not upgrade_categories:
+            continue
+        entry = len(index['names'])
+        index['names'].append(names[position])
+        index['type_lines'].append(type_line)
+        index['prices'].append(prices[position] if prices[position] == prices[position] else None) # NaN : pas de prix
+        index['edhrec_ranks'].append(ranks[position] if ranks[position] >= 0 else None)
+        color_mask = color_masks[position]
+        strategies = [None] + [category for category in categories if category in STRATEGY_CATEGORIES]
+        for category in upgrade_categories:
+            for strategy in strategies:
+                partitions.setdefault((color_mask, category, strategy), []).append(entry)
+    return index
+
+@st.cache_resource(max_entries=1)
+def _get_upgrade_index(database_version):
+    database = open_card_database()
+    if database is None or not get_card_database_flags(database) & DATABASE_FLAG_BULK_DATA:
+        return None
+    return build_upgrade_index(database)
+
+def load_upgrade_index():
+    """
+    Index des suggestions de la version actuelle de la base, construit une fois par processus
+    (None sans base ou si les données en masse Scryfall n'y ont pas été importées).
+    """
+    database_version = get_card_database_version()
+    return _get_upgrade_index(database_version) if database_version is not None else None
+
+def _get_submasks(color_mask):
+    submask = color_mask
+    while True:
+        yield submask
+        if submask == 0:
+            return
+        submask = (submask - 1) & color_mask
+
+def find_upgrade_cards(upgrade_index, color_mask, category, strategy=None, excluded_names=frozenset(), limit=UPGRADE_SUGGESTIONS_PER_CATEGORY):
+    """
+    Meilleures cartes de `category` jouables dans l'identité `color_mask`, hors `excluded_names` : d'abord celles
+    qui relèvent aussi de `strategy`, puis les autres. Retourne des numéros d'entrées de l'index, par popularité.
+    """
+    partitions = upgrade_index['partitions']
+    names = upgrade_index['names']
+    chosen = []
+    for partition_strategy in ([strategy, None] if strategy in STRATEGY_CATEGORIES else [None]):
+        sorted_lists = [partitions[key] for key in ((submask, category, partition_strategy) for submask in _get_submasks(color_mask))
+                        if key in partitions]
+        for entry in heapq.merge(*sorted_lists):
+            if len(chosen) >= limit:
+                return chosen
+            # L'inventaire ne nomme que la première face des cartes recto-verso
+            if names[entry].split(' // ')[0] not in excluded_names and entry not in chosen:
+                chosen.append(entry)
+    return chosen
+
+def get_deck_upgrade_suggestions(upgrade_index, deck_state, inventory, limit=UPGRADE_SUGGESTIONS_PER_CATEGORY):
+    """
+    Suggestions pour chaque catégorie du deck sous son objectif (CARD_CATEGORIES_RATIOS).
+    Les cartes de l'inventaire et du deck sont exclues.
+    Retourne [{'category', 'label', 'count', 'target', 'cards': [{'name', 'type_line', 'price_usd', 'edhrec_rank'}]}].
+    """
+    pool = deck_state['pool']
+    category_counts = deck_state['deck_category_counts']
+    color_mask = colors_to_mask(pool['color_identity'])
+    excluded_names = {card_info['name'] for card_info in inventory.values()}
+    excluded_names.update(card_info['name'] for card_info in deck_state['deck_full_details'])
+
+    suggestions = []
+    for category in UPGRADE_CATEGORIES:
+        count, target = category_counts.get(category, 0), CARD_CATEGORIES_RATIOS[category]
+        if count >= target:
+            continue
+        entries = find_upgrade_cards(upgrade_index, color_mask, category, pool['strategy'], excluded_names, limit)
+        suggestions.append({
+            'category': category,
+            'label': UPGRADE_CATEGORY_LABELS[category],
+            'count': count,
+            'target': target,
+            'cards': [{'name': upgrade_index['names'][entry], 'type_line': upgrade_index['type_lines'][entry],
+                       'price_usd': upgrade_index['prices'][entry], 'edhrec_rank': upgrade_index['edhrec_ranks'][entry]}
+                      for entry in entries],
+        })
+    return suggestions